@@ -0,0 +1,169 @@
+#! /usr/bin/env python3
+
+''' Blocksets as a parameter, w/ multiplicities, and the artifact cache
+
+A Blockset is the sorted multiset of its blocks, i.e. a block may occur more
+than once, and a combination may use it up to that many times. Its digest,
+the SHA-256 of its canonical definition, keys the directory of the artifacts
+generated for it:
+
+    cache/
+        NAME-DIGEST12/
+            blockset.json       the definition, checked on each use
+            combo.d/            the combo store, see store.py
+            NAME.bmp, .meta     see pkl_to_bitmap_file.py
+            NAME.h              see pkl_to_h.py
+
+such that switching sets reuses the prior artifacts of each one and an
+artifact is never mixed w/ the ones of another set. The default blockset,
+blockset_81, keeps its historical locations, e.g. combo.d/ and combo.pkl at
+the top of the repo.
+
+The combo generation, the stores, the bitmap and header files and the
+validator take a blockset; gofai, greedy, the C resolver and their tables
+remain specific to blockset_81.
+'''
+
+from collections import Counter
+import hashlib
+import json
+import os
+
+from . import blockset_81 as _blocks_81
+
+this_dir = os.path.dirname(os.path.abspath(__file__))
+gauge_dir = os.path.dirname(this_dir)
+default_cache_dir = os.environ.get('GAUGE_CACHE_DIR', os.path.join(gauge_dir, 'cache'))
+
+definition_file_name = "blockset.json"
+
+
+class Blockset:
+    ''' An immutable multiset of blocks.
+
+    Input:
+        blocks (iterable): the blocks, positive ints, w/ duplicates for the
+            blocks available more than once
+        name (str): for the file names, default: blockset_N, w/ N the
+            number of blocks
+    '''
+
+    def __init__(self, blocks, name=None):
+        self.blocks = tuple(sorted(blocks))
+        if not self.blocks or self.blocks[0] <= 0:
+            raise ValueError("A blockset should have at least one block and only positive ones")
+        self.counts = Counter(self.blocks)
+        self.name = name or f"blockset_{len(self.blocks)}"
+        self.min_target = self.blocks[0]
+        self.max_target = sum(self.blocks)
+        self.definition = json.dumps({"blocks": list(self.blocks)}, separators=(",", ":"))
+        self.digest = hashlib.sha256(self.definition.encode()).hexdigest()
+        self.key = f"{self.name}-{self.digest[:12]}"
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __iter__(self):
+        return iter(self.blocks)
+
+    def __contains__(self, block):
+        return block in self.counts
+
+    def __eq__(self, other):
+        return isinstance(other, Blockset) and self.blocks == other.blocks
+
+    def __hash__(self):
+        return hash(self.blocks)
+
+    def __repr__(self):
+        return f"Blockset({self.key}, {len(self.blocks)} blocks)"
+
+    @property
+    def has_duplicates(self):
+        return len(self.counts) < len(self.blocks)
+
+    def allows(self, blocks):
+        ''' Return True if blocks uses each block at most as many times as
+        available.
+        '''
+        counts = self.counts
+        return all(counts[b] >= n for b, n in Counter(blocks).items())
+
+    def label_index_map(self):
+        ''' Return the block -> bit index map of the bitmaps, i.e. the index
+        in the sorted blocks; the copies of a block are at consecutive
+        indexes, from the mapped one, and a combination using n copies sets
+        the first n bits.
+        '''
+        index_map = {}
+        for i, b in enumerate(self.blocks):
+            index_map.setdefault(b, i)
+        return index_map
+
+    def labels(self):
+        ''' The labels of the .meta and .h files, one per bit.
+        '''
+        return [f"{b/10000:.04f}" for b in self.blocks]
+
+
+def label_to_block(label):
+    ''' Return the block of a label, see Blockset.labels.
+    '''
+    return int(label.replace(".", ""))
+
+
+default_blockset = Blockset(_blocks_81, name="blockset_81")
+
+
+def load_blockset(spec):
+    ''' Return the Blockset for spec: blockset_81 (or 81) for the default one,
+    or the path of a definition file: a JSON list of blocks, a JSON object
+    w/ "blocks" and optionally "name", or the blocks separated by spaces,
+    commas or new lines. The name defaults to the file's base name.
+    '''
+    if spec is None or spec in (default_blockset.name, str(len(default_blockset))):
+        return default_blockset
+    with open(spec, "rt") as f:
+        text = f.read()
+    name = os.path.splitext(os.path.basename(spec))[0]
+    try:
+        definition = json.loads(text)
+    except ValueError:
+        definition = [int(b) for b in text.replace(",", " ").split()]
+    if isinstance(definition, dict):
+        name = definition.get("name", name)
+        definition = definition["blocks"]
+    return Blockset(definition, name=name)
+
+
+def artifact_dir(blockset, cache_dir=default_cache_dir):
+    ''' Return the artifact directory of blockset, created if needed.
+
+    Raise:
+        ValueError: if the directory holds another blockset definition
+    '''
+    blockset_dir = os.path.join(cache_dir, blockset.key)
+    definition_file = os.path.join(blockset_dir, definition_file_name)
+    try:
+        with open(definition_file, "rt") as f:
+            definition = json.load(f)
+        if definition.get("blocks") != list(blockset.blocks):
+            raise ValueError(f"{definition_file}: blockset mismatch for {blockset.key}")
+    except FileNotFoundError:
+        os.makedirs(blockset_dir, exist_ok=True)
+        t_definition_file = f"{definition_file}.{os.getpid()}_"
+        with open(t_definition_file, "wt") as f:
+            json.dump(
+                {"name": blockset.name, "digest": blockset.digest, "blocks": list(blockset.blocks)},
+                f,
+            )
+            print(file=f)
+        os.replace(t_definition_file, definition_file)
+    return blockset_dir
+
+
+def artifact_path(blockset, file_name, cache_dir=default_cache_dir):
+    ''' Return the path of file_name, e.g. combo.d or NAME.bmp, in the
+    artifact directory of blockset.
+    '''
+    return os.path.join(artifact_dir(blockset, cache_dir=cache_dir), file_name)
@@ -0,0 +1,178 @@
+#! /usr/bin/env python3
+
+''' Anytime branch-and-bound solver for individual targets
+
+The best resolution is the shortest one, w/ more large blocks for equal
+lengths, as for combo.pkl. The solver starts from the greedy resolution as the
+upper bound and checks the lengths k from the lower bound, i.e. the min k
+such that the k largest blocks reach the target, upwards. For each k, the
+k-subsets are searched depth first, w/ the blocks picked in decreasing order,
+such that the first subset found is the preferred one of that length. A
+subtree is pruned if the remainder is out of the [sum of the k' smallest, sum
+of the k' largest] interval of the blocks left, and the (start, k',
+remainder) states found infeasible are memoized.
+
+Once a length is exhausted, it becomes the new lower bound, hence the search
+can stop at any time w/ the best resolution so far and whether its length is
+proven optimal.
+'''
+
+from bisect import bisect_left
+from itertools import accumulate
+import multiprocessing
+import time
+
+from . import blockset_81, greedy
+
+default_time_budget = 1.0
+# Check the deadline every that many nodes:
+deadline_check_interval = 4096
+
+
+class _Timeout(Exception):
+    pass
+
+
+class SubsetSearch:
+    ''' Search the subsets of the blocks, in decreasing order, w/ a given
+    length and sum.
+    '''
+
+    def __init__(self, blocks=blockset_81):
+        self.blocks = sorted(blocks, reverse=True)
+        self.sums = list(accumulate(self.blocks, initial=0))
+        self.pos = {b: i for i, b in enumerate(self.blocks)}
+        # The blocks negated, in increasing order, for bisect:
+        self.neg_blocks = [-b for b in self.blocks]
+
+    def len_bounds(self, target):
+        ''' Return (min_len, max_len), the lengths for which the target is
+        within the [sum of the smallest, sum of the largest] interval.
+        '''
+        sums, n = self.sums, len(self.blocks)
+        min_len = next((k for k in range(n + 1) if sums[k] >= target), n + 1)
+        max_len = next((k for k in range(n, -1, -1) if sums[n] - sums[n - k] <= target), -1)
+        return min_len, max_len
+
+    def find(self, target, k, deadline=None):
+        ''' Return the preferred k-subset summing to target, as a decreasing
+        tuple, or None if none.
+
+        Raise:
+            _Timeout: if the deadline is reached
+        '''
+        blocks, sums, pos, neg_blocks = self.blocks, self.sums, self.pos, self.neg_blocks
+        n = len(blocks)
+        failed = set()
+        nodes = 0
+
+        def dfs(start, k, rem):
+            nonlocal nodes
+            if k == 1:
+                i = pos.get(rem)
+                return (rem,) if i is not None and i >= start else None
+            key = (start, k, rem)
+            if key in failed:
+                return None
+            nodes += 1
+            if deadline is not None and nodes % deadline_check_interval == 0 and time.perf_counter() > deadline:
+                raise _Timeout()
+            min_rest = sums[n] - sums[n - k + 1]
+            # Skip the blocks too large for the remainder:
+            j = max(start, bisect_left(neg_blocks, min_rest - rem))
+            while j <= n - k:
+                # The blocks are decreasing, so are the max sums from j on:
+                if rem > sums[j + k] - sums[j]:
+                    break
+                b = blocks[j]
+                found = dfs(j + 1, k - 1, rem - b)
+                if found is not None:
+                    return (b,) + found
+                j += 1
+            failed.add(key)
+            return None
+
+        if k == 0:
+            return () if target == 0 else None
+        if k > n or target > sums[k] or target < sums[n] - sums[n - k]:
+            return None
+        return dfs(0, k, target)
+
+
+_search = None
+
+
+def get_search():
+    global _search
+    if _search is None:
+        _search = SubsetSearch()
+    return _search
+
+
+def initial_resolution(target, block_set=blockset_81):
+    ''' The greedy resolution w/ the blocks from block_set, or None if
+    invalid. Shortening it, see shorten.py, would cost more than the search
+    usually does.
+    '''
+    blocks = greedy.resolve(target, block_set=block_set)
+    # The greedy blocks are distinct ones from block_set:
+    if blocks is None or sum(blocks) != target:
+        return None
+    return tuple(sorted(blocks, reverse=True))
+
+
+def solve(target, time_budget=default_time_budget, upper_bound=None, search=None):
+    ''' Return the best resolution found within time_budget.
+
+    Input:
+        target (int): the target
+        time_budget (float): the max time, in seconds, or None for no limit
+        upper_bound (iterable): a valid resolution to start from, default: the
+            greedy resolution w/ the blocks of search
+        search (SubsetSearch): optional, e.g. over the available blocks only,
+            see unavailable.py; default: over blockset_81
+
+    Return:
+        (tuple, bool): the resolution, as a decreasing tuple, or None if none
+            was found, and whether it is proven to be the best one, i.e. the
+            shortest, w/ more large blocks for equal lengths, or, for None,
+            that there is no resolution at all
+    '''
+    deadline = time.perf_counter() + time_budget if time_budget is not None else None
+    if search is None:
+        search = get_search()
+    if upper_bound is not None:
+        best = tuple(sorted(upper_bound, reverse=True))
+    else:
+        best = initial_resolution(
+            target, block_set=blockset_81 if search is _search else frozenset(search.blocks)
+        )
+    min_len, max_len = search.len_bounds(target)
+    if best is not None:
+        max_len = min(max_len, len(best))
+    try:
+        for k in range(min_len, max_len + 1):
+            found = search.find(target, k, deadline=deadline)
+            if found is not None:
+                # All the shorter lengths were exhausted:
+                return found, True
+    except _Timeout:
+        return best, False
+    return best, best is None
+
+
+def _solve_task(args):
+    target, time_budget = args
+    start = time.perf_counter()
+    blocks, optimal = solve(target, time_budget=time_budget)
+    return target, blocks, optimal, time.perf_counter() - start
+
+
+def solve_many(targets, time_budget=default_time_budget, n_parallel=None, chunksize=16):
+    ''' Solve the targets over a process pool, yielding (target, blocks,
+    optimal, sec) in completion order.
+    '''
+    with multiprocessing.Pool(n_parallel) as pool:
+        yield from pool.imap_unordered(
+            _solve_task, ((target, time_budget) for target in targets), chunksize=chunksize
+        )
@@ -0,0 +1,170 @@
+#! /usr/bin/env python3
+
+''' ctypes binding to the demo C resolvers, see demo/include/resolver.h
+
+The resolvers have to be built as shared libraries first:
+
+    cd demo
+    make shared
+
+NumPy is optional; if available, resolve_many returns a NumPy array.
+'''
+
+import array
+import ctypes
+import os
+import threading
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .blockset import label_to_block
+
+this_dir = os.path.dirname(os.path.abspath(__file__))
+gauge_dir = os.path.dirname(this_dir)
+default_lib_dir = os.path.join(gauge_dir, "demo", "lib")
+
+
+class _Resolver(ctypes.Structure):
+    _fields_ = [
+        ("min_target", ctypes.c_uint32),
+        ("max_target", ctypes.c_uint32),
+        ("labels", ctypes.POINTER(ctypes.c_char_p)),
+        ("num_labels", ctypes.c_int),
+        ("_resolver_internal", ctypes.c_void_p),
+    ]
+
+
+def lib_path(name, blockset_name="blockset_81", lib_dir=default_lib_dir):
+    ''' Return the path of the shared library for a resolver name, e.g.
+    bitmap_mem_resolver. The blockset agnostic bitmap_file_resolver is not
+    under the blockset sub-dir.
+    '''
+    lib_file = f"lib{name}.so"
+    if name == "bitmap_file_resolver":
+        return os.path.join(lib_dir, lib_file)
+    return os.path.join(lib_dir, blockset_name, lib_file)
+
+
+class CResolver:
+    ''' In process C resolver.
+
+    The C resolvers are not thread safe, the calls are serialized through a
+    lock, since ctypes releases the GIL.
+    '''
+
+    def __init__(self, lib, resolver_args=None):
+        if not isinstance(lib, ctypes.CDLL):
+            lib = ctypes.CDLL(lib)
+        self.lib = lib
+
+        lib.init_resolver.restype = ctypes.POINTER(_Resolver)
+        lib.init_resolver.argtypes = [ctypes.c_int, ctypes.POINTER(ctypes.c_char_p)]
+        lib.resolve.restype = ctypes.c_int
+        lib.resolve.argtypes = [
+            ctypes.POINTER(_Resolver), ctypes.c_uint32, ctypes.POINTER(ctypes.c_char_p),
+        ]
+        lib.resolve_many.restype = ctypes.c_int
+        lib.resolve_many.argtypes = [
+            ctypes.POINTER(_Resolver), ctypes.c_void_p, ctypes.c_size_t, ctypes.c_void_p,
+        ]
+
+        resolver_args = [os.fsencode(arg) for arg in (resolver_args or [])]
+        argv = (ctypes.c_char_p * (len(resolver_args) + 1))(*resolver_args, None)
+        self._resolver = lib.init_resolver(len(resolver_args), argv)
+        if not self._resolver:
+            raise RuntimeError(
+                f"{lib._name}: init_resolver({resolver_args}) failed, see stderr for details"
+            )
+        resolver = self._resolver.contents
+        self.min_target = resolver.min_target
+        self.max_target = resolver.max_target
+        self.num_labels = resolver.num_labels
+        self.num_bytes = (self.num_labels + 7) >> 3
+        self.labels = [resolver.labels[k].decode() for k in range(self.num_labels)]
+        self.blocks = [label_to_block(label) for label in self.labels]
+        label_ptrs = ctypes.cast(resolver.labels, ctypes.POINTER(ctypes.c_void_p))
+        self._label_blocks = {
+            label_ptrs[k]: b for k, b in enumerate(self.blocks)
+        }
+        self._blocks_buf = (ctypes.c_char_p * self.num_labels)()
+        self._lock = threading.Lock()
+
+    def resolve(self, target):
+        ''' Return the tuple of blocks in decreasing order for a target, or None
+        if the target is not resolvable.
+        '''
+        if target < self.min_target or target > self.max_target:
+            return None
+        buf = self._blocks_buf
+        with self._lock:
+            if self.lib.resolve(self._resolver, target, buf) < 0:
+                raise RuntimeError(f"{target}: resolve failed, see stderr for details")
+            # Compare label pointers rather than decoding the strings:
+            ptrs = ctypes.cast(buf, ctypes.POINTER(ctypes.c_void_p))
+            blocks = []
+            for k in range(self.num_labels):
+                ptr = ptrs[k]
+                if ptr is None:
+                    break
+                blocks.append(self._label_blocks[ptr])
+        if not blocks:
+            return None
+        return tuple(sorted(blocks, reverse=True))
+
+    def resolve_many(self, targets, out=None):
+        ''' Resolve targets in bulk.
+
+        Input:
+            targets (iterable): the targets, a uint32 NumPy array or array('I')
+                is used as is, w/o copying
+            out (writable buffer): optional storage for the result, at least
+                len(targets) * num_bytes bytes
+
+        Return:
+            the bitmaps, num_bytes per target, bit k (byte k >> 3, bit k & 7)
+            set if blocks[k] is part of the resolution; a (len(targets),
+            num_bytes) uint8 NumPy array if NumPy is available and out is
+            None, otherwise out or a bytearray.
+        '''
+        if numpy is not None:
+            targets = numpy.ascontiguousarray(targets, dtype=numpy.uint32)
+            targets_ptr, n = targets.ctypes.data, len(targets)
+        else:
+            if not (isinstance(targets, array.array) and targets.typecode == "I"):
+                targets = array.array("I", targets)
+            targets_ptr, n = targets.buffer_info()
+        if out is None:
+            if numpy is not None:
+                out = numpy.empty((n, self.num_bytes), dtype=numpy.uint8)
+            else:
+                out = bytearray(n * self.num_bytes)
+        out_buf = (ctypes.c_char * (n * self.num_bytes)).from_buffer(out)
+        with self._lock:
+            if self.lib.resolve_many(self._resolver, targets_ptr, n, out_buf) < 0:
+                raise RuntimeError("resolve_many failed, see stderr for details")
+        return out
+
+    def bitmap_to_blocks(self, bitmap):
+        ''' Return the tuple of blocks in decreasing order for a bitmap, as
+        returned by resolve_many, or None for an empty one.
+        '''
+        bitmap = int.from_bytes(bytes(bitmap), "little")
+        if bitmap == 0:
+            return None
+        return tuple(sorted(
+            (b for k, b in enumerate(self.blocks) if bitmap & (1 << k)), reverse=True
+        ))
+
+
+def init_resolver(name_or_path, resolver_args=None, **kwargs):
+    ''' Return a CResolver for a resolver name, e.g. bitmap_mem_resolver, or for
+    the path of its shared library. kwargs are passed to lib_path.
+    '''
+    if os.path.sep in name_or_path or name_or_path.endswith(".so"):
+        path = name_or_path
+    else:
+        path = lib_path(name_or_path, **kwargs)
+    return CResolver(path, resolver_args=resolver_args)
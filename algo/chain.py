@@ -0,0 +1,101 @@
+#! /usr/bin/env python3
+
+''' Tiered resolver chain
+
+A target is resolved by, in order:
+
+ - the exact table, e.g. the combo store or a memory mapped .bmp file, see
+   table.py
+ - the LRU cache of the previous fallback resolutions
+ - the fallback resolvers, cheapest first; the first valid resolution wins
+   and it is cached, as is the lack of one
+'''
+
+from collections import OrderedDict
+
+from . import gofai, greedy
+from .validator import is_valid, normalize_blocks
+
+# The algorithmic resolvers, cheapest first, see bench/:
+default_fallbacks = (
+    ("gofai", gofai.resolve),
+    ("greedy", greedy.resolve),
+)
+default_cache_size = 65536
+
+
+class ResolverChain:
+    ''' Resolve targets w/ a table, then w/ fallback resolvers, w/ a bounded
+    LRU cache for the latter.
+
+    Input:
+        table (object): result table w/ get(target), see table.py, or None
+        fallbacks (list): (name, resolver) pairs, w/ resolver: target ->
+            blocks, tried in order
+        cache_size (int): the max number of cached fallback resolutions, 0 to
+            disable the cache
+
+    The chain is a resolver itself: chain(target) -> blocks or None.
+    '''
+
+    def __init__(self, table=None, fallbacks=default_fallbacks, cache_size=default_cache_size):
+        self.table = table
+        self.fallbacks = list(fallbacks)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self.counters = {
+            "requests": 0,
+            "table": 0,
+            "cache": 0,
+            **{name: 0 for name, _ in self.fallbacks},
+            "unresolved": 0,
+        }
+
+    def _fallback(self, target):
+        for name, resolver in self.fallbacks:
+            blocks = resolver(target)
+            if is_valid(blocks, target):
+                return normalize_blocks(blocks), name
+        return None, None
+
+    def resolve_source(self, target):
+        ''' Return (blocks, source), w/ source "table", "cache", the fallback
+        name or None, in which case blocks is None too.
+        '''
+        self.counters["requests"] += 1
+        if self.table is not None:
+            blocks = self.table.get(target)
+            if blocks is not None:
+                self.counters["table"] += 1
+                return blocks, "table"
+        cached = self._cache.get(target)
+        if cached is not None:
+            self._cache.move_to_end(target)
+            self.counters["cache"] += 1
+            blocks, source = cached
+            return blocks, "cache" if source is not None else None
+        blocks, source = self._fallback(target)
+        self.counters[source if source is not None else "unresolved"] += 1
+        if self.cache_size > 0:
+            self._cache[target] = (blocks, source)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return blocks, source
+
+    def resolve(self, target):
+        return self.resolve_source(target)[0]
+
+    __call__ = resolve
+
+    def stats(self):
+        ''' Return the counters, per source, w/ the hit rates.
+        '''
+        requests = self.counters["requests"]
+        table_lookups = requests if self.table is not None else 0
+        cache_lookups = requests - self.counters["table"]
+        return {
+            **self.counters,
+            "table_hit_rate": self.counters["table"] / table_lookups if table_lookups else None,
+            "cache_hit_rate": self.counters["cache"] / cache_lookups if cache_lookups else None,
+            "cache_len": len(self._cache),
+        }
@@ -1,15 +1,24 @@
 #! /usr/bin/env python3
 
-from itertools import combinations
+import array
+from bisect import bisect_left, bisect_right, insort
+from itertools import accumulate, combinations
 
+import gc
 import logging
 import os
 import pickle
 import signal
 import sys
 import time
+import traceback
 
-from . import blockset_81
+from . import blockset_81, max_target
+from .blockset import default_blockset
+from .concurrency import AdaptiveConcurrency, default_poll_interval
+from .profiling import profile_file, run_profiled
+from .resolved import ResolvedTargets, sum_bounds
+from .store import ComboStore, default_store_dir, migrate_combo_pkl_file
 
 this_dir = os.path.dirname(os.path.abspath(__file__))
 gauge_dir = os.path.dirname(this_dir)
@@ -19,6 +28,16 @@ default_combo_pkl_file = os.path.join(gauge_dir, "combo.pkl")
 # The cutoff size for parallelism, i.e. shorter blocks are generated in the main process:
 parallel_cutoff = 6
 
+# The max number of worker results merged by a reducer process, see
+# generate_combos:
+reduce_fan_in = 8
+
+# The combination walkers, see _generate_combo_batch:
+walkers = ("lex", "revolving_door")
+default_walker = "lex"
+# The number of blocks chosen by the revolving door walk, under the pruned search:
+revolving_door_len = 2
+
 log = logging.getLogger("combo")
 logHandler = logging.StreamHandler()
 logHandler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
@@ -33,7 +52,61 @@ def n_choose_k(n, k):
         denominator *= i
     return numerator // denominator
 
-def _generate_combo_batch(r, prefix=None, suffix_set=blockset_81, check_combo=None):
+def revolving_door(n, t):
+    ''' Walk the t-combinations of range(n) in revolving door order, i.e. each
+    combination differs from the previous one by a single element, starting w/
+    range(t); Knuth's Algorithm R, TAOCP 7.2.1.3.
+
+    Yield:
+        (out, in): the element removed and the element added
+    '''
+    if t <= 0 or t >= n:
+        return
+    if t == 1:
+        for i in range(1, n):
+            yield i - 1, i
+        return
+    # c[i] is c_{i+1} in Knuth's notation, w/ the sentinel c_{t+1} = n:
+    c = list(range(t)) + [n]
+    while True:
+        # R3, the easy case:
+        if t & 1:
+            if c[0] + 1 < c[1]:
+                yield c[0], c[0] + 1
+                c[0] += 1
+                continue
+            j, increase = 2, False
+        else:
+            if c[0] > 0:
+                yield c[0], c[0] - 1
+                c[0] -= 1
+                continue
+            j, increase = 2, True
+        while True:
+            if not increase:
+                # R4, try to decrease c_j:
+                if c[j - 1] >= j:
+                    yield c[j - 1], j - 2
+                    c[j - 1] = c[j - 2]
+                    c[j - 2] = j - 2
+                    break
+                j += 1
+                if j > t:
+                    return
+            # R5, try to increase c_j:
+            if c[j - 1] + 1 < c[j]:
+                yield j - 2, c[j - 1] + 1
+                c[j - 2] = c[j - 1]
+                c[j - 1] += 1
+                break
+            j += 1
+            if j > t:
+                return
+            increase = False
+
+def _generate_combo_batch(
+        r, prefix=None, suffix_set=blockset_81, check_combo=None, resolved=None, walker=default_walker, stats=None,
+):
     ''' Generate combinations of length r for targets not in check_combo
 
     Input:
@@ -43,16 +116,46 @@ def _generate_combo_batch(r, prefix=None, suffix_set=blockset_81, check_combo=No
             for no prefix
         
         suffix_set (iterable): all combinations should end with a suffix from
-             suffix_set without the blocks from prefix
+             suffix_set: a set, without the blocks from prefix, or a list or
+             a tuple, taken as is, e.g. the multiset of the blocks left for
+             a blockset w/ duplicates, see iter_prefix_tasks
         
-        check_combo (set or dict): an object containing all the targets resolved
-            to a block shorter than r.
+        check_combo (set or dict or ResolvedTargets): an object containing all
+            the targets resolved to a block shorter than r.
+
+        resolved (ResolvedTargets): the targets in check_combo, for skipping
+            the suffix subtrees whose sum interval contains only resolved
+            targets; built from check_combo if None. Once available, only
+            resolved is used for the membership checks, check_combo is not
+            accessed anymore.
+
+        walker (str): "lex" or "revolving_door", see below
+
+        stats (dict): optional, the number of nodes of the suffix tree
+            visited, i.e. the subtrees entered and the candidates checked, is
+            added to stats["nodes"]; the pruned subtrees are not visited
 
     Return:
         dict[int]tuple: the best combinations for a given target, unless the
             target already exists in check_combo. If multiple combinations yield
             the same target, the one with more large blocks is preferred.        
+
+    The suffixes are generated in decreasing lexicographic order of their
+    decreasing tuples, i.e. w/ the blocks picked from the largest down. Since
+    the prefix is common to all the combinations, that is also the order of the
+    combinations, hence the first combination yielding a target is the one
+    preferred and the target is excluded from the rest of the batch.
+
+    The "revolving_door" walker picks the last revolving_door_len blocks, or
+    all of them w/o check_combo, in revolving door order instead. Consecutive
+    combinations differ by a single block, so the sum and the block bitmask
+    are updated in O(1). The bitmask has the higher bits for the larger
+    blocks, such that comparing the bitmasks of the same length compares their
+    decreasing tuples; that comparison replaces the first hit rule within a
+    walk. The result is the same as for "lex".
     '''
+    if walker not in walkers:
+        raise ValueError(f"Invalid walker {walker!r}, should be one of {walkers}")
 
     if prefix is None:
         prefix = tuple()
@@ -68,50 +171,370 @@ def _generate_combo_batch(r, prefix=None, suffix_set=blockset_81, check_combo=No
         else:
             return None
     
-    if suffix_set is not set:
-        suffix_set = set(suffix_set)   
-    suffix_set = suffix_set - set(prefix)
+    if isinstance(suffix_set, (set, frozenset)):
+        suffix_set = suffix_set - set(prefix)
     if len(suffix_set) == 0:
         return None
     combos = {}
     prefix_target = sum(prefix)
-    for suffix in combinations(suffix_set, r - len(prefix)):
-        target = prefix_target + sum(suffix)
-        if check_combo is not None and target in check_combo:
-            continue
-        # Convert combo into a tuple of blocks in decreasing order. The higher
-        # tuple is preferred, since it has more large blocks. 
-        combo = tuple(sorted(prefix + suffix, reverse=True))
+    suffix = sorted(suffix_set, reverse=True)
+    # W/ duplicates, the subtree of a block is skipped if the previous block
+    # is a copy, since its subtree includes it:
+    has_copies = len(set(suffix)) < len(suffix)
+    # Convert combo into a tuple of blocks in decreasing order. The higher
+    # tuple is preferred, since it has more large blocks. The suffix blocks are
+    # picked in decreasing order, so the prefix can be appended as is if its
+    # blocks are smaller:
+    prefix = tuple(sorted(prefix, reverse=True))
+    if prefix and prefix[0] > suffix[-1]:
+        def make_combo(chosen):
+            return tuple(sorted(chosen + prefix, reverse=True))
+    else:
+        def make_combo(chosen):
+            return chosen + prefix
+    # The targets found so far, sorted, such that they can be excluded too:
+    hits = []
+
+    # The resolved targets marks, see ResolvedTargets, set below:
+    marks = None
+    node_count = 0
+
+    def add_stats():
+        if stats is not None:
+            stats["nodes"] = stats.get("nodes", 0) + node_count
+
+    def walk(start, k, base, chosen):
+        # Choose k more blocks out of suffix[start:] in revolving door order:
+        nonlocal node_count
+        blocks = suffix[start:]
+        n_blocks = len(blocks)
+        bits = [1 << (n_blocks - 1 - i) for i in range(n_blocks)]
+        target, mask = base + sum(blocks[:k]), sum(bits[:k])
+        # The best mask per target, for this walk only; the targets found
+        # before the walk yield larger combinations:
+        masks = {}
+        node_count += n_choose_k(n_blocks, k)
+        if not marks[target] and target not in combos:
+            masks[target] = mask
+        for out_i, in_i in revolving_door(n_blocks, k):
+            target += blocks[in_i] - blocks[out_i]
+            mask ^= bits[in_i] | bits[out_i]
+            if marks[target] or target in combos:
+                continue
+            if mask > masks.get(target, 0):
+                masks[target] = mask
+        for target, mask in masks.items():
+            combos[target] = make_combo(
+                chosen + tuple(b for b, bit in zip(blocks, bits) if mask & bit)
+            )
+            insort(hits, target)
+
+    if check_combo is None:
+        if walker == "revolving_door":
+            marks = bytes(prefix_target + sum(suffix) + 1)
+            walk(0, r - len(prefix), prefix_target, ())
+            add_stats()
+            return combos
+        for chosen in combinations(suffix, r - len(prefix)):
+            target = prefix_target + sum(chosen)
+            if target not in combos:
+                combos[target] = make_combo(chosen)
+        node_count = n_choose_k(len(suffix), r - len(prefix))
+        add_stats()
+        return combos
+
+    if resolved is None:
+        resolved = check_combo if isinstance(check_combo, ResolvedTargets) else ResolvedTargets(
+            check_combo, size=max(max_target, prefix_target + sum(suffix)) + 1
+        )
+    marks = resolved.marks
+    n = len(suffix)
+    sums = list(accumulate(suffix, initial=0))
+    walk_len = revolving_door_len if walker == "revolving_door" else 0
+
+    def is_saturated(lo, hi):
+        if resolved.is_saturated(lo, hi):
+            return True
+        if not hits:
+            return False
+        unresolved_count = resolved.unresolved_count(lo, hi)
+        if unresolved_count > len(hits):
+            return False
+        return bisect_right(hits, hi) - bisect_left(hits, lo) == unresolved_count
+
+    def visit(start, k, base, chosen):
+        # Choose k more blocks out of suffix[start:]:
+        nonlocal node_count
+        if k <= walk_len:
+            walk(start, k, base, chosen)
+            return
+        if k == 1:
+            node_count += n - start
+            for b in suffix[start:]:
+                target = base + b
+                if marks[target] or target in combos:
+                    continue
+                combos[target] = make_combo(chosen + (b,))
+                insort(hits, target)
+            return
+        for j in range(start, n - k + 1):
+            b = suffix[j]
+            if has_copies and j > start and b == suffix[j - 1]:
+                continue
+            # Skip the subtree if all its sums are already resolved:
+            if is_saturated(*sum_bounds(base + b, suffix, sums, j + 1, k - 1)):
+                continue
+            node_count += 1
+            visit(j + 1, k - 1, base + b, chosen + (b,))
+
+    k = r - len(prefix)
+    if n >= k and not is_saturated(*sum_bounds(prefix_target, suffix, sums, 0, k)):
+        node_count += 1
+        visit(0, k, prefix_target, ())
+    add_stats()
+    return combos
+
+def encode_combos(combos):
+    ''' Return (targets, blocks), the unsigned int arrays of the targets and
+    of the blocks of each combo, in a row.
+    '''
+    targets = array.array("I", combos)
+    blocks = array.array("I")
+    for target in targets:
+        blocks.extend(combos[target])
+    return targets, blocks
+
+
+def merge_combos_arrays(r, targets, blocks, combos):
+    ''' Merge the combos of length r, as encoded by encode_combos, into
+    combos; the larger combo wins for the targets already there.
+    '''
+    for i, target in enumerate(targets):
+        combo = tuple(blocks[i * r:(i + 1) * r])
         if target not in combos or combo > combos[target]:
             combos[target] = combo
     return combos
 
-def generate_combo_batch(r, prefix=None, suffix_set=blockset_81, check_combo=None, pkl_file=None):
-    ''' Like _generate_combo_batch, but additionally may save the result into a pickle file.
+
+def write_combos_file(combos, r, combos_file):
+    ''' Write the combos of length r into a compact file: the (r, count)
+    header, the targets and the blocks, see encode_combos. Unlike a pickle,
+    that needs no per combo object to load.
+    '''
+    targets, blocks = encode_combos(combos)
+    t_combos_file = combos_file + "_"
+    with open(t_combos_file, 'wb') as f:
+        array.array("I", [r, len(targets)]).tofile(f)
+        targets.tofile(f)
+        blocks.tofile(f)
+    os.rename(t_combos_file, combos_file)
+
+
+def read_combos_count(combos_file):
+    ''' Return the number of combos in a combos file, from its header, see
+    write_combos_file.
+    '''
+    with open(combos_file, 'rb') as f:
+        header = array.array("I")
+        header.fromfile(f, 2)
+    return header[1]
+
+
+def merge_combos_files(combos_files, combos=None):
+    ''' Merge the combos from combos_files into combos, the larger combo wins
+    for the targets in more than one of them.
+
+    Return:
+        (dict, int): the combos and the number of combos read
+    '''
+    if combos is None:
+        combos = {}
+    total_count = 0
+    for combos_file in combos_files:
+        with open(combos_file, 'rb') as f:
+            header = array.array("I")
+            header.fromfile(f, 2)
+            r, count = header
+            targets = array.array("I")
+            targets.fromfile(f, count)
+            blocks = array.array("I")
+            blocks.fromfile(f, count * r)
+        total_count += count
+        merge_combos_arrays(r, targets, blocks, combos)
+    return combos, total_count
+
+
+def generate_combo_batch(
+        r, prefix=None, suffix_set=blockset_81, check_combo=None, resolved=None, walker=default_walker,
+        pkl_file=None, combos_file=None,
+):
+    ''' Like _generate_combo_batch, but additionally may save the result into a
+    pickle file or a compact combos file, see write_combos_file.
     '''
-    combos = _generate_combo_batch(r, prefix=prefix, suffix_set=suffix_set, check_combo=check_combo)
+    combos = _generate_combo_batch(
+        r, prefix=prefix, suffix_set=suffix_set, check_combo=check_combo, resolved=resolved, walker=walker
+    )
     if pkl_file is not None:
         t_pkl_file = pkl_file + "_"
         with open(t_pkl_file, 'wb') as f:
             pickle.dump(combos, f)
         os.rename(t_pkl_file, pkl_file)
+    elif combos_file is not None:
+        write_combos_file(combos or {}, r, combos_file)
     else:
         return combos
 
-def generate_combos(r, n_parallel=None, check_combo=None, _work_dir=default_work_dir):
+def get_n_parallel(n_parallel=None):
+    if n_parallel is None or n_parallel <= 0:
+        n_parallel=max(os.cpu_count()//2, 1)
+    return n_parallel
+
+def is_parallel(r, n_parallel, blockset=default_blockset):
+    return not (r <= parallel_cutoff or len(blockset) - r <= parallel_cutoff or n_parallel == 1)
+
+def get_prefix_sz(r, n_parallel, blockset=default_blockset):
+    ''' The prefix size for splitting the combinations of length r into at
+    least n_parallel tasks
+    '''
+    for prefix_sz in range(1, max(r//2, 1) + 1):
+        if n_choose_k(len(blockset), prefix_sz) >= n_parallel:
+            break
+    return prefix_sz
+
+def iter_prefix_tasks(r, prefix_sz, resolved=None, blockset=default_blockset):
+    ''' Split the combinations of length r by prefix, i.e. the prefix_sz
+    smallest blocks of the combination.
+
+    resolved (ResolvedTargets): optional, for skipping the prefixes whose
+        combinations would yield only resolved targets
+    blockset (Blockset): the blocks, see blockset.py
+
+    Yield:
+        (iter_num, prefix, suffix_set, candidate_num): the prefix in increasing
+            order, the tuple of the blocks after it in the sorted blocks, i.e.
+            > max(prefix), or the copies left of max(prefix), and the number
+            of combinations for the task. The prefixes w/o enough larger
+            blocks for a suffix, or skipped, are still counted by iter_num.
+
+    W/ duplicates, each prefix is yielded once, for its first copies, e.g.:
+
+    >>> from algo.blockset import Blockset
+    >>> blockset = Blockset([1, 1, 2, 3, 4, 5])
+    >>> [task[1:3] for task in iter_prefix_tasks(4, 2, blockset=blockset)]
+    [((1, 1), (2, 3, 4, 5)), ((1, 2), (3, 4, 5)), ((1, 3), (4, 5)), ((2, 3), (4, 5))]
+    '''
+    iter_num = 0
+    blocks = blockset.blocks
+    sums = list(accumulate(blocks, initial=0))
+    for positions in combinations(range(len(blocks)), prefix_sz):
+        # The same blocks at other positions, i.e. w/ a later copy instead of
+        # an earlier one, are the same prefix w/ fewer blocks left, skipped:
+        if blockset.has_duplicates and any(
+                i > 0 and blocks[i] == blocks[i - 1] and i - 1 not in positions for i in positions
+        ):
+            continue
+        prefix = tuple(blocks[i] for i in positions)
+        iter_num += 1
+        # To avoid duplicated work, only suffixes made of the blocks after
+        # the prefix should be considered:
+        suffix_set = blocks[positions[-1] + 1:]
+        if len(prefix) + len(suffix_set) < r:
+            continue
+        if resolved is not None and resolved.is_saturated(*sum_bounds(
+                sum(prefix), blocks, sums, len(blocks) - len(suffix_set), r - len(prefix)
+        )):
+            continue
+        yield iter_num, prefix, suffix_set, n_choose_k(len(suffix_set), r - len(prefix))
+
+def sort_by_yield(r, tasks, resolved, blockset=default_blockset):
+    ''' Sort the tasks by decreasing expected new targets per CPU-second, for
+    the time-budgeted runs.
+
+    The expected new targets of a task are the unresolved targets in the
+    window of the sums its combinations can reach, each hit w/ a chance
+    growing w/ the number of candidates, hence their product. The cost of a
+    task is about constant, the kernel skipping the saturated sub-prefixes
+    rather than walking the candidates, e.g. 4 - 25 ms per task for r=9
+    after r<=8, hence not in the ratio.
+    '''
+    blocks = blockset.blocks
+    sums = list(accumulate(blocks, initial=0))
+
+    def expected_yield(task):
+        _, prefix, suffix_set, candidate_num = task
+        lo, hi = sum_bounds(sum(prefix), blocks, sums, len(blocks) - len(suffix_set), r - len(prefix))
+        return resolved.unresolved_count(lo, hi) * candidate_num
+
+    return sorted(tasks, key=lambda task: -expected_yield(task))
+
+
+def generate_combos(
+        r,
+        n_parallel=None,
+        check_combo=None,
+        progress=None,
+        walker=default_walker,
+        adaptive=True,
+        min_free_bytes=None,
+        deadline=None,
+        profile_dir=None,
+        blockset=default_blockset,
+        _work_dir=default_work_dir,
+):
     ''' Generate combinations of length r for targets not in check_combo with parallelism
+
+    progress (ProgressTracker): optional, see progress.py
+    walker (str): the combination walker, see _generate_combo_batch
+    adaptive (bool): whether to adapt the number of running workers, up to
+        n_parallel, to the free memory, see concurrency.py
+    min_free_bytes (int): the memory to keep free, if adaptive, default: see
+        AdaptiveConcurrency
+    deadline (float): optional, the time.time() at which to stop: no task is
+        started afterwards and the running ones are abandoned, while the
+        results of the completed ones are kept
+    profile_dir (str): optional, where each worker and reducer dumps its
+        profile, see profiling.py
+    blockset (Blockset): the blocks, see blockset.py
+
+    The tasks are started heaviest first, i.e. by decreasing number of
+    candidates, such that the last ones to complete are light ones, or, w/ a
+    deadline, by decreasing expected yield, see sort_by_yield.
+
+    Return:
+        (dict, bool): the combos, or None on error, and whether all the tasks
+            completed, i.e. the combos are the ones of a full run
     '''
 
-    if n_parallel is None or n_parallel <= 0:
-        n_parallel=max(os.cpu_count()//2, 1)
-    if r <= parallel_cutoff or len(blockset_81) - r <= parallel_cutoff or n_parallel == 1:
+    n_parallel = get_n_parallel(n_parallel)
+    # Built once, inherited by the workers, which use it instead of
+    # check_combo, see ResolvedTargets:
+    resolved = ResolvedTargets(check_combo, size=blockset.max_target + 1) if check_combo is not None else None
+    if not is_parallel(r, n_parallel, blockset=blockset):
         log.info(f"Generating combos for r={r} w/o parallelism")
-        return generate_combo_batch(r, check_combo=check_combo) or {}
+        if progress is not None:
+            progress.start_r(r, 1)
+            progress.task_started(os.getpid(), f"r: {r}", n_choose_k(len(blockset), r))
+        combos = generate_combo_batch(
+            r, suffix_set=blockset.blocks, check_combo=check_combo, resolved=resolved, walker=walker
+        ) or {}
+        if progress is not None:
+            progress.task_done(os.getpid(), new_targets=len(combos))
+            progress.finish_r(r, len(combos))
+        return combos, True
     
-    for prefix_sz in range(1, max(r//2, 1) + 1):
-        if n_choose_k(len(blockset_81), prefix_sz) >= n_parallel:
-            break
-    log.info(f"Generating combos for r={r} w/ prefix_sz={prefix_sz}, n_parallel={n_parallel}")
+    prefix_sz = get_prefix_sz(r, n_parallel, blockset=blockset)
+    tasks = list(iter_prefix_tasks(r, prefix_sz, resolved=resolved, blockset=blockset))
+    if deadline is not None and resolved is not None:
+        tasks = sort_by_yield(r, tasks, resolved, blockset=blockset)
+    else:
+        tasks = sorted(tasks, key=lambda task: -task[3])
+    task_num = len(tasks)
+    log.info(
+        f"Generating combos for r={r} w/ prefix_sz={prefix_sz}, n_parallel={n_parallel}, "
+        + f"{task_num} tasks out of {n_choose_k(len(blockset), prefix_sz)} prefixes"
+    )
+    if progress is not None:
+        progress.start_r(r, task_num)
     
     os.makedirs(_work_dir, exist_ok=True)
     my_pid = os.getpid()
@@ -119,34 +542,102 @@ def generate_combos(r, n_parallel=None, check_combo=None, _work_dir=default_work
     combos = {}
 
     pending_pids = {}
+    # The combos files of the completed workers and reducers, not merged yet:
+    ready_files = []
+    concurrency = AdaptiveConcurrency(n_parallel, min_free_bytes=min_free_bytes) if adaptive else None
+    if concurrency is not None and not concurrency.enabled:
+        concurrency = None
+    # W/ adaptive concurrency or a deadline, SIGCHLD is blocked, such that it
+    # can be waited for w/ a timeout, see wait_pid; the workers restore the
+    # mask:
+    timed_wait = concurrency is not None or deadline is not None
+    poll_interval = concurrency.poll_interval if concurrency is not None else default_poll_interval
+    saved_sigmask = None
+    if timed_wait:
+        saved_sigmask = signal.pthread_sigmask(signal.SIG_BLOCK, [signal.SIGCHLD])
+    tasks_done = 0
+    expired = False
 
-    def wait_pids_report_err(threshold=0):
+    def get_threshold():
+        # The max number of pending pids for starting a new one:
+        if concurrency is None:
+            return n_parallel - 1
+        return concurrency.limit(list(pending_pids)) - 1
+
+    def wait_pid():
+        # Wait for a child; w/ adaptive concurrency, sample the memory in the
+        # meantime, and w/ a deadline, check it, and return (0, 0) after each
+        # poll_interval, for re-evaluating the threshold:
+        if not timed_wait:
+            return os.wait()
+        pid, exit_code = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            if concurrency is not None:
+                concurrency.sample(pending_pids)
+            # A child exiting in the meantime leaves SIGCHLD pending, hence
+            # this returns right away:
+            signal.sigtimedwait([signal.SIGCHLD], poll_interval)
+        return pid, exit_code
+
+    def check_deadline():
+        # Once the deadline is reached, abandon the running tasks; the
+        # reducers run to completion, since they hold completed results:
+        nonlocal expired
+        if expired or deadline is None or time.time() < deadline:
+            return expired
+        expired = True
+        log.warn(f"r: {r}, deadline reached, abandon the running tasks")
+        for pid, pending in pending_pids.items():
+            if pending['kind'] == "task":
+                pending['abandoned'] = True
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+        return expired
+
+    def wait_pids_report_err(threshold=None):
+        # Wait until at most threshold pids are pending, default: until a new
+        # one can be started:
+        nonlocal tasks_done
         try:
-            while len(pending_pids) > threshold:
-                pid, exit_code = os.wait()
+            while len(pending_pids) > (threshold if threshold is not None else get_threshold()):
+                if check_deadline() and threshold is None:
+                    # No new task will be started:
+                    break
+                pid, exit_code = wait_pid()
+                if pid == 0:
+                    continue
+                if concurrency is not None:
+                    concurrency.task_done(pid)
                 if pid in pending_pids:
-                    description = pending_pids[pid]['description']
-                    d_time = time.time() - pending_pids[pid]['start']
-                    pkl_file = pending_pids[pid]['pkl_file']
-                    stdout_file = pending_pids[pid]['out_file']
-                    stderr_file = pending_pids[pid]['err_file']
-                    del pending_pids[pid]
+                    pending = pending_pids.pop(pid)
+                    description = pending['description']
+                    d_time = time.time() - pending['start']
+                    stdout_file = pending['out_file']
+                    stderr_file = pending['err_file']
                     if exit_code == 0:
-                        with open(pkl_file, 'rb') as f:
-                            work_combos = pickle.load(f)
-                        keep_count, total_count = 0, 0
-                        if work_combos is not None:
-                            total_count = len(work_combos)
-                            for target, combo in work_combos.items():
-                                if target not in combos or combo > combos[target]:
-                                    combos[target] = combo
-                                    keep_count += 1
-                        log.info(
-                            f"pid: {pid}, {description} completed in {d_time:.06f} sec, keep {keep_count} out of {total_count} new combos"
-                        )
-                        for file_path in [pkl_file, stdout_file, stderr_file]:
+                        ready_files.append(pending['combos_file'])
+                        log.info(f"pid: {pid}, {description} completed in {d_time:.06f} sec")
+                        if pending['kind'] == "task":
+                            tasks_done += 1
+                            if progress is not None:
+                                # The targets of the task may be found by
+                                # other tasks too, hence an upper bound,
+                                # until the results are merged:
+                                progress.task_done(pid, new_targets=read_combos_count(pending['combos_file']))
+                        for file_path in [stdout_file, stderr_file]:
                             os.unlink(file_path)
+                    elif pending.get('abandoned'):
+                        log.info(f"pid: {pid}, {description} abandoned after {d_time:.06f} sec")
+                        if progress is not None:
+                            progress.task_failed(pid, exit_code=exit_code)
+                        for file_path in [pending['combos_file'], stdout_file, stderr_file]:
+                            if os.path.exists(file_path):
+                                os.unlink(file_path)
                     else:
+                        if progress is not None and pending['kind'] == "task":
+                            progress.task_failed(pid, exit_code=exit_code)
                         log.warn(
                             f"pid: {pid}, {description} completed in {d_time:.06f} sec w/ exit_code: {exit_code}, results not processed. See:"
                             + "\n\t"
@@ -161,6 +652,74 @@ def generate_combos(r, n_parallel=None, check_combo=None, _work_dir=default_work
             return True
         return False
 
+    def fork_child(kind, description, work_file_root, func):
+        # Run func(combos_file) in a child process, which writes its result
+        # into combos_file:
+        combos_file = work_file_root + ".cmb"
+        stdout_file = work_file_root + ".out"
+        stderr_file = work_file_root + ".err"
+        pid = os.fork()
+        if pid != 0:
+            pending_pids[pid] = {
+                'kind': kind,
+                'description': description,
+                'start': time.time(),
+                'combos_file': combos_file,
+                'out_file': stdout_file,
+                'err_file': stderr_file,
+            }
+            log.info(f"pid: {pid}, {description}, started")
+            return pid
+        os.setsid()
+        if saved_sigmask is not None:
+            signal.pthread_sigmask(signal.SIG_SETMASK, saved_sigmask)
+        stdin_fh = open("/dev/null")
+        stdout_fh = open(stdout_file, "wt")
+        stderr_fh = open(stderr_file, "wt")
+        os.dup2(stdin_fh.fileno(), sys.stdin.fileno())       
+        os.dup2(stdout_fh.fileno(), sys.stdout.fileno())
+        os.dup2(stderr_fh.fileno(), sys.stderr.fileno())
+        exit_code = 0
+        try:
+            if profile_dir is not None:
+                run_profiled(profile_file(profile_dir, f"r{r:02d}", kind), func, combos_file)
+            else:
+                func(combos_file)
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+        # Skip the interpreter teardown, which would touch, hence copy, most
+        # of the inherited pages:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(exit_code)
+
+    def reduce(combos_files, combos_file):
+        reduced, total_count = merge_combos_files(combos_files)
+        write_combos_file(reduced, r, combos_file)
+        print(f"keep {len(reduced)} out of {total_count} combos")
+        for file_path in combos_files:
+            os.unlink(file_path)
+
+    reduce_num = 0
+
+    def start_reducers():
+        # Merge the ready files reduce_fan_in at a time, while the workers run:
+        nonlocal reduce_num
+        while len(ready_files) >= reduce_fan_in:
+            if wait_pids_report_err():
+                return True
+            combos_files = ready_files[:reduce_fan_in]
+            del ready_files[:reduce_fan_in]
+            reduce_num += 1
+            fork_child(
+                "reduce",
+                f"r: {r}, reduce: {reduce_num}, files: {len(combos_files)}",
+                os.path.join(_work_dir, f"reduce-{reduce_num}-{my_pid}-{time.time():.06f}"),
+                lambda combos_file, combos_files=combos_files: reduce(combos_files, combos_file),
+            )
+        return False
+
     # Make provisions for killing all workers:
     def kill_workers():
         log.warn("Killing all pending workers")
@@ -195,113 +754,221 @@ def generate_combos(r, n_parallel=None, check_combo=None, _work_dir=default_work
             signal.signal(sig, saved_sighandlers[sig])
             del saved_sighandlers[sig]
 
-    prefix_total, iter_num = n_choose_k(len(blockset_81), prefix_sz), 0
-    for prefix in combinations(blockset_81, prefix_sz):
-        iter_num += 1
-        prefix = tuple(sorted(prefix))
-        # To avoid duplicated work, only suffixes made of blocks > max(prefix)
-        # should be considered:
-        suffix_set = set(b for b in blockset_81 if b > prefix[-1])
-        if len(prefix) + len(suffix_set) < r:
-            continue
-        # Ensure that at most n_parallel jobs are running at a time; wait as needed:
-        if wait_pids_report_err(threshold=n_parallel-1):
+    prefix_total = n_choose_k(len(blockset), prefix_sz)
+    # Move the current objects, e.g. check_combo, out of the reach of the GC,
+    # which would otherwise write their headers, hence copy their pages, in
+    # each worker:
+    gc.freeze()
+    for iter_num, prefix, suffix_set, candidate_num in tasks:
+        # Ensure that at most n_parallel jobs, or fewer w/ adaptive
+        # concurrency, are running at a time; wait as needed:
+        if start_reducers() or wait_pids_report_err():
             # Worker error, abandon du travail:
             kill_workers()
             combos = None
             break
-        work_file_root = os.path.join(_work_dir, '-'.join(map(str, prefix)) + f"-{len(suffix_set)}-{my_pid}-{time.time():.06f}")
-        pkl_file = work_file_root + ".pkl"
-        stdout_file = work_file_root + ".out"
-        stderr_file = work_file_root + ".err"
-        candidate_num = n_choose_k(len(suffix_set), r - len(prefix))
+        if expired:
+            break
         description = f"r: {r}, prefix_sz: {prefix_sz}, step: {iter_num}/{prefix_total}, candidate#: {candidate_num}"
-        pid = os.fork()
-        if pid != 0:
-            pending_pids[pid] = {
-                'description': description,
-                'start': time.time(),
-                'pkl_file': pkl_file,
-                'out_file': stdout_file,
-                'err_file': stderr_file,
-            }
-            log.info(f"pid: {pid}, {description}, started")
-        else:
-            os.setsid()
-            stdin_fh = open("/dev/null")
-            stdout_fh = open(stdout_file, "wt")
-            stderr_fh = open(stderr_file, "wt")
-            os.dup2(stdin_fh.fileno(), sys.stdin.fileno())       
-            os.dup2(stdout_fh.fileno(), sys.stdout.fileno())
-            os.dup2(stderr_fh.fileno(), sys.stderr.fileno())
-            generate_combo_batch(r, prefix=prefix, suffix_set=suffix_set, check_combo=check_combo, pkl_file=pkl_file)
-            sys.exit(0)
-    if wait_pids_report_err():
-        combos = None
+        pid = fork_child(
+            "task",
+            description,
+            os.path.join(_work_dir, '-'.join(map(str, prefix)) + f"-{len(suffix_set)}-{my_pid}-{time.time():.06f}"),
+            lambda combos_file, prefix=prefix, suffix_set=suffix_set: generate_combo_batch(
+                r,
+                prefix=prefix,
+                suffix_set=suffix_set,
+                check_combo=resolved,
+                resolved=resolved,
+                walker=walker,
+                combos_file=combos_file,
+            ),
+        )
+        if progress is not None:
+            progress.task_started(pid, description, candidate_num)
+    # Wait for the workers, then for the reducers, down to less than
+    # reduce_fan_in files, merged here:
+    while combos is not None:
+        if start_reducers() or wait_pids_report_err(threshold=max(len(pending_pids) - 1, 0)):
+            kill_workers()
+            combos = None
+        elif not pending_pids:
+            break
+    complete = tasks_done == task_num
+    if combos is not None:
+        combos, total_count = merge_combos_files(ready_files, combos)
+        log.info(f"Merged {len(ready_files)} files, keep {len(combos)} out of {total_count} combos")
+        if not complete:
+            log.warn(f"r: {r}, {tasks_done} out of {task_num} tasks completed, the combos are partial")
+    for file_path in ready_files:
+        os.unlink(file_path)
+    gc.unfreeze()
+    if saved_sigmask is not None:
+        signal.pthread_sigmask(signal.SIG_SETMASK, saved_sigmask)
     restore_sighandlers()
-    return combos
+    if progress is not None:
+        progress.finish_r(r, len(combos) if combos is not None else None, ok=combos is not None)
+    return combos, complete
 
 
-def update_combo_pkl_file(
+def load_combo_pkl_file(combo_pkl_file=default_combo_pkl_file):
+    ''' Return (all_combos, max_len) from combo_pkl_file, ({}, 0) if missing
+    '''
+    all_combos, max_len = {}, 0
+    try:
+        with open(combo_pkl_file, 'rb') as f:
+            all_combos = pickle.load(f)
+    except FileNotFoundError as e:
+        log.warn(e)
+    if all_combos:
+        max_len = max(map(len, all_combos.values()))
+    return all_combos, max_len
+
+
+def load_combos(store_dir=default_store_dir, combo_pkl_file=default_combo_pkl_file):
+    ''' Return (all_combos, max_len) from the store, or from combo_pkl_file
+    if the store was not created yet.
+    '''
+    store = ComboStore(store_dir)
+    if store.exists():
+        return store.load(), store.max_len
+    return load_combo_pkl_file(combo_pkl_file)
+
+
+def update_combo_store(
         max_len=parallel_cutoff, 
         n_parallel=None, 
+        store_dir=default_store_dir,
         combo_pkl_file=default_combo_pkl_file,
+        progress=None,
+        walker=default_walker,
+        adaptive=True,
+        min_free_bytes=None,
+        coordinator=None,
+        time_budget=None,
+        profile_dir=None,
+        blockset=default_blockset,
         _work_dir=default_work_dir,
 ):
-    '''Update combo file with all combos of size <= max_len
+    '''Update the combo store with all combos of size <= max_len
+
+    Each length is appended as a new segment, see store.py; a missing store is
+    first migrated from combo_pkl_file, if any, for blockset_81.
+
+    progress (ProgressTracker): optional, see progress.py
+    walker (str): the combination walker, see _generate_combo_batch
+    adaptive, min_free_bytes: see generate_combos
+    coordinator (Coordinator): optional, for generating the lengths beyond
+        parallel_cutoff w/ its workers rather than w/ local processes, see
+        distributed.py
+    time_budget (float): optional, the max time for the run, in seconds;
+        the length in progress when it expires is stored w/ the results of
+        its completed tasks, marked incomplete, and the next update regenerates
+        it, see generate_combos and store.py
+    profile_dir, blockset: see generate_combos; the store must be for
+        blockset, see store_dir_for
+
+    Return:
+        dict: all the combos, or None on error
     '''
-    log.info(f"Check/update {combo_pkl_file} for max_len={max_len}")
-    combo_pkl_dir = os.path.dirname(combo_pkl_file)
-    os.makedirs(combo_pkl_dir, exist_ok=True)
+    log.info(f"Check/update {store_dir} for max_len={max_len}")
+    os.makedirs(store_dir, exist_ok=True)
 
     # Acquire lock:
-    combo_pkl_file_lck = f"{combo_pkl_file}.lck"
+    store_lck = os.path.join(store_dir, "store.lck")
     try:
-        lock_f = open(combo_pkl_file_lck, 'a+')
+        lock_f = open(store_lck, 'a+')
         os.lockf(lock_f.fileno(), os.F_TLOCK, 0)
     except Exception as e:
-        log.warn(f"Cannot acquire lock {combo_pkl_file_lck}: {e}")
-        return
+        # No progress is reported, since the status file is the one of the
+        # run holding the lock:
+        log.warn(f"Cannot acquire lock {store_lck}: {e}")
+        return None
 
-    # Load the previous file, if any, and determine its max size:
-    log.info("Load previous file, if any")
     try:
-        all_combos, prev_max_len = {}, 0
-        with open(combo_pkl_file, 'rb') as f:
-            all_combos = pickle.load(f)
-    except FileNotFoundError as e:
+        store = ComboStore(store_dir, blockset=blockset)
+    except ValueError as e:
         log.warn(e)
-    if all_combos:
-        prev_max_len = max(map(len, all_combos.values()))
+        if progress is not None:
+            progress.finish(ok=False)
+        return None
+    if (
+            not store.exists() and blockset == default_blockset
+            and combo_pkl_file is not None and os.path.isfile(combo_pkl_file)
+    ):
+        log.info(f"Migrate {combo_pkl_file} to {store_dir}")
+        store = migrate_combo_pkl_file(combo_pkl_file, store_dir)
+
+    # Load the previous segments, if any, except for an incomplete one, which
+    # is regenerated:
+    log.info("Load previous segments, if any")
+    prev_max_len = store.max_len
+    if store.incomplete_len is not None:
+        prev_max_len -= 1
+        log.info(f"Segment r={store.incomplete_len} is incomplete, it will be regenerated")
+    all_combos = store.load(prev_max_len)
     log.info(f"Previous max_len={prev_max_len}, num_targets={len(all_combos)}")
+    complete = True
     if prev_max_len >= max_len:
-        log.info(f"File up to date, nothing to be done")
+        log.info(f"Store up to date, nothing to be done")
     else:
         new_combo_count = 0
         start_all = time.time()
+        deadline = start_all + time_budget if time_budget is not None else None
+        if progress is not None:
+            progress.start(prev_max_len+1, max_len)
         for r in range(prev_max_len+1, max_len+1):
             start = time.time()
-            combos = generate_combos(r, n_parallel=n_parallel, check_combo=all_combos, _work_dir=_work_dir)
+            if deadline is not None and start >= deadline:
+                log.warn(f"Time budget exhausted before r={r}")
+                complete = False
+                break
+            if coordinator is not None and is_parallel(r, coordinator.shard_num, blockset=blockset):
+                combos, complete = coordinator.run(
+                    r, all_combos, walker=walker, progress=progress, deadline=deadline, blockset=blockset
+                )
+            else:
+                combos, complete = generate_combos(
+                    r,
+                    n_parallel=n_parallel,
+                    check_combo=all_combos,
+                    progress=progress,
+                    walker=walker,
+                    adaptive=adaptive,
+                    min_free_bytes=min_free_bytes,
+                    deadline=deadline,
+                    profile_dir=profile_dir,
+                    blockset=blockset,
+                    _work_dir=_work_dir,
+                )
             d_time = time.time() - start
             if combos is None:
-                log.warn("Error, file will not be updated")
+                log.warn("Error, store will not be updated")
+                if progress is not None:
+                    progress.finish(ok=False)
                 return None
             else:
                 common_targets = set(combos).intersection(all_combos)
                 if len(common_targets) > 0:
                     log.fatal(f"r={r}, common_targets={common_targets}")
+                    if progress is not None:
+                        progress.finish(ok=False)
                     return None
                 new_combo_count += len(combos)
                 log.info(f"{len(combos)} combos of size {r} generated in {d_time:.06f} sec")
-                if len(combos) > 0:
-                    all_combos.update(combos)
-                    with open(combo_pkl_file, 'wb') as f:
-                        pickle.dump(all_combos, f)
-                    log.info(f"{combo_pkl_file} updated, max_len={r}, num_targets={len(all_combos)}")  
+                # Append even if empty, such that the max length advances:
+                store.append(r, combos, complete=complete)
+                all_combos.update(combos)
+                log.info(
+                    f"{store_dir} updated, max_len={r}{'' if complete else ' (incomplete)'}"
+                    + f", num_targets={len(all_combos)}"
+                )
+                if not complete:
+                    # The next lengths need this one complete:
+                    break
         d_time = time.time() - start_all
         log.info(f"{new_combo_count} total combos generated in {d_time:.06f} sec")
+    if progress is not None:
+        progress.finish(complete=complete)
     os.lockf(lock_f.fileno(), os.F_ULOCK, 0)
     return all_combos
-
-
-
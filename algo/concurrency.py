@@ -0,0 +1,127 @@
+#! /usr/bin/env python3
+
+''' Memory-aware adaptive concurrency for the forked workers of generate_combos
+
+The number of workers allowed to run is re-evaluated while waiting for them:
+the private memory of each running worker is sampled from
+/proc/PID/smaps_rollup and the free memory from /proc/meminfo. The peak
+private memory of the workers so far is the estimate for a new one and the
+limit is the number of running workers plus as many new ones as fit in the
+free memory, above a reserve, after the running ones grow to the peak too,
+within [1, max_parallel]. The limit changes are logged.
+
+Where /proc is not available, the limit is max_parallel.
+'''
+
+import logging
+import time
+
+log = logging.getLogger("combo")
+
+# The share of the total memory kept free, by default:
+default_min_free_ratio = 0.1
+# How often to sample the memory while waiting for the workers, in seconds:
+default_poll_interval = 0.05
+
+
+def mem_info():
+    ''' Return (available, total) memory in bytes, or None if unknown.
+    '''
+    try:
+        with open("/proc/meminfo", "rt") as f:
+            info = {}
+            for line in f:
+                key, val = line.split(":", 1)
+                info[key] = int(val.split()[0]) * 1024
+        return info["MemAvailable"], info["MemTotal"]
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def private_rss(pid):
+    ''' Return the resident memory of pid not shared w/ other processes, in
+    bytes, or None if unknown. Unlike the RSS, that excludes the pages
+    inherited from the parent and not written since.
+    '''
+    try:
+        private = 0
+        with open(f"/proc/{pid}/smaps_rollup", "rt") as f:
+            for line in f:
+                if line.startswith("Private_"):
+                    private += int(line.split()[1]) * 1024
+        return private
+    except (OSError, ValueError):
+        return None
+
+
+def fmt_mib(n):
+    return f"{n / (1 << 20):.0f} MiB"
+
+
+class AdaptiveConcurrency:
+    ''' Decide how many workers may run, based on their memory.
+
+    Input:
+        max_parallel (int): the upper bound
+        min_free_bytes (int): the memory to keep free, default:
+            default_min_free_ratio of the total memory
+        poll_interval (float): the sampling interval, in seconds, see
+            generate_combos
+    '''
+
+    def __init__(self, max_parallel, min_free_bytes=None, poll_interval=default_poll_interval):
+        self.max_parallel = max_parallel
+        info = mem_info()
+        self.enabled = info is not None
+        if min_free_bytes is None and info is not None:
+            min_free_bytes = int(info[1] * default_min_free_ratio)
+        self.min_free_bytes = min_free_bytes or 0
+        self.poll_interval = poll_interval
+        self.rss = {}
+        self.peak_bytes = 0
+        self.current = max_parallel
+        self.sample_time = 0
+
+    def sample(self, pids):
+        ''' Sample the private memory of the running workers, at most once per
+        poll_interval.
+        '''
+        now = time.monotonic()
+        if now - self.sample_time < self.poll_interval:
+            return
+        self.sample_time = now
+        for pid in pids:
+            rss = private_rss(pid)
+            if rss is not None:
+                self.rss[pid] = max(rss, self.rss.get(pid, 0))
+                self.peak_bytes = max(self.peak_bytes, rss)
+
+    def task_done(self, pid):
+        self.rss.pop(pid, None)
+
+    def limit(self, running_pids):
+        ''' Return the max number of workers to run, given the running ones.
+        '''
+        if not self.enabled:
+            return self.max_parallel
+        info = mem_info()
+        if info is None:
+            return self.max_parallel
+        available = info[0]
+        headroom = available - self.min_free_bytes
+        if self.peak_bytes == 0:
+            # Nothing known about the workers yet:
+            limit = self.max_parallel if headroom > 0 else 1
+        else:
+            # The running workers may grow up to the peak:
+            headroom -= sum(max(self.peak_bytes - self.rss.get(pid, 0), 0) for pid in running_pids)
+            limit = len(running_pids) + max(headroom, 0) // self.peak_bytes
+        limit = min(max(limit, 1), self.max_parallel)
+        if limit != self.current:
+            log.info(
+                f"Concurrency {self.current} -> {limit}: available: {fmt_mib(available)}"
+                + f", reserve: {fmt_mib(self.min_free_bytes)}, worker peak: {fmt_mib(self.peak_bytes)}"
+                + f", running: {len(running_pids)}"
+            )
+            self.current = limit
+        return limit
@@ -0,0 +1,164 @@
+#! /usr/bin/env python3
+
+''' Blockset design evaluation w/ bitset reachability
+
+The targets reachable w/ exactly k distinct blocks are kept as one bitset per
+k, i.e. a Python int w/ bit t set for target t, such that adding a block b is
+one shift-or per k:
+
+    layers[k] |= layers[k-1] << b,  for k = max_len .. 1
+
+which is the 0/1 subset sum DP, w/o any per target loop. The metrics of a
+design follow from the cumulative layers: the targets reachable w/ at most h
+blocks, their contiguous ranges and the min stack length of each target, as
+for the coverage ranges worked out by hand in gofai.py.
+
+The variants adding a block are one more step from the base design. The ones
+removing a block cannot be undone from bitsets, hence all the single removal
+variants are computed at once by divide and conquer, see
+iter_removal_variants, w/ O(n log n) block additions instead of O(n^2) from
+scratch.
+'''
+
+import re
+
+default_heights = (2, 3, 4, 5, 6, 8, 11)
+
+
+def popcount(bits):
+    return bin(bits).count("1")
+
+
+def iter_ranges(bits):
+    ''' Yield the (start, end) contiguous ranges of the set bits.
+    '''
+    # The LS bit first:
+    for match in re.finditer("1+", bin(bits)[:1:-1]):
+        yield match.start(), match.end() - 1
+
+
+class Reach:
+    ''' The targets reachable w/ exactly k distinct blocks of a design, for k
+    = 0 .. max_len.
+
+    Input:
+        max_len (int): the max stack length accounted for
+        layers (list): the bitset per k, default: the empty design
+    '''
+
+    def __init__(self, max_len, layers=None):
+        self.max_len = max_len
+        self.layers = layers if layers is not None else [1] + [0] * max_len
+
+    def add(self, block):
+        ''' Return the Reach of the design w/ block added. The design is a
+        multiset: a block in it already is added as another copy.
+        '''
+        layers = self.layers
+        new_layers = [layers[0]]
+        for k in range(1, self.max_len + 1):
+            new_layers.append(layers[k] | (layers[k - 1] << block))
+        return Reach(self.max_len, new_layers)
+
+    def add_many(self, blocks):
+        reach = self
+        for block in blocks:
+            reach = reach.add(block)
+        return reach
+
+    def cumulative(self):
+        ''' Return the list of the bitsets of the targets reachable w/ at most
+        h blocks, for h = 0 .. max_len, target 0 excluded.
+        '''
+        reached, cumulative = 0, []
+        for layer in self.layers:
+            reached |= layer
+            cumulative.append(reached & ~1)
+        return cumulative
+
+
+def build_reach(blocks, max_len=None):
+    ''' Return the Reach of blocks, w/ max_len defaulting to their number.
+    '''
+    blocks = list(blocks)
+    return Reach(len(blocks) if max_len is None else max_len).add_many(blocks)
+
+
+def evaluate(reach, heights=default_heights, window=None):
+    ''' Return the metrics of a design.
+
+    Input:
+        reach (Reach): the design
+        heights (iterable): the max stack heights, in blocks, of the per
+            height metrics; the ones beyond reach.max_len are skipped
+        window (tuple): optional, the (min_target, max_target) range the
+            metrics are restricted to
+
+    Return:
+        dict: w/ per max height: the number of reachable targets, of
+            contiguous ranges and the longest range; and for all the
+            reachable targets: their number, the average and the max of
+            their min stack lengths
+    '''
+    cumulative = reach.cumulative()
+    if window is not None:
+        lo, hi = window
+        window_bits = (1 << (hi + 1)) - (1 << lo)
+        cumulative = [reached & window_bits for reached in cumulative]
+    per_height = []
+    for h in heights:
+        if h > reach.max_len:
+            continue
+        ranges = list(iter_ranges(cumulative[h]))
+        per_height.append({
+            "max_height": h,
+            "reachable": popcount(cumulative[h]),
+            "ranges": len(ranges),
+            "longest_range": max(ranges, key=lambda r: r[1] - r[0], default=None),
+        })
+    counts = [popcount(reached) for reached in cumulative]
+    reachable = counts[-1]
+    # The targets whose min stack length is k are the ones new at k:
+    len_sum = sum(k * (counts[k] - counts[k - 1]) for k in range(1, len(counts)))
+    max_min_len = next((k for k in range(len(counts) - 1, 0, -1) if counts[k] > counts[k - 1]), 0)
+    return {
+        "heights": per_height,
+        "reachable": reachable,
+        "avg_min_len": len_sum / reachable if reachable else None,
+        "max_min_len": max_min_len,
+    }
+
+
+def iter_add_variants(reach, candidates):
+    ''' Yield (block, Reach) for the design w/ each candidate block added.
+    '''
+    for block in candidates:
+        yield block, reach.add(block)
+
+
+def iter_removal_variants(blocks, max_len=None):
+    ''' Yield (block, Reach) for the design of blocks w/o each one of them,
+    once per distinct block.
+
+    Each half of the blocks is added to the Reach of the blocks outside of
+    the other half, recursively, such that a leaf is the Reach of all the
+    blocks but its own.
+    '''
+    blocks = list(blocks)
+    if max_len is None:
+        max_len = len(blocks)
+    first_index = {}
+    for i, block in enumerate(blocks):
+        first_index.setdefault(block, i)
+
+    def split(reach, lo, hi):
+        if hi - lo == 1:
+            if first_index[blocks[lo]] == lo:
+                yield blocks[lo], reach
+            return
+        mid = (lo + hi) // 2
+        yield from split(reach.add_many(blocks[mid:hi]), lo, mid)
+        yield from split(reach.add_many(blocks[lo:mid]), mid, hi)
+
+    if blocks:
+        yield from split(Reach(max_len), 0, len(blocks))
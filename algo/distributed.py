@@ -0,0 +1,370 @@
+#! /usr/bin/env python3
+
+''' Distributed combo generation: a coordinator hands out prefix shards to
+workers on any host, over multiprocessing.connection, i.e. TCP w/ an HMAC
+authentication key.
+
+Protocol, w/ pickled tuples, each request answered by one response:
+
+    worker                              coordinator
+    ("hello", worker_id)            ->  ("ok",)
+    ("get", r)                      ->  ("setup", r, walker, resolved_targets_bytes, size)
+                                        if r is not the current length
+                                        ("task", task_id, prefix, suffix_set)
+                                        ("wait", sec), if no task is available now
+                                        ("bye",), once the coordinator is closed
+    ("result", task_id, targets_bytes, blocks_bytes)
+                                    ->  ("ok",)
+
+The resolved targets and the results are unsigned int arrays, see
+combo.encode_combos. A task is leased to a worker until its result comes back;
+the lease is revoked, and the task handed out again, when the worker's
+connection is lost or when the lease times out, e.g. for a hung host. A
+late result for a task already done is ignored.
+
+The workers run the same kernel as generate_combos, _generate_combo_batch.
+'''
+
+import array
+from collections import deque
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+import os
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from .blockset import default_blockset
+from .combo import (
+    _generate_combo_batch,
+    default_walker,
+    encode_combos,
+    get_prefix_sz,
+    iter_prefix_tasks,
+    log,
+    merge_combos_arrays,
+    n_choose_k,
+    sort_by_yield,
+)
+from .profiling import profile_file, run_profiled
+from .resolved import ResolvedTargets
+
+default_port = 8482
+authkey_env = "GAUGE_AUTHKEY"
+# The min number of shards per length:
+default_shard_num = 256
+default_lease_timeout = 600.0
+# How long a worker without a task waits before asking again:
+wait_sec = 0.5
+# How long a worker retries connecting to the coordinator:
+default_connect_timeout = 60.0
+
+
+def parse_address(address):
+    ''' Return (host, port) from HOST:PORT, HOST or :PORT.
+    '''
+    host, _, port = address.rpartition(":") if ":" in address else (address, "", "")
+    return host or "127.0.0.1", int(port) if port else default_port
+
+
+def get_authkey(authkey=None):
+    ''' Return the authkey as bytes, from the environment if None.
+    '''
+    if authkey is None:
+        authkey = os.environ.get(authkey_env)
+    if not authkey:
+        raise ValueError(f"No authkey, set {authkey_env}")
+    return authkey.encode() if isinstance(authkey, str) else authkey
+
+
+class Coordinator:
+    ''' Hand out the prefix shards of a length at a time and merge the results.
+
+    Input:
+        address (tuple): the (host, port) to listen on
+        authkey (bytes): the shared authentication key
+        lease_timeout (float): the max time, in seconds, for a worker to
+            return the result of a task
+        shard_num (int): the min number of shards per length
+
+    Usage:
+        coordinator = Coordinator(address, authkey)
+        # Fork the local workers, if any, before the threads are started:
+        ...
+        coordinator.start()
+        combos = coordinator.run(r, check_combo)
+        ...
+        coordinator.close()
+    '''
+
+    def __init__(
+            self,
+            address,
+            authkey,
+            lease_timeout=default_lease_timeout,
+            shard_num=default_shard_num,
+    ):
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+        self.lease_timeout = lease_timeout
+        self.shard_num = shard_num
+        self.cond = threading.Condition()
+        self.closed = False
+        self.r = None
+        self.setup = None
+        self.pending = deque()
+        # task_id -> (worker_id, deadline, task):
+        self.leases = {}
+        self.tasks = {}
+        self.done = set()
+        self.combos = {}
+        self.progress = None
+        self.workers = set()
+
+    def start(self):
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        # Let the workers asking for tasks get their ("bye",):
+        time.sleep(wait_sec * 2)
+        self.listener.close()
+
+    def _accept_loop(self):
+        while not self.closed:
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError, AuthenticationError) as e:
+                # Closed, or a failed handshake, e.g. a wrong authkey, which
+                # must not stop the other workers from connecting:
+                if not self.closed:
+                    log.warn(f"rejected connection: {e!r}")
+                continue
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        worker_id = None
+        try:
+            while True:
+                msg = conn.recv()
+                kind = msg[0]
+                if kind == "hello":
+                    worker_id = msg[1]
+                    with self.cond:
+                        self.workers.add(worker_id)
+                    log.info(f"worker: {worker_id}, connected")
+                    conn.send(("ok",))
+                elif kind == "get":
+                    conn.send(self._get_task(worker_id, msg[1]))
+                elif kind == "result":
+                    _, task_id, targets_bytes, blocks_bytes = msg
+                    self._add_result(worker_id, task_id, targets_bytes, blocks_bytes)
+                    conn.send(("ok",))
+                else:
+                    raise ValueError(f"Unexpected message {kind!r}")
+        except (EOFError, OSError):
+            pass
+        except Exception as e:
+            log.warn(f"worker: {worker_id}, unexpected exception: {e}")
+        finally:
+            conn.close()
+            self._revoke(worker_id, "disconnected")
+
+    def _get_task(self, worker_id, worker_r):
+        with self.cond:
+            if self.closed:
+                return ("bye",)
+            if self.r is None:
+                return ("wait", wait_sec)
+            if worker_r != self.r:
+                return self.setup
+            if not self.pending:
+                return ("wait", wait_sec)
+            task_id = self.pending.popleft()
+            iter_num, prefix, suffix_set, candidate_num = task = self.tasks[task_id]
+            self.leases[task_id] = (worker_id, time.monotonic() + self.lease_timeout, task)
+            description = f"worker: {worker_id}, r: {self.r}, step: {iter_num}, candidate#: {candidate_num}"
+            log.info(f"{description}, started")
+            if self.progress is not None:
+                self.progress.task_started(f"{worker_id}/{iter_num}", description, candidate_num)
+            return ("task", task_id, prefix, suffix_set)
+
+    def _add_result(self, worker_id, task_id, targets_bytes, blocks_bytes):
+        targets, blocks = array.array("I"), array.array("I")
+        targets.frombytes(targets_bytes)
+        blocks.frombytes(blocks_bytes)
+        with self.cond:
+            r, iter_num = task_id
+            if r != self.r or task_id in self.done:
+                log.info(f"worker: {worker_id}, r: {r}, step: {iter_num}, late result ignored")
+                return
+            self.leases.pop(task_id, None)
+            if task_id in self.pending:
+                self.pending.remove(task_id)
+            merge_combos_arrays(r, targets, blocks, self.combos)
+            self.done.add(task_id)
+            log.info(f"worker: {worker_id}, r: {r}, step: {iter_num}, completed w/ {len(targets)} combos")
+            if self.progress is not None:
+                self.progress.task_done(f"{worker_id}/{iter_num}", new_targets=len(targets))
+            self.cond.notify_all()
+
+    def _revoke(self, worker_id, reason):
+        with self.cond:
+            self.workers.discard(worker_id)
+            for task_id, (lease_worker_id, _, _) in list(self.leases.items()):
+                if lease_worker_id == worker_id:
+                    self._requeue(task_id, reason)
+
+    def _requeue(self, task_id, reason):
+        # Under self.cond:
+        worker_id, _, _ = self.leases.pop(task_id)
+        r, iter_num = task_id
+        log.warn(f"worker: {worker_id}, r: {r}, step: {iter_num}, {reason}, task reassigned")
+        if self.progress is not None:
+            self.progress.task_failed(f"{worker_id}/{iter_num}")
+        self.pending.appendleft(task_id)
+        self.cond.notify_all()
+
+    def run(self, r, check_combo, walker=default_walker, progress=None, deadline=None, blockset=default_blockset):
+        ''' Generate the combinations of length r for targets not in
+        check_combo w/ the connected workers, as generate_combos does.
+
+        Return:
+            (dict, bool): the combos and whether all the shards completed,
+                i.e. False if the deadline was reached first
+        '''
+        resolved = ResolvedTargets(check_combo, size=blockset.max_target + 1)
+        prefix_sz = get_prefix_sz(r, self.shard_num, blockset=blockset)
+        tasks = list(iter_prefix_tasks(r, prefix_sz, resolved=resolved, blockset=blockset))
+        if deadline is not None:
+            tasks = sort_by_yield(r, tasks, resolved, blockset=blockset)
+        else:
+            # Heaviest first:
+            tasks = sorted(tasks, key=lambda task: -task[3])
+        log.info(
+            f"Coordinating combos for r={r} w/ prefix_sz={prefix_sz}, {len(tasks)} shards"
+            + f" out of {n_choose_k(len(blockset), prefix_sz)} prefixes"
+        )
+        if progress is not None:
+            progress.start_r(r, len(tasks))
+        with self.cond:
+            self.r = r
+            self.setup = ("setup", r, walker, array.array("I", check_combo).tobytes(), resolved.size)
+            self.tasks = {(r, task[0]): task for task in tasks}
+            self.pending = deque(self.tasks)
+            self.leases = {}
+            self.done = set()
+            self.combos = {}
+            self.progress = progress
+            while len(self.done) < len(self.tasks):
+                if deadline is not None and time.time() >= deadline:
+                    log.warn(f"r: {r}, deadline reached, {len(self.done)} out of {len(self.tasks)} shards completed")
+                    break
+                self.cond.wait(timeout=1.0)
+                now = time.monotonic()
+                for task_id, (_, lease_deadline, _) in list(self.leases.items()):
+                    if now > lease_deadline:
+                        self._requeue(task_id, "lease timeout")
+            combos, complete = self.combos, len(self.done) == len(self.tasks)
+            self.r, self.setup, self.tasks, self.combos, self.progress = None, None, {}, {}, None
+            # The shards still leased, if any, are abandoned:
+            self.pending, self.leases = deque(), {}
+        if progress is not None:
+            progress.finish_r(r, len(combos))
+        return combos, complete
+
+
+def run_worker(address, authkey, worker_id=None, connect_timeout=default_connect_timeout):
+    ''' Connect to the coordinator and run the tasks handed out until it says
+    bye or goes away.
+
+    Return:
+        int: the number of tasks run
+    '''
+    if worker_id is None:
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    deadline = time.monotonic() + connect_timeout
+    while True:
+        try:
+            conn = Client(address, authkey=authkey)
+            break
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(wait_sec)
+    task_count = 0
+    r, walker, resolved = None, default_walker, None
+    try:
+        conn.send(("hello", worker_id))
+        conn.recv()
+        while True:
+            conn.send(("get", r))
+            msg = conn.recv()
+            kind = msg[0]
+            if kind == "bye":
+                break
+            elif kind == "wait":
+                time.sleep(msg[1])
+            elif kind == "setup":
+                _, r, walker, targets_bytes, size = msg
+                targets = array.array("I")
+                targets.frombytes(targets_bytes)
+                resolved = ResolvedTargets(targets, size=size)
+            elif kind == "task":
+                _, task_id, prefix, suffix_set = msg
+                combos = _generate_combo_batch(
+                    r, prefix=prefix, suffix_set=suffix_set, check_combo=resolved, resolved=resolved, walker=walker
+                ) or {}
+                targets, blocks = encode_combos(combos)
+                conn.send(("result", task_id, targets.tobytes(), blocks.tobytes()))
+                conn.recv()
+                task_count += 1
+    except EOFError:
+        pass
+    finally:
+        conn.close()
+    return task_count
+
+
+def fork_workers(address, authkey, n, profile_dir=None):
+    ''' Fork n worker processes, e.g. on a worker host or as the local
+    stand-ins for the hosts, and return their pids.
+
+    profile_dir (str): optional, where each worker dumps its profile, see
+        profiling.py
+    '''
+    pids = []
+    for _ in range(n):
+        pid = os.fork()
+        if pid != 0:
+            pids.append(pid)
+            continue
+        exit_code = 0
+        try:
+            if profile_dir is not None:
+                run_profiled(profile_file(profile_dir, "worker", "worker"), run_worker, address, authkey)
+            else:
+                run_worker(address, authkey)
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(exit_code)
+    return pids
+
+
+def wait_workers(pids):
+    ''' Wait for the worker pids and return the number of failed ones.
+    '''
+    failed = 0
+    for pid in pids:
+        _, exit_code = os.waitpid(pid, 0)
+        if exit_code != 0:
+            log.warn(f"worker pid: {pid}, exit_code: {exit_code}")
+            failed += 1
+    return failed
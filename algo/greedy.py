@@ -47,18 +47,25 @@ def greedy_match(target, available_blocks, blocks):
     return target
 
 
-def resolve(target):
+def resolve(target, block_set=blockset_81):
+    ''' block_set: optional, a subset of blockset_81, e.g. the available blocks
+    '''
     # Edge case, direct match.
-    if target in blockset_81:
+    if target in block_set:
         return [target]
+    if not block_set:
+        return None
     best_target_deficit = None
     best_blocks = None
+    min_b = min_block if block_set is blockset_81 else min(block_set)
     for adj_b in adjustment_blocks:
+        if adj_b > 0 and adj_b not in block_set:
+            continue
         target_deficit = target - adj_b
-        if target_deficit < min_block:
+        if target_deficit < min_b:
             break
         blocks = []
-        available_blocks = set(blockset_81)
+        available_blocks = set(block_set)
         if adj_b > 0:
             blocks.append(adj_b)
             available_blocks.discard(adj_b)
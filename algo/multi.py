@@ -0,0 +1,198 @@
+#! /usr/bin/env python3
+
+''' Joint solver for several simultaneous stacks from one blockset
+
+The stacks cannot share blocks, hence the targets are resolved jointly, into
+pairwise disjoint resolutions minimizing the total number of blocks, in:
+
+ - a depth first search over the candidates of each target, i.e. its best
+   resolution and its alternatives, see unavailable.py, which avoid the
+   unavailable blocks; the targets w/ the fewest candidates are assigned
+   first and a branch is pruned once its total, plus the min lengths of the
+   targets left, reaches the best total so far
+ - unless the total is proven minimal, i.e. it is the sum of the
+   unconstrained min lengths, a sequential pass per order of the targets,
+   each target resolved w/o the blocks of the previous ones, see
+   UnavailableResolver, which falls back to the search for the conflicts
+   the alternatives do not cover, until the time budget runs out
+
+The unconstrained min length of a target is the length of its best
+resolution in the index. W/o an index, it is the length found by a
+search over the whole blockset, if proven within the search time budget,
+and the sum bound of bnb.SubsetSearch.len_bounds otherwise, in which case
+the total is seldom proven minimal.
+'''
+
+from itertools import permutations
+import time
+
+from .blockset import default_blockset
+from .bnb import solve
+from .unavailable import UnavailableResolver, all_blocks_mask, block_mask, mask_blocks, preference_key
+
+default_time_budget = 0.05
+# The max number of targets for which all the orders are tried:
+max_permuted_targets = 4
+
+
+def mask_len(mask):
+    return bin(mask).count("1")
+
+
+class MultiStackSolver:
+    ''' Resolve several targets w/ pairwise disjoint resolutions.
+
+    Input:
+        alternatives (dict): the alternatives index, see
+            unavailable.build_alternatives, or None for search only
+        time_budget (float): the max time per request, in seconds
+        search_time_budget (float): the max search time per target, see
+            UnavailableResolver, default: its default
+        blockset (Blockset): the blockset of the index and of the masks
+
+    Usage:
+        solver = MultiStackSolver(load_alternatives())
+        resolutions, optimal = solver.solve([123456, 34567])
+    '''
+
+    def __init__(
+            self,
+            alternatives=None,
+            time_budget=default_time_budget,
+            search_time_budget=None,
+            blockset=default_blockset,
+    ):
+        self.alternatives = alternatives if alternatives is not None else {}
+        self.time_budget = time_budget
+        self.blockset = blockset
+        resolver_kwargs = {"time_budget": search_time_budget} if search_time_budget is not None else {}
+        self.resolver = UnavailableResolver(self.alternatives, blockset=blockset, **resolver_kwargs)
+        # target -> the lower bound of its length, for the targets not in
+        # the index:
+        self._min_lens = {}
+
+    def candidates(self, target, unavailable=0):
+        ''' Return the candidate masks of target w/o the unavailable blocks,
+        best first.
+        '''
+        masks = self.alternatives.get(target)
+        if masks is not None:
+            return [mask for mask in masks if not mask & unavailable]
+        blocks = self.resolver.resolve(target, unavailable=unavailable)
+        return [block_mask(blocks, blockset=self.blockset)] if blocks is not None else []
+
+    def min_len(self, target):
+        ''' The lower bound of the length of any resolution of target, see
+        the module docstring.
+        '''
+        masks = self.alternatives.get(target)
+        if masks is not None:
+            # The best resolution:
+            return mask_len(masks[0])
+        min_len = self._min_lens.get(target)
+        if min_len is None:
+            search = self.resolver.get_search()
+            blocks, optimal = solve(target, time_budget=self.resolver.time_budget, search=search)
+            min_len = len(blocks) if blocks is not None and optimal else search.len_bounds(target)[0]
+            self._min_lens[target] = min_len
+        return min_len
+
+    def search_candidates(self, targets, unavailable=0):
+        ''' Return the best assignment, as a list of masks in targets order,
+        of the candidates, or None if none.
+        '''
+        candidates = [
+            sorted(
+                ((mask_len(mask), mask) for mask in self.candidates(target, unavailable=unavailable)),
+                key=lambda candidate: candidate[0],
+            )
+            for target in targets
+        ]
+        order = sorted(range(len(targets)), key=lambda i: len(candidates[i]))
+        # The min lengths of the targets left, from each depth on:
+        rest_min_lens = [0] * (len(order) + 1)
+        for depth in range(len(order) - 1, -1, -1):
+            i_candidates = candidates[order[depth]]
+            rest_min_lens[depth] = rest_min_lens[depth + 1] + (i_candidates[0][0] if i_candidates else 0)
+        best_total, best_masks = None, None
+        masks = [0] * len(targets)
+
+        def dfs(depth, used, total):
+            nonlocal best_total, best_masks
+            if depth == len(order):
+                best_total, best_masks = total, list(masks)
+                return
+            i = order[depth]
+            for length, mask in candidates[i]:
+                if best_total is not None and total + length + rest_min_lens[depth + 1] >= best_total:
+                    # The candidates are by increasing length:
+                    break
+                if not mask & used:
+                    masks[i] = mask
+                    dfs(depth + 1, used | mask, total + length)
+
+        if all(candidates):
+            dfs(0, 0, 0)
+        return best_masks
+
+    def resolve_in_order(self, targets, order, unavailable=0):
+        ''' Return the masks, in targets order, of the targets resolved one at
+        a time in order, each w/o the blocks of the previous ones, or None if
+        one cannot be resolved.
+        '''
+        masks = [0] * len(targets)
+        used = unavailable
+        for i in order:
+            blocks = self.resolver.resolve(targets[i], unavailable=used)
+            if blocks is None:
+                return None
+            masks[i] = block_mask(blocks, blockset=self.blockset)
+            used |= masks[i]
+        return masks
+
+    def solve(self, targets, unavailable=0):
+        ''' Return the disjoint resolutions of targets w/ the min total number
+        of blocks found within the time budget.
+
+        Input:
+            targets (list): the targets, one per stack
+            unavailable (int): the mask of the unavailable blocks, see
+                unavailable.block_mask
+
+        Return:
+            (list, bool): the resolutions, as decreasing tuples in targets
+                order, or None if none was found, and whether the total is
+                proven minimal, which is reliable w/ an index only, see the
+                module docstring
+        '''
+        if sum(targets) > sum(mask_blocks(all_blocks_mask(self.blockset) & ~unavailable, blockset=self.blockset)):
+            return None, True
+        deadline = time.perf_counter() + self.time_budget
+        lower_bound = sum(self.min_len(target) for target in targets)
+        best_masks = self.search_candidates(targets, unavailable=unavailable)
+
+        def key(masks):
+            # The fewest blocks, then the preferred resolutions:
+            return (
+                sum(map(mask_len, masks)),
+                [preference_key(mask_blocks(mask, blockset=self.blockset)) for mask in masks],
+            )
+
+        if best_masks is None or key(best_masks)[0] > lower_bound:
+            indexes = range(len(targets))
+            orders = (
+                permutations(indexes) if len(targets) <= max_permuted_targets
+                else [sorted(indexes, key=lambda i: -targets[i])]
+            )
+            for order in orders:
+                masks = self.resolve_in_order(targets, order, unavailable=unavailable)
+                if masks is not None and (best_masks is None or key(masks) < key(best_masks)):
+                    best_masks = masks
+                if time.perf_counter() > deadline:
+                    break
+        if best_masks is None:
+            return None, False
+        return (
+            [mask_blocks(mask, blockset=self.blockset) for mask in best_masks],
+            key(best_masks)[0] == lower_bound,
+        )
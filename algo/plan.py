@@ -0,0 +1,333 @@
+#! /usr/bin/env python3
+
+''' Dry-run cost planner for the combo generation
+
+For each length r the plan combines:
+
+ - the tasks, as split by generate_combos, w/ their exact number of candidates
+ - the number of operations, i.e. sum bound checks and visited candidates, of
+   the real kernel, _generate_combo_batch, for each task, estimated w/ random
+   probes of its pruned search tree (Knuth's estimator)
+ - the cost per operation of the real kernel, timed on a sample of
+   representative sub-prefixes
+ - the exact number of new targets, based on the sums reachable w/ exactly r
+   blocks, computed w/ big int bitsets
+ - the peak memory for the combos dicts, based on the new targets
+'''
+
+import heapq
+from itertools import accumulate
+import random
+import sys
+import time
+
+from . import blockset_81
+from .combo import (
+    _generate_combo_batch,
+    get_n_parallel,
+    get_prefix_sz,
+    is_parallel,
+    iter_prefix_tasks,
+    n_choose_k,
+)
+from .resolved import ResolvedTargets, sum_bounds
+
+# The number of suffix blocks for the timed samples, such that each sample
+# checks at most C(80, 3) = 82160 candidates:
+sample_suffix_len = 3
+default_sample_num = 16
+# The min number of operations for timing the kernel:
+min_timed_ops = 100000
+default_probe_num = 16
+
+
+def reachable_sums(blocks, max_len):
+    ''' Return the list of bitsets, one per length 0..max_len, w/ bit s set if
+    s is the sum of some subset of that length.
+    '''
+    reach = [1] + [0] * max_len
+    for k, b in enumerate(blocks):
+        for c in range(min(k + 1, max_len), 0, -1):
+            reach[c] |= reach[c - 1] << b
+    return reach
+
+
+def bit_count(x):
+    return bin(x).count("1")
+
+
+def targets_to_bitset(targets):
+    buf = bytearray((max(targets, default=0) >> 3) + 1)
+    for target in targets:
+        buf[target >> 3] |= 1 << (target & 7)
+    return int.from_bytes(buf, "little")
+
+
+def bit_positions(x):
+    ''' Return the list of the set bit positions of x.
+    '''
+    positions = []
+    for i, byte in enumerate(x.to_bytes((x.bit_length() + 7) // 8, "little")):
+        if byte:
+            positions.extend(i * 8 + k for k in range(8) if byte & (1 << k))
+    return positions
+
+
+def dict_entry_bytes(n):
+    ''' The average size of a dict slot for a dict w/ n entries
+    '''
+    return sys.getsizeof(dict.fromkeys(range(n))) / n if n > 0 else 0
+
+
+def combo_entry_bytes(r, slot_bytes):
+    ''' The memory of a target -> combo entry, for combos of length r. The
+    blocks are shared, the key and the tuple are not.
+    '''
+    return slot_bytes + sys.getsizeof(2**20) + sys.getsizeof(tuple(range(r)))
+
+
+class SearchTree:
+    ''' The search tree of _generate_combo_batch w/ its sum bound pruning
+
+    A node chooses k more blocks out of suffix[start:], in decreasing order;
+    an inner node checks the sum bounds of its n - k + 1 - start children, a
+    leaf visits the n - start candidates. Either is counted as that many
+    operations. The targets found along the way, which prune the tree further,
+    are not accounted for.
+    '''
+
+    def __init__(self, r, prefix, suffix_set, resolved):
+        self.prefix = tuple(prefix)
+        self.suffix = sorted(set(suffix_set) - set(prefix), reverse=True)
+        self.sums = list(accumulate(self.suffix, initial=0))
+        self.k = r - len(prefix)
+        self.base = sum(prefix)
+        self.resolved = resolved
+        n = len(self.suffix)
+        self.is_empty = n < self.k or self.k <= 0 or resolved.is_saturated(
+            *sum_bounds(self.base, self.suffix, self.sums, 0, self.k)
+        )
+
+    def node_ops(self, start, k):
+        n = len(self.suffix)
+        return n - start if k == 1 else n - k + 1 - start
+
+    def children(self, start, k, base):
+        suffix, sums, resolved = self.suffix, self.sums, self.resolved
+        return [
+            j for j in range(start, len(suffix) - k + 1)
+            if not resolved.is_saturated(*sum_bounds(base + suffix[j], suffix, sums, j + 1, k - 1))
+        ]
+
+    def random_subtree(self, k, rnd):
+        ''' Follow a random path down to a node choosing k more blocks.
+
+        Return:
+            (prefix, suffix_set) for _generate_combo_batch, or None if the path
+                ends early
+        '''
+        if self.is_empty:
+            return None
+        start, node_k, base, chosen = 0, self.k, self.base, ()
+        while node_k > k:
+            children = self.children(start, node_k, base)
+            if not children:
+                return None
+            j = rnd.choice(children)
+            start, node_k, base, chosen = j + 1, node_k - 1, base + self.suffix[j], chosen + (self.suffix[j],)
+        return self.prefix + chosen, set(self.suffix[start:])
+
+    def count_ops(self):
+        if self.is_empty:
+            return 0
+
+        def count(start, k, base):
+            ops = self.node_ops(start, k)
+            if k > 1:
+                for j in self.children(start, k, base):
+                    ops += count(j + 1, k - 1, base + self.suffix[j])
+            return ops
+
+        return count(0, self.k, self.base)
+
+    def estimate_ops(self, probe_num=default_probe_num, rnd=None):
+        ''' Knuth's estimator: follow random paths and weight the ops of each
+        node by the product of the numbers of children along the path.
+        '''
+        if self.is_empty:
+            return 0
+        if rnd is None:
+            rnd = random.Random(0)
+        total = 0
+        for _ in range(probe_num):
+            start, k, base, weight = 0, self.k, self.base, 1
+            while True:
+                total += weight * self.node_ops(start, k)
+                if k == 1:
+                    break
+                children = self.children(start, k, base)
+                if not children:
+                    break
+                weight *= len(children)
+                j = rnd.choice(children)
+                start, k, base = j + 1, k - 1, base + self.suffix[j]
+        return total / probe_num
+
+
+def time_ops(r, trees, check_combo, resolved, sample_num=default_sample_num, rnd=None):
+    ''' Time the kernel for at least sample_num random sub-trees, choosing
+    sample_suffix_len more blocks, of the task trees, and until at least
+    min_timed_ops were timed, if possible.
+
+    Return:
+        (sec, ops): the overall time and number of operations
+    '''
+    if rnd is None:
+        rnd = random.Random(0)
+    trees = [tree for tree in trees if not tree.is_empty]
+    total_sec, total_ops = 0, 0
+    for i in range(sample_num * 16 if trees else 0):
+        if i >= sample_num and total_ops >= min_timed_ops:
+            break
+        tree = rnd.choice(trees)
+        subtree = tree.random_subtree(min(tree.k, sample_suffix_len), rnd)
+        if subtree is None:
+            continue
+        prefix, suffix_set = subtree
+        ops = SearchTree(r, prefix, suffix_set, resolved).count_ops()
+        if ops == 0:
+            continue
+        start = time.perf_counter()
+        _generate_combo_batch(
+            r, prefix=prefix, suffix_set=suffix_set, check_combo=check_combo, resolved=resolved
+        )
+        total_sec += time.perf_counter() - start
+        total_ops += ops
+    return total_sec, total_ops
+
+
+def schedule(task_secs, n_parallel):
+    ''' Return the wall time for running the tasks, in order, w/ at most
+    n_parallel at a time, as generate_combos does.
+    '''
+    slots = [0.0] * min(n_parallel, max(len(task_secs), 1))
+    for sec in task_secs:
+        heapq.heappush(slots, heapq.heappop(slots) + sec)
+    return max(slots)
+
+
+def plan_combos(
+        min_len,
+        max_len,
+        check_combo,
+        n_parallel=None,
+        sample_num=default_sample_num,
+        probe_num=default_probe_num,
+        seed=0,
+):
+    ''' Plan the generation of the combos of length min_len .. max_len
+
+    Input:
+        check_combo (dict): the targets resolved to shorter lengths, i.e. the
+            content of combo.pkl
+
+    Return:
+        list of dict: one per length r, w/ the number of tasks, candidates, the
+            estimated operations, cost per operation, wall time, the exact number of new
+            targets and the estimated peak memory of the parent, which holds
+            the previous and the new combos, and of each worker, which holds
+            at most its new combos.
+    '''
+    n_parallel = get_n_parallel(n_parallel)
+    rnd = random.Random(seed)
+    reach = reachable_sums(sorted(blockset_81), max_len)
+    resolved = targets_to_bitset(check_combo)
+    slot_bytes = dict_entry_bytes(len(check_combo))
+    prev_bytes = sum(combo_entry_bytes(len(combo), slot_bytes) for combo in check_combo.values())
+    plan = []
+    for r in range(min_len, max_len + 1):
+        # As passed to the workers, see generate_combos:
+        resolved_counts = ResolvedTargets(check_combo if r == min_len else bit_positions(resolved))
+        if is_parallel(r, n_parallel):
+            prefix_sz = get_prefix_sz(r, n_parallel)
+            # Heaviest first, as generate_combos does:
+            tasks = sorted(
+                (
+                    (prefix, suffix_set, task_candidate_num)
+                    for _, prefix, suffix_set, task_candidate_num
+                    in iter_prefix_tasks(r, prefix_sz, resolved=resolved_counts)
+                ),
+                key=lambda task: -task[2],
+            )
+        else:
+            tasks = [((), blockset_81, n_choose_k(len(blockset_81), r))]
+        task_candidate_nums = [task_candidate_num for _, _, task_candidate_num in tasks]
+        trees = [SearchTree(r, prefix, suffix_set, resolved_counts) for prefix, suffix_set, _ in tasks]
+        task_ops = [tree.estimate_ops(probe_num=probe_num, rnd=rnd) for tree in trees]
+        sec, ops = time_ops(r, trees, resolved_counts, resolved_counts, sample_num=sample_num, rnd=rnd)
+        sec_per_op = sec / ops if ops else 0
+        wall_sec = schedule([ops * sec_per_op for ops in task_ops], n_parallel)
+        new = reach[r] & ~resolved
+        resolved |= new
+        new_target_num = bit_count(new)
+        slot_bytes = dict_entry_bytes(new_target_num)
+        new_bytes = new_target_num * combo_entry_bytes(r, slot_bytes)
+        # The parent holds both combos and all_combos, w/ shared tuples:
+        parent_peak_bytes = prev_bytes + new_bytes + new_target_num * slot_bytes
+        worker_peak_bytes = 0
+        if is_parallel(r, n_parallel):
+            worker_peak_bytes = min(max(task_candidate_nums, default=0), new_target_num) * combo_entry_bytes(r, slot_bytes)
+        prev_bytes += new_bytes
+        plan.append({
+            "r": r,
+            "tasks": len(task_candidate_nums),
+            "candidates": sum(task_candidate_nums),
+            "ops": int(sum(task_ops)),
+            "ns_per_op": sec_per_op * 1e9,
+            "cpu_sec": sum(task_ops) * sec_per_op,
+            "wall_sec": wall_sec,
+            "new_targets": new_target_num,
+            "parent_peak_bytes": int(parent_peak_bytes),
+            "worker_peak_bytes": int(worker_peak_bytes),
+        })
+    return plan
+
+
+def format_plan(plan, n_parallel):
+    def fmt_sec(sec):
+        sec = int(sec)
+        days, sec = divmod(sec, 86400)
+        return (f"{days}d " if days else "") + f"{sec // 3600}:{sec // 60 % 60:02d}:{sec % 60:02d}"
+
+    def fmt_mib(n):
+        return f"{n / (1 << 20):.1f}"
+
+    if not plan:
+        return "Nothing to be done"
+
+    table = [(
+        "r", "tasks", "candidates", "ops", "ns/op", "wall time", "new targets",
+        "parent MiB", "worker MiB",
+    )]
+    for p in plan:
+        table.append((
+            str(p["r"]),
+            str(p["tasks"]),
+            str(p["candidates"]),
+            str(p["ops"]),
+            f"{p['ns_per_op']:.1f}",
+            fmt_sec(p["wall_sec"]),
+            str(p["new_targets"]),
+            fmt_mib(p["parent_peak_bytes"]),
+            fmt_mib(p["worker_peak_bytes"]),
+        ))
+    widths = [max(len(row[i]) for row in table) for i in range(len(table[0]))]
+    lines = ["  ".join(col.rjust(w) for col, w in zip(row, widths)) for row in table]
+    lines.append("")
+    lines.append(
+        f"n_parallel: {n_parallel}, total wall time: {fmt_sec(sum(p['wall_sec'] for p in plan))}"
+        + f", new targets: {sum(p['new_targets'] for p in plan)}"
+        + f", max parent memory: {fmt_mib(max(p['parent_peak_bytes'] for p in plan))} MiB"
+        + f", max total memory: {fmt_mib(max(p['parent_peak_bytes'] + n_parallel * p['worker_peak_bytes'] for p in plan))} MiB"
+    )
+    return "\n".join(lines)
@@ -0,0 +1,118 @@
+#! /usr/bin/env python3
+
+''' Per process profiling w/ cProfile and the merged hot-spot report
+
+Each profiled process, i.e. the parent and each forked worker or reducer,
+dumps its own profile into the profile directory as:
+
+    GROUP.KIND.PID.prof
+
+where GROUP is e.g. r09 for the processes of length 9 and main for the
+parent. The report merges the profiles of each group, then all of them, and
+ranks the functions by their own time, such that the CPU of each length is
+accounted for, e.g. combinations, sorted, the dict updates or the pickling.
+'''
+
+import cProfile
+import glob
+import io
+import os
+import pstats
+import time
+
+profile_ext = ".prof"
+default_top_n = 20
+default_sort_key = "tottime"
+
+# The profiler enabled in this process, if any, which a forked child
+# inherits and must stop before its own can start:
+_active = None
+
+
+def make_profile_dir(root_dir):
+    ''' Return a new profile directory under root_dir.
+    '''
+    profile_dir = os.path.join(
+        root_dir,
+        "profile-" + time.strftime("%Y-%m-%d-%H-%M-%S", time.gmtime()) + f"-{os.getpid()}",
+    )
+    os.makedirs(profile_dir, exist_ok=True)
+    return profile_dir
+
+
+def profile_file(profile_dir, group, kind, pid=None):
+    return os.path.join(profile_dir, f"{group}.{kind}.{pid or os.getpid()}{profile_ext}")
+
+
+def start_profile():
+    ''' Start and return a profiler for this process, see stop_profile.
+    '''
+    global _active
+    if _active is not None:
+        # Inherited from the parent:
+        _active.disable()
+    _active = cProfile.Profile()
+    _active.enable()
+    return _active
+
+
+def stop_profile(profiler, profile_file):
+    ''' Stop the profiler and dump its stats into profile_file.
+    '''
+    global _active
+    profiler.disable()
+    _active = None
+    profiler.dump_stats(profile_file)
+
+
+def run_profiled(profile_file, func, *args, **kwargs):
+    ''' Return func(*args, **kwargs), run under cProfile, whose stats are
+    dumped into profile_file, even if func raises.
+    '''
+    profiler = start_profile()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        stop_profile(profiler, profile_file)
+
+
+def group_profile_files(profile_dir):
+    ''' Return {group: [profile file, ...]} for the profiles in profile_dir.
+    '''
+    files_by_group = {}
+    for file_path in sorted(glob.glob(os.path.join(profile_dir, "*" + profile_ext))):
+        group = os.path.basename(file_path).split(".", 1)[0]
+        files_by_group.setdefault(group, []).append(file_path)
+    return files_by_group
+
+
+def format_report(profile_dir, top_n=default_top_n, sort_key=default_sort_key):
+    ''' Return the ranked hot spots of each group, then of all the groups.
+    '''
+    files_by_group = group_profile_files(profile_dir)
+    if not files_by_group:
+        return f"{profile_dir}: no profiles"
+    sections = sorted(files_by_group.items())
+    if len(sections) > 1:
+        sections.append(("all", [file_path for _, files in sections for file_path in files]))
+    lines = []
+    for group, files in sections:
+        stream = io.StringIO()
+        stats = pstats.Stats(*files, stream=stream)
+        stats.strip_dirs().sort_stats(sort_key).print_stats(top_n)
+        lines.append(f"=== {group}: {len(files)} process(es), {stats.total_tt:.3f} sec")
+        # Skip the header listing the files:
+        body = stream.getvalue()
+        start = body.find("   ncalls")
+        lines.append(body[start if start >= 0 else 0:].rstrip())
+        lines.append("")
+    return "\n".join(lines)
+
+
+def write_report(profile_dir, top_n=default_top_n, sort_key=default_sort_key):
+    ''' Write the report into profile_dir/report.txt and return it.
+    '''
+    report = format_report(profile_dir, top_n=top_n, sort_key=sort_key)
+    with open(os.path.join(profile_dir, "report.txt"), "wt") as f:
+        print(report, file=f)
+    return report
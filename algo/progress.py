@@ -0,0 +1,283 @@
+#! /usr/bin/env python3
+
+''' Progress, throughput and ETA instrumentation for the combo generation
+
+The progress is reported as events, written as JSON lines, and as a status
+snapshot, atomically replaced on every event, such that it can be read at any
+time from another process, see update_combo.py --status.
+'''
+
+import json
+import os
+import time
+
+from . import blockset_81
+from .combo import n_choose_k, default_work_dir
+
+default_status_file = os.path.join(default_work_dir, "update_combo.status.json")
+
+
+def write_status_file(status, status_file):
+    ''' Write the status atomically, via a temporary file and rename.
+    '''
+    t_status_file = f"{status_file}.{os.getpid()}_"
+    with open(t_status_file, "wt") as f:
+        json.dump(status, f, indent=2)
+        print(file=f)
+    os.replace(t_status_file, status_file)
+
+
+def read_status_file(status_file=default_status_file):
+    with open(status_file, "rt") as f:
+        return json.load(f)
+
+
+def pid_is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class ProgressTracker:
+    ''' Track the candidate combinations checked by the workers.
+
+    The per worker throughput is known only when a worker completes, the
+    progress of the running workers is estimated based on the average
+    throughput of the completed ones.
+
+    Input:
+        events_fh (file): where to write the JSON lines events, or None
+        status_file (str): the status file path, or None
+        num_blocks (int): the size of the blockset, for the candidate totals
+    '''
+
+    def __init__(self, events_fh=None, status_file=None, num_blocks=len(blockset_81)):
+        self.events_fh = events_fh
+        self.status_file = status_file
+        self.num_blocks = num_blocks
+        self.pid = os.getpid()
+        self.start_time = time.time()
+        self.state = "running"
+        self.r_range = None
+        self.r = None
+        self.r_start_time = None
+        self.r_candidates_total = 0
+        self.candidates_total = 0
+        self.candidates_done = 0
+        self.prev_r_candidates = 0
+        self.tasks_total = 0
+        self.tasks_done = 0
+        self.new_targets = 0
+        self.r_new_targets = 0
+        self.workers = {}
+        self.worker_time = 0
+        self.worker_candidates = 0
+        if status_file is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(status_file)), exist_ok=True)
+
+    def start(self, min_r, max_r):
+        self.r_range = (min_r, max_r)
+        self.candidates_total = sum(
+            n_choose_k(self.num_blocks, r) for r in range(min_r, max_r + 1)
+        )
+        self.emit("start", min_r=min_r, max_r=max_r, candidates_total=self.candidates_total)
+
+    def start_r(self, r, tasks_total):
+        self.r = r
+        self.r_start_time = time.time()
+        self.r_candidates_total = n_choose_k(self.num_blocks, r)
+        self.prev_r_candidates = self.candidates_done
+        self.tasks_total = tasks_total
+        self.tasks_done = 0
+        self.r_new_targets = 0
+        self.workers = {}
+        self.worker_time = 0
+        self.worker_candidates = 0
+        self.emit("start_r", r=r, tasks_total=tasks_total, candidates_total=self.r_candidates_total)
+
+    def task_started(self, pid, description, candidate_num):
+        self.workers[pid] = {
+            "description": description,
+            "candidate_num": candidate_num,
+            "start": time.time(),
+        }
+        self.emit("task_started", worker_pid=pid, description=description, candidate_num=candidate_num)
+
+    def task_done(self, pid, new_targets=0):
+        ''' Record a completed task, w/ new_targets the number of targets it
+        found; since the other tasks of the length may find some of them too,
+        the running count is an upper bound, corrected by finish_r.
+        '''
+        worker = self.workers.pop(pid, None)
+        if worker is None:
+            return
+        d_time = time.time() - worker["start"]
+        candidate_num = worker["candidate_num"]
+        self.tasks_done += 1
+        self.candidates_done += candidate_num
+        self.worker_time += d_time
+        self.worker_candidates += candidate_num
+        self.new_targets += new_targets
+        self.r_new_targets += new_targets
+        self.emit(
+            "task_done",
+            worker_pid=pid,
+            description=worker["description"],
+            candidate_num=candidate_num,
+            sec=d_time,
+            candidates_per_sec=candidate_num / d_time if d_time > 0 else None,
+            new_targets=new_targets,
+        )
+
+    def task_failed(self, pid, exit_code=None):
+        worker = self.workers.pop(pid, None)
+        self.emit(
+            "task_failed",
+            worker_pid=pid,
+            description=worker["description"] if worker else None,
+            exit_code=exit_code,
+        )
+
+    def finish_r(self, r, num_combos, ok=True):
+        # Candidates w/o a task, i.e. w/ too short suffixes, are done too:
+        self.candidates_done = self.prev_r_candidates + self.r_candidates_total
+        # The new targets are known only once the task results are merged:
+        if num_combos is not None:
+            self.new_targets += num_combos - self.r_new_targets
+            self.r_new_targets = num_combos
+        self.emit(
+            "finish_r" if ok else "fail_r",
+            r=r,
+            sec=time.time() - self.r_start_time,
+            num_combos=num_combos,
+        )
+
+    def finish(self, ok=True, complete=True):
+        ''' Record the end of the run, w/ complete False for a run stopped by
+        its time budget.
+        '''
+        self.state = ("done" if complete else "incomplete") if ok else "failed"
+        self.workers = {}
+        self.emit(self.state, sec=time.time() - self.start_time)
+
+    def worker_candidates_per_sec(self):
+        if self.worker_time > 0:
+            return self.worker_candidates / self.worker_time
+        return None
+
+    def estimated_candidates_done(self, now):
+        ''' The candidates checked by the completed tasks plus the estimated
+        ones for the running tasks.
+        '''
+        done = self.candidates_done
+        rate = self.worker_candidates_per_sec()
+        if rate is not None:
+            for worker in self.workers.values():
+                done += min(worker["candidate_num"], (now - worker["start"]) * rate)
+        return done
+
+    def status(self):
+        now = time.time()
+        elapsed = now - self.start_time
+        done = self.estimated_candidates_done(now)
+        rate = done / elapsed if elapsed > 0 else None
+        eta_sec = None
+        if self.state == "done":
+            eta_sec = 0
+        elif rate and self.candidates_total:
+            eta_sec = (self.candidates_total - done) / rate
+        worker_rate = self.worker_candidates_per_sec()
+        return {
+            "pid": self.pid,
+            "state": self.state,
+            "start_time": self.start_time,
+            "update_time": now,
+            "elapsed_sec": elapsed,
+            "r_range": self.r_range,
+            "r": self.r,
+            "tasks_total": self.tasks_total,
+            "tasks_done": self.tasks_done,
+            "candidates_total": self.candidates_total,
+            "candidates_done": done,
+            "fraction_done": done / self.candidates_total if self.candidates_total else None,
+            "candidates_per_sec": rate,
+            "worker_candidates_per_sec": worker_rate,
+            "eta_sec": eta_sec,
+            "eta_time": now + eta_sec if eta_sec is not None else None,
+            "new_targets": self.new_targets,
+            "r_new_targets": self.r_new_targets,
+            "workers": {
+                str(pid): {
+                    "description": worker["description"],
+                    "candidate_num": worker["candidate_num"],
+                    "elapsed_sec": now - worker["start"],
+                    "fraction_done": (
+                        min(1, (now - worker["start"]) * worker_rate / worker["candidate_num"])
+                        if worker_rate and worker["candidate_num"] else None
+                    ),
+                }
+                for pid, worker in self.workers.items()
+            },
+        }
+
+    def emit(self, event, **fields):
+        status = self.status()
+        if self.events_fh is not None:
+            record = {"time": status["update_time"], "event": event, **fields}
+            for key in [
+                "r", "fraction_done", "candidates_per_sec", "eta_sec", "new_targets",
+            ]:
+                record.setdefault(key, status[key])
+            print(json.dumps(record), file=self.events_fh, flush=True)
+        if self.status_file is not None:
+            write_status_file(status, self.status_file)
+
+
+def format_status(status):
+    ''' Return a human readable summary of a status snapshot.
+    '''
+
+    def fmt_time(t):
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t)) if t else "-"
+
+    def fmt_sec(sec):
+        if sec is None:
+            return "-"
+        sec = int(sec)
+        return f"{sec // 3600}:{sec // 60 % 60:02d}:{sec % 60:02d}"
+
+    state = status["state"]
+    if state == "running" and not pid_is_alive(status["pid"]):
+        state = "running (stale, pid not found)"
+    fraction_done = status["fraction_done"]
+    rate = status["candidates_per_sec"]
+    worker_rate = status["worker_candidates_per_sec"]
+    r_range = status["r_range"]
+    lines = [
+        f"pid: {status['pid']}, state: {state}",
+        f"started: {fmt_time(status['start_time'])}, updated: {fmt_time(status['update_time'])}, elapsed: {fmt_sec(status['elapsed_sec'])}",
+        f"r: {status['r']}" + (f" of {r_range[0]}..{r_range[1]}" if r_range else "")
+        + f", tasks: {status['tasks_done']}/{status['tasks_total']}",
+        "candidates: {:.0f}/{} ({})".format(
+            status["candidates_done"],
+            status["candidates_total"],
+            f"{fraction_done * 100:.2f}%" if fraction_done is not None else "-",
+        ),
+        "throughput: {} candidates/sec, {} candidates/sec/worker".format(
+            f"{rate:.0f}" if rate is not None else "-",
+            f"{worker_rate:.0f}" if worker_rate is not None else "-",
+        ),
+        f"eta: {fmt_sec(status['eta_sec'])}, at {fmt_time(status['eta_time'])}",
+        f"new targets: {status['new_targets']}",
+    ]
+    for pid, worker in status["workers"].items():
+        fraction = worker["fraction_done"]
+        lines.append(
+            f" pid: {pid}, {worker['description']}, elapsed: {fmt_sec(worker['elapsed_sec'])}"
+            + (f", ~{fraction * 100:.0f}%" if fraction is not None else "")
+        )
+    return "\n".join(lines)
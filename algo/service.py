@@ -0,0 +1,313 @@
+#! /usr/bin/env python3
+
+''' Asyncio resolution service
+
+The result table is loaded once; concurrent requests, from any connection, are
+coalesced into batched table lookups and the targets not covered by the table
+fall back to an algorithmic resolver.
+
+Protocol, line based, over TCP or a unix socket:
+
+    request:  TARGET\\n
+    response: {"target": TARGET, "blocks": [BLOCK, ...], "source": "table"}\\n
+
+"source" is either "table", the fallback resolver name or null, in which case
+"blocks" is null too. Responses are in request order, so requests can be
+pipelined. A "stats" request returns the service counters as JSON.
+'''
+
+import asyncio
+from collections import deque
+import contextlib
+import io
+import json
+import logging
+import random
+import time
+
+from . import gofai, validator
+
+log = logging.getLogger("service")
+
+default_max_batch = 1024
+default_max_delay = 0.0005
+latency_window = 10000
+
+
+def percentiles(values, pcts=(50, 90, 99)):
+    if not values:
+        return {f"p{pct}": None for pct in pcts}
+    values = sorted(values)
+    return {
+        f"p{pct}": values[min(len(values) - 1, len(values) * pct // 100)] for pct in pcts
+    }
+
+
+class ResolutionService:
+    ''' Resolution service w/ request batching.
+
+    Input:
+        table (object): result table w/ get_many(targets), see table.py, or
+            None for fallback only
+        fallback (callable): target -> blocks, for targets not in the table,
+            or None
+        fallback_name (str): the name reported as source for fallback
+        max_batch (int): the max number of targets per lookup batch
+        max_delay (float): how long to wait, in seconds, for more requests
+            before processing a batch; 0 only yields to the other connections
+    '''
+
+    def __init__(
+            self,
+            table=None,
+            fallback=gofai.resolve,
+            fallback_name="gofai",
+            max_batch=default_max_batch,
+            max_delay=default_max_delay,
+    ):
+        self.table = table
+        self.fallback = fallback
+        self.fallback_name = fallback_name
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending = []
+        self._wakeup = None
+        self._batch_task = None
+        self.start_time = time.time()
+        self.counters = {
+            "requests": 0,
+            "batches": 0,
+            "table": 0,
+            "fallback": 0,
+            "unresolved": 0,
+        }
+        self._latencies = deque(maxlen=latency_window)
+        self._qps_mark = (self.start_time, 0)
+
+    def _ensure_batch_task(self):
+        if self._batch_task is None:
+            self._wakeup = asyncio.Event()
+            self._batch_task = asyncio.get_running_loop().create_task(self._batch_loop())
+
+    def submit(self, target):
+        ''' Queue a target for resolution and return a future for
+        (blocks, source).
+        '''
+        self._ensure_batch_task()
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append((target, fut, time.perf_counter()))
+        self.counters["requests"] += 1
+        self._wakeup.set()
+        return fut
+
+    async def resolve(self, target):
+        return await self.submit(target)
+
+    async def _batch_loop(self):
+        while True:
+            await self._wakeup.wait()
+            # Let the other connections add their requests to the batch:
+            await asyncio.sleep(self.max_delay)
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            if not self._pending:
+                self._wakeup.clear()
+            if batch:
+                try:
+                    self._process_batch(batch)
+                except Exception as e:
+                    log.exception(e)
+                    for _, fut, _ in batch:
+                        if not fut.done():
+                            fut.set_exception(e)
+
+    def _fallback(self, target):
+        if self.fallback is None:
+            return None
+        # Some resolvers, e.g. gofai, report the unresolvable targets to
+        # stdout, keep it for the service:
+        with contextlib.redirect_stdout(io.StringIO()):
+            blocks = self.fallback(target)
+        # Accept only valid resolutions:
+        if not validator.is_valid(blocks, target):
+            return None
+        return tuple(sorted(blocks, reverse=True))
+
+    def _process_batch(self, batch):
+        self.counters["batches"] += 1
+        targets = [target for target, _, _ in batch]
+        if self.table is not None:
+            results = self.table.get_many(targets)
+        else:
+            results = [None] * len(targets)
+        for (target, fut, submit_time), blocks in zip(batch, results):
+            if blocks is not None:
+                source = "table"
+            else:
+                blocks = self._fallback(target)
+                source = self.fallback_name if blocks is not None else None
+            self.counters[
+                "table" if source == "table" else "fallback" if source is not None else "unresolved"
+            ] += 1
+            if not fut.done():
+                fut.set_result((blocks, source))
+            done_time = time.perf_counter()
+            self._latencies.append(done_time - submit_time)
+
+    def stats(self):
+        now = time.time()
+        mark_time, mark_requests = self._qps_mark
+        requests = self.counters["requests"]
+        interval = now - mark_time
+        self._qps_mark = (now, requests)
+        batches = self.counters["batches"]
+        processed = self.counters["table"] + self.counters["fallback"] + self.counters["unresolved"]
+        return {
+            "uptime_sec": now - self.start_time,
+            **self.counters,
+            "avg_batch_sz": processed / batches if batches else None,
+            "qps": requests / (now - self.start_time),
+            "qps_since_last_stats": (requests - mark_requests) / interval if interval > 0 else None,
+            "latency_ms": {
+                pct: val * 1000 if val is not None else None
+                for pct, val in percentiles(list(self._latencies)).items()
+            },
+        }
+
+    async def handle_client(self, reader, writer):
+        responses = asyncio.Queue()
+
+        async def write_responses():
+            while True:
+                item = await responses.get()
+                if item is None:
+                    break
+                if isinstance(item, str):
+                    line = item
+                else:
+                    target, fut = item
+                    blocks, source = await fut
+                    line = json.dumps({
+                        "target": target,
+                        "blocks": list(blocks) if blocks is not None else None,
+                        "source": source,
+                    })
+                writer.write(line.encode() + b"\n")
+                if responses.empty():
+                    await writer.drain()
+
+        writer_task = asyncio.get_running_loop().create_task(write_responses())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                if line == b"stats":
+                    responses.put_nowait(json.dumps(self.stats()))
+                    continue
+                try:
+                    target = int(line)
+                except ValueError:
+                    responses.put_nowait(json.dumps({"error": f"invalid target {line.decode(errors='replace')!r}"}))
+                    continue
+                responses.put_nowait((target, self.submit(target)))
+        except ConnectionError:
+            pass
+        finally:
+            responses.put_nowait(None)
+            try:
+                await writer_task
+            except ConnectionError:
+                pass
+            writer.close()
+
+    async def start_server(self, host=None, port=None, unix_path=None):
+        if unix_path is not None:
+            return await asyncio.start_unix_server(self.handle_client, path=unix_path)
+        return await asyncio.start_server(self.handle_client, host=host, port=port)
+
+
+async def serve(service, host=None, port=None, unix_path=None, stats_interval=None):
+    server = await service.start_server(host=host, port=port, unix_path=unix_path)
+    log.info(f"Serving on {unix_path or ', '.join(str(s.getsockname()) for s in server.sockets)}")
+    async with server:
+        if stats_interval:
+            while True:
+                await asyncio.sleep(stats_interval)
+                log.info(f"stats: {json.dumps(service.stats())}")
+        else:
+            await server.serve_forever()
+
+
+async def _open_connection(host=None, port=None, unix_path=None):
+    if unix_path is not None:
+        return await asyncio.open_unix_connection(unix_path)
+    return await asyncio.open_connection(host, port)
+
+
+async def run_load(
+        host=None,
+        port=None,
+        unix_path=None,
+        num_connections=8,
+        num_requests=100000,
+        pipeline_depth=16,
+        start=None,
+        end=None,
+        seed=0,
+):
+    ''' Load generator: num_requests random targets in [start, end] spread over
+    num_connections, each w/ up to pipeline_depth outstanding requests.
+
+    Return:
+        dict: the number of requests, errors, the elapsed time, QPS and
+            latency percentiles in milliseconds.
+    '''
+    from . import min_target, max_target
+
+    start = min_target if start is None else start
+    end = max_target if end is None else end
+    rnd = random.Random(seed)
+    latencies = []
+    errors = 0
+
+    async def client(n):
+        nonlocal errors
+        reader, writer = await _open_connection(host=host, port=port, unix_path=unix_path)
+        sent_times = deque()
+        sent = received = 0
+        while received < n:
+            while sent < n and len(sent_times) < pipeline_depth:
+                writer.write(b"%d\n" % rnd.randint(start, end))
+                sent_times.append(time.perf_counter())
+                sent += 1
+            await writer.drain()
+            line = await reader.readline()
+            if not line:
+                errors += n - received
+                break
+            latencies.append(time.perf_counter() - sent_times.popleft())
+            received += 1
+            if b'"error"' in line:
+                errors += 1
+        writer.close()
+
+    per_connection = [num_requests // num_connections] * num_connections
+    for i in range(num_requests % num_connections):
+        per_connection[i] += 1
+    start_time = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in per_connection if n > 0))
+    elapsed = time.perf_counter() - start_time
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_sec": elapsed,
+        "qps": len(latencies) / elapsed if elapsed > 0 else None,
+        "latency_ms": {
+            pct: val * 1000 if val is not None else None
+            for pct, val in percentiles(latencies).items()
+        },
+    }
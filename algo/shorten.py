@@ -0,0 +1,120 @@
+#! /usr/bin/env python3
+
+''' Post-optimizer shortening the resolutions, e.g. of gofai or greedy
+
+A resolution is shortened by replacing k of its blocks w/ m < k unused
+blocks of the same total, found w/ precomputed indexes of the sums of m
+blocks, m = 1..3. The replacement is repeated until no k <= max_k blocks
+can be replaced, or until the time budget runs out; every step yields a
+valid resolution, hence the result is valid either way.
+'''
+
+from itertools import combinations
+import time
+
+from . import blockset_81
+from .validator import normalize_blocks
+
+# The max number of blocks replaced at once, i.e. up to C(n, max_k) subsets
+# checked per pass over a resolution of n blocks:
+default_max_k = 4
+# The max number of replacement blocks, i.e. of the sum indexes:
+max_m = 3
+default_time_budget = 0.05
+# Check the time budget every that many subsets:
+deadline_check_interval = 1024
+
+_sum_indexes = None
+
+
+def get_sum_indexes():
+    ''' Return the list of dicts, one per m = 0..max_m, mapping the sums of m
+    distinct blocks to the lists of their decreasing tuples, the ones w/ more
+    large blocks first. Built once.
+    '''
+    global _sum_indexes
+    if _sum_indexes is None:
+        blocks = sorted(blockset_81, reverse=True)
+        _sum_indexes = [{}]
+        for m in range(1, max_m + 1):
+            index = {}
+            # combinations preserves the order, hence the tuples are
+            # decreasing and generated in decreasing order:
+            for chosen in combinations(blocks, m):
+                index.setdefault(sum(chosen), []).append(chosen)
+            _sum_indexes.append(index)
+    return _sum_indexes
+
+
+def find_replacement(blocks, used, max_k, deadline=None):
+    ''' Return (removed, added) for the first k blocks out of blocks, k = 2 ..
+    max_k, replaceable w/ fewer unused ones, or None if none, or if the
+    deadline was reached.
+    '''
+    indexes = get_sum_indexes()
+    count = 0
+    for k in range(2, min(max_k, len(blocks)) + 1):
+        for removed in combinations(blocks, k):
+            count += 1
+            if deadline is not None and count % deadline_check_interval == 0 and time.perf_counter() > deadline:
+                return None
+            total = sum(removed)
+            for m in range(1, min(k, max_m + 1)):
+                for added in indexes[m].get(total, ()):
+                    # The removed blocks may be reused:
+                    if all(b not in used or b in removed for b in added):
+                        return removed, added
+    return None
+
+
+def shorten(blocks, max_k=default_max_k, time_budget=default_time_budget):
+    ''' Return the shortened resolution, as a decreasing tuple, or blocks,
+    normalized, if it cannot be shortened.
+
+    Input:
+        blocks (iterable): a valid resolution
+        max_k (int): the max number of blocks replaced at once
+        time_budget (float): the max time, in seconds, or None for no limit
+    '''
+    if blocks is None:
+        return None
+    blocks = normalize_blocks(blocks)
+    deadline = time.perf_counter() + time_budget if time_budget is not None else None
+    while True:
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+        replacement = find_replacement(blocks, set(blocks), max_k, deadline=deadline)
+        if replacement is None:
+            break
+        removed, added = replacement
+        removed = set(removed)
+        blocks = normalize_blocks([b for b in blocks if b not in removed] + list(added))
+    return blocks
+
+
+def shorten_table(target_to_blocks, max_k=default_max_k, time_budget=default_time_budget, min_len=None):
+    ''' Shorten all the resolutions of a target -> blocks table
+
+    Input:
+        min_len (int): only the resolutions longer than min_len are
+            considered, e.g. the max length in combo.pkl, whose resolutions
+            are minimal already; default: all of them
+
+    Return:
+        (dict, dict): the new table and the stats: the number of targets,
+            of shortened ones and the total number of blocks before and after
+    '''
+    stats = {"targets": 0, "shortened": 0, "blocks_before": 0, "blocks_after": 0}
+    shortened = {}
+    for target, blocks in target_to_blocks.items():
+        stats["targets"] += 1
+        stats["blocks_before"] += len(blocks)
+        if min_len is None or len(blocks) > min_len:
+            short_blocks = shorten(blocks, max_k=max_k, time_budget=time_budget)
+        else:
+            short_blocks = normalize_blocks(blocks)
+        if len(short_blocks) < len(blocks):
+            stats["shortened"] += 1
+        stats["blocks_after"] += len(short_blocks)
+        shortened[target] = short_blocks
+    return shortened, stats
@@ -0,0 +1,249 @@
+#! /usr/bin/env python3
+
+''' Append-only combo store: one immutable pickle segment per combination
+length plus a small JSON manifest
+
+Layout:
+
+    combo.d/
+        manifest.json       {"format": 1, "blockset": {...}, "segments": [{"r": 3, "file": ..., ...}, ...]}
+        combo-03.pkl        target -> combo, for the combos of length 3 only
+        ...
+
+Completing a length writes its segment, then atomically replaces the manifest,
+hence a reader sees either the old or the new set of segments and never a
+partial one. The segments are loaded lazily and cached; a reader limited to the
+lengths <= k, or to a target range, loads only the segments concerned, based on
+the length and the target range of each segment in the manifest.
+
+The last segment may be marked "complete": false, for a time-budgeted run
+stopped before all the combos of its length were checked, see
+update_combo_store. Its combos are valid and minimal in length, since the
+shorter lengths are complete, but some targets of that length are missing and
+some combos may not be the preferred ones. The next update regenerates that
+length and replaces the segment.
+
+The manifest records the name and the digest of the blockset of the combos,
+see blockset.py, and a store opened for another blockset raises ValueError
+rather than mixing tables; a manifest w/o blockset is for blockset_81.
+'''
+
+import json
+import os
+import pickle
+
+from .blockset import artifact_path, default_blockset
+
+this_dir = os.path.dirname(os.path.abspath(__file__))
+gauge_dir = os.path.dirname(this_dir)
+default_store_dir = os.path.join(gauge_dir, "combo.d")
+
+manifest_file_name = "manifest.json"
+manifest_format = 1
+
+
+def store_dir_for(blockset):
+    ''' The default store directory of blockset: combo.d for blockset_81, as
+    before, in the artifact cache otherwise.
+    '''
+    if blockset == default_blockset:
+        return default_store_dir
+    return artifact_path(blockset, "combo.d")
+
+
+def segment_file_name(r):
+    return f"combo-{r:02d}.pkl"
+
+
+class ComboStore:
+    ''' The combos of a store directory, by length.
+
+    Input:
+        store_dir (str): the store directory, created on the first append
+        blockset (Blockset): the blockset of the combos, checked against the
+            manifest, default: the one of the manifest, if any, blockset_81
+            otherwise
+
+    Raise:
+        ValueError: if the store is for another blockset than the given one
+    '''
+
+    def __init__(self, store_dir=default_store_dir, blockset=None):
+        self.store_dir = store_dir
+        self.manifest_file = os.path.join(store_dir, manifest_file_name)
+        self.blockset = blockset
+        self._segments = {}
+        self.reload()
+
+    def reload(self):
+        ''' (Re)read the manifest, e.g. after another process appended to it.
+        '''
+        try:
+            with open(self.manifest_file, "rt") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {"format": manifest_format, "segments": []}
+            if self.blockset is not None:
+                manifest["blockset"] = {"name": self.blockset.name, "digest": self.blockset.digest}
+        if manifest.get("format") != manifest_format:
+            raise ValueError(f"{self.manifest_file}: unsupported format {manifest.get('format')!r}")
+        stored_blockset = manifest.get("blockset", {"name": default_blockset.name, "digest": default_blockset.digest})
+        if self.blockset is not None and self.blockset.digest != stored_blockset["digest"]:
+            raise ValueError(
+                f"{self.manifest_file}: the store is for {stored_blockset['name']}"
+                + f" ({stored_blockset['digest'][:12]}), not for {self.blockset.key}"
+            )
+        self.manifest = manifest
+        self.blockset_info = stored_blockset
+        self.segment_info = {info["r"]: info for info in manifest["segments"]}
+
+    def exists(self):
+        return os.path.isfile(self.manifest_file)
+
+    @property
+    def lengths(self):
+        return sorted(self.segment_info)
+
+    @property
+    def max_len(self):
+        ''' The max length stored, 0 if none
+        '''
+        return max(self.segment_info, default=0)
+
+    @property
+    def incomplete_len(self):
+        ''' The length of the incomplete segment, or None if none
+        '''
+        r = self.max_len
+        if r > 0 and not self.segment_info[r].get("complete", True):
+            return r
+        return None
+
+    def __len__(self):
+        return sum(info["count"] for info in self.segment_info.values())
+
+    def iter_lengths(self, max_len=None, min_target=None, max_target=None):
+        ''' Yield the lengths whose segments may contain targets in
+        [min_target, max_target], up to max_len.
+        '''
+        for r in self.lengths:
+            info = self.segment_info[r]
+            if max_len is not None and r > max_len:
+                break
+            if info["count"] == 0:
+                continue
+            if min_target is not None and info["max_target"] < min_target:
+                continue
+            if max_target is not None and info["min_target"] > max_target:
+                continue
+            yield r
+
+    def segment(self, r):
+        ''' Return the target -> combo dict for length r, loaded once.
+        '''
+        combos = self._segments.get(r)
+        if combos is None:
+            info = self.segment_info[r]
+            with open(os.path.join(self.store_dir, info["file"]), "rb") as f:
+                combos = pickle.load(f)
+            self._segments[r] = combos
+        return combos
+
+    def load(self, max_len=None, min_target=None, max_target=None):
+        ''' Return the merged target -> combo dict for the lengths up to
+        max_len, optionally restricted to the targets in [min_target, max_target].
+        '''
+        all_combos = {}
+        for r in self.iter_lengths(max_len, min_target, max_target):
+            combos = self.segment(r)
+            if min_target is None and max_target is None:
+                all_combos.update(combos)
+            else:
+                lo = min_target if min_target is not None else -1
+                hi = max_target if max_target is not None else float("inf")
+                all_combos.update(
+                    (target, combo) for target, combo in combos.items() if lo <= target <= hi
+                )
+        return all_combos
+
+    def get(self, target, max_len=None):
+        ''' Return the combo for target, or None if not stored. Only the
+        segments whose target range includes target are loaded.
+        '''
+        for r in self.iter_lengths(max_len, target, target):
+            combo = self.segment(r).get(target)
+            if combo is not None:
+                return combo
+        return None
+
+    def __contains__(self, target):
+        return self.get(target) is not None
+
+    def append(self, r, combos, complete=True):
+        ''' Add the segment for length r, which must be above the stored
+        lengths, an empty one included, such that the max length advances, or
+        replace the incomplete segment of length r.
+        '''
+        replace = r == self.incomplete_len
+        if r <= self.max_len and not replace:
+            raise ValueError(f"{self.store_dir}: length {r} <= the max stored length {self.max_len}")
+        if self.incomplete_len is not None and not replace:
+            raise ValueError(f"{self.store_dir}: length {self.incomplete_len} is incomplete")
+        os.makedirs(self.store_dir, exist_ok=True)
+        file_name = segment_file_name(r)
+        segment_file = os.path.join(self.store_dir, file_name)
+        t_segment_file = f"{segment_file}.{os.getpid()}_"
+        with open(t_segment_file, "wb") as f:
+            pickle.dump(combos, f)
+        os.replace(t_segment_file, segment_file)
+        info = {
+            "r": r,
+            "file": file_name,
+            "count": len(combos),
+            "min_target": min(combos, default=None),
+            "max_target": max(combos, default=None),
+        }
+        if not complete:
+            info["complete"] = False
+        segments = [seg for seg in self.manifest["segments"] if seg["r"] != r]
+        manifest = {
+            "format": manifest_format,
+            "blockset": self.blockset_info,
+            "segments": segments + [info],
+        }
+        t_manifest_file = f"{self.manifest_file}.{os.getpid()}_"
+        with open(t_manifest_file, "wt") as f:
+            json.dump(manifest, f, indent=2)
+            print(file=f)
+        os.replace(t_manifest_file, self.manifest_file)
+        self.manifest = manifest
+        self.segment_info[r] = info
+        self._segments[r] = combos
+
+    def export_pkl_file(self, pkl_file, max_len=None):
+        ''' Write the merged combos into a single pickle file, as combo.pkl
+        used to be, for the tools reading it.
+        '''
+        t_pkl_file = f"{pkl_file}.{os.getpid()}_"
+        with open(t_pkl_file, "wb") as f:
+            pickle.dump(self.load(max_len), f)
+        os.replace(t_pkl_file, pkl_file)
+
+
+def migrate_combo_pkl_file(combo_pkl_file, store_dir=default_store_dir):
+    ''' Split a combo.pkl file into the per length segments of a new store.
+
+    Return:
+        ComboStore: the store
+    '''
+    store = ComboStore(store_dir, blockset=default_blockset)
+    if store.exists():
+        raise ValueError(f"{store_dir}: store already exists")
+    with open(combo_pkl_file, "rb") as f:
+        all_combos = pickle.load(f)
+    by_len = {}
+    for target, combo in all_combos.items():
+        by_len.setdefault(len(combo), {})[target] = combo
+    for r in range(1, max(by_len, default=0) + 1):
+        store.append(r, by_len.get(r, {}))
+    return store
@@ -0,0 +1,150 @@
+#! /usr/bin/env python3
+
+''' Result tables: pre-resolved target -> blocks lookups loaded once, from either
+a pickle file, a bitmap file (see pkl_to_bitmap_file.py) or a combo store
+directory (see store.py).
+'''
+
+import mmap
+import os
+import pickle
+
+from .blockset import label_to_block
+from .store import ComboStore
+from .validator import normalize_blocks
+
+
+class PickleTable:
+    ''' Lookup into a target -> blocks pickle file, e.g. best.pkl or combo.pkl.
+    '''
+
+    def __init__(self, pkl_file):
+        self.path = pkl_file
+        with open(pkl_file, 'rb') as f:
+            self.target_to_blocks = pickle.load(f)
+        if self.target_to_blocks:
+            self.min_target = min(self.target_to_blocks)
+            self.max_target = max(self.target_to_blocks)
+        else:
+            self.min_target, self.max_target = 0, -1
+
+    def __len__(self):
+        return len(self.target_to_blocks)
+
+    def get(self, target):
+        ''' Return the blocks in decreasing order or None if not resolved.
+        '''
+        blocks = self.target_to_blocks.get(target)
+        return normalize_blocks(blocks)
+
+    def get_many(self, targets):
+        return [self.get(target) for target in targets]
+
+    def close(self):
+        pass
+
+
+class StoreTable:
+    ''' Lookup into a combo store, e.g. combo.d, loading its segments lazily.
+    '''
+
+    def __init__(self, store_dir):
+        self.path = store_dir
+        self.store = ComboStore(store_dir)
+        if not self.store.exists():
+            raise FileNotFoundError(f"{store_dir}: no combo store")
+        ranges = [
+            (info["min_target"], info["max_target"])
+            for info in self.store.segment_info.values() if info["count"]
+        ]
+        if ranges:
+            self.min_target = min(lo for lo, _ in ranges)
+            self.max_target = max(hi for _, hi in ranges)
+        else:
+            self.min_target, self.max_target = 0, -1
+
+    def __len__(self):
+        return len(self.store)
+
+    def get(self, target):
+        ''' Return the blocks in decreasing order or None if not resolved.
+        '''
+        return normalize_blocks(self.store.get(target))
+
+    def get_many(self, targets):
+        return [self.get(target) for target in targets]
+
+    def close(self):
+        pass
+
+
+def load_meta(meta_file):
+    ''' Return (blocks, num_bytes, min_target, max_target) from a .meta file
+    '''
+    with open(meta_file, "rt") as f:
+        num_labels, _, num_bytes, min_target, max_target = map(int, f.readline().split())
+        blocks = [label_to_block(f.readline().strip()) for _ in range(num_labels)]
+    return blocks, num_bytes, min_target, max_target
+
+
+class BitmapFileTable:
+    ''' Memory mapped lookup into a .bmp file w/ its .meta file.
+    '''
+
+    def __init__(self, bitmap_file, meta_file=None):
+        if meta_file is None:
+            meta_file = os.path.splitext(bitmap_file)[0] + ".meta"
+        self.path = bitmap_file
+        self.blocks, self.num_bytes, self.min_target, self.max_target = load_meta(meta_file)
+        with open(bitmap_file, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # Decode the bitmaps byte by byte, using per byte index lookup tables:
+        self._byte_blocks = []
+        for i in range(self.num_bytes):
+            byte_blocks = []
+            for val in range(256):
+                byte_blocks.append(tuple(
+                    self.blocks[i * 8 + k] for k in range(8)
+                    if val & (1 << k) and i * 8 + k < len(self.blocks)
+                ))
+            self._byte_blocks.append(byte_blocks)
+
+    def __len__(self):
+        return self.max_target - self.min_target + 1
+
+    def decode(self, bitmap):
+        ''' Return the blocks in decreasing order for a bitmap, or None if empty.
+        '''
+        blocks = []
+        for i, val in enumerate(bitmap):
+            if val:
+                blocks.extend(self._byte_blocks[i][val])
+        if not blocks:
+            return None
+        blocks.sort(reverse=True)
+        return tuple(blocks)
+
+    def get(self, target):
+        ''' Return the blocks in decreasing order or None if not resolved.
+        '''
+        if target < self.min_target or target > self.max_target:
+            return None
+        off = (target - self.min_target) * self.num_bytes
+        return self.decode(self._mmap[off:off + self.num_bytes])
+
+    def get_many(self, targets):
+        return [self.get(target) for target in targets]
+
+    def close(self):
+        self._mmap.close()
+
+
+def open_table(path, meta_file=None):
+    ''' Open a result table based on the file extension: .bmp or pickle, or a
+    combo store for a directory.
+    '''
+    if os.path.isdir(path):
+        return StoreTable(path)
+    if path.endswith(".bmp"):
+        return BitmapFileTable(path, meta_file=meta_file)
+    return PickleTable(path)
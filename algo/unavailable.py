@@ -0,0 +1,380 @@
+#! /usr/bin/env python3
+
+''' Resolution w/ unavailable blocks, e.g. out for calibration or damaged
+
+The unavailable blocks are given as a mask, w/ bit i set for the i-th block
+of the sorted blockset, as for the .bmp bitmaps, see block_mask; the
+blocksets w/ duplicates are not supported. A target is resolved by, in order:
+
+ - its stored best resolution, if it avoids the mask
+ - the first one of its precomputed alternatives, best first, which avoids
+   the mask, see build_alternatives
+ - the LRU cache of the previous searches
+ - the branch-and-bound search, see bnb.py, over the available blocks,
+   bounded in time and starting from the repair of the best resolution, if
+   any; its result is cached, as is the lack of one
+
+The alternatives index stores the resolutions as masks, such that the common
+case, 1-3 missing blocks, costs a few ANDs and the decoding of the result.
+
+The alternatives of a target are the repairs of its best resolution for each
+one of its blocks: the block and up to max_removed - 1 others are replaced
+w/ 1 to max_m unused blocks of the same total, the preferred replacement
+winning. A repair is valid, but not necessarily the best resolution w/o the
+block.
+
+The index is an artifact of its blockset, see blockset.py: it is stored in
+the blockset's cache directory along w/ the blockset key, checked on load.
+'''
+
+from collections import OrderedDict
+from itertools import combinations
+import multiprocessing
+import os
+import pickle
+
+from .blockset import artifact_path, default_blockset
+from .bnb import SubsetSearch, solve
+from .shorten import max_m
+from .validator import normalize_blocks
+
+alternatives_file_name = "alternatives.pkl"
+
+# The max number of alternatives per target:
+default_top_k = 32
+# The max number of missing blocks of a best resolution covered by its
+# alternatives:
+default_depth = 2
+# The max number of blocks replaced by a repair, the missing one included:
+default_max_removed = 2
+default_time_budget = 0.01
+default_cache_size = 65536
+# The max number of searches, i.e. of distinct masks, kept:
+default_search_cache_size = 16
+
+# blockset key -> {block: bit}, resp. [{sum: [blocks, ...]}, ...] for m = 0..max_m:
+_block_bits = {}
+_sum_indexes = {}
+
+
+def check_blockset(blockset):
+    ''' Raise ValueError for the blocksets w/ duplicates, whose copies the
+    repairs do not account for.
+    '''
+    if blockset.has_duplicates:
+        raise ValueError(f"{blockset.key}: blocksets w/ duplicates are not supported")
+
+
+def get_block_bits(blockset=default_blockset):
+    block_bits = _block_bits.get(blockset.key)
+    if block_bits is None:
+        check_blockset(blockset)
+        block_bits = _block_bits[blockset.key] = {b: 1 << i for i, b in enumerate(blockset.blocks)}
+    return block_bits
+
+
+def block_mask(blocks, blockset=default_blockset):
+    ''' Return the mask of blocks.
+    '''
+    block_bits = get_block_bits(blockset)
+    mask = 0
+    for b in blocks:
+        mask |= block_bits[b]
+    return mask
+
+
+def mask_blocks(mask, blockset=default_blockset):
+    ''' Return the blocks of mask in decreasing order.
+    '''
+    sorted_blocks = blockset.blocks
+    blocks = []
+    while mask:
+        i = mask.bit_length() - 1
+        blocks.append(sorted_blocks[i])
+        mask ^= 1 << i
+    return tuple(blocks)
+
+
+def all_blocks_mask(blockset=default_blockset):
+    return (1 << len(blockset)) - 1
+
+
+def get_sum_indexes(blockset=default_blockset):
+    ''' Return the list of dicts, one per m = 0..max_m, mapping the sums of m
+    distinct blocks to the lists of their decreasing tuples, the ones w/ more
+    large blocks first, as shorten.get_sum_indexes does for blockset_81.
+    Built once per blockset.
+    '''
+    sum_indexes = _sum_indexes.get(blockset.key)
+    if sum_indexes is None:
+        check_blockset(blockset)
+        blocks = sorted(blockset.blocks, reverse=True)
+        sum_indexes = [{}]
+        for m in range(1, max_m + 1):
+            index = {}
+            for chosen in combinations(blocks, m):
+                index.setdefault(sum(chosen), []).append(chosen)
+            sum_indexes.append(index)
+        _sum_indexes[blockset.key] = sum_indexes
+    return sum_indexes
+
+
+def preference_key(blocks):
+    ''' The sort key of the resolutions, best first: the shorter ones, then
+    the ones w/ more large blocks, blocks being decreasing.
+    '''
+    return len(blocks), tuple(-b for b in blocks)
+
+
+def repair(blocks, missing, max_removed=default_max_removed, unavailable=frozenset(), blockset=default_blockset):
+    ''' Return the preferred repair of the resolution blocks w/o the missing
+    block, and w/o the unavailable ones, as a decreasing tuple, or None if
+    none.
+    '''
+    indexes = get_sum_indexes(blockset)
+    others = [b for b in blocks if b != missing]
+    best = None
+    for k in range(max_removed):
+        for removed in combinations(others, k):
+            kept = set(others).difference(removed)
+            total = missing + sum(removed)
+            for m in range(1, max_m + 1):
+                # The tuples are preferred first for each m:
+                added = next(
+                    (
+                        added for added in indexes[m].get(total, ())
+                        if missing not in added and kept.isdisjoint(added) and unavailable.isdisjoint(added)
+                    ),
+                    None
+                )
+                if added is not None:
+                    candidate = normalize_blocks(list(kept) + list(added))
+                    if best is None or preference_key(candidate) < preference_key(best):
+                        best = candidate
+                    # The larger m are longer:
+                    break
+    return best
+
+
+def repair_all(blocks, unavailable, max_removed=default_max_removed, blockset=default_blockset):
+    ''' Return the repair of the resolution blocks w/o any of the unavailable
+    blocks, one at a time, or None if none.
+    '''
+    for missing in unavailable:
+        # The repairs of the previous ones may have dropped it:
+        if missing in blocks:
+            blocks = repair(blocks, missing, max_removed=max_removed, unavailable=unavailable, blockset=blockset)
+            if blocks is None:
+                break
+    return blocks
+
+
+def iter_repairs(blocks, depth, max_removed=default_max_removed, unavailable=frozenset(), blockset=default_blockset):
+    ''' Yield the repairs of the resolution blocks w/o any set of up to depth
+    of its blocks, or of the blocks of its repairs, recursively.
+    '''
+    if depth == 0:
+        return
+    for missing in blocks:
+        missing_blocks = unavailable | {missing}
+        repaired = repair(blocks, missing, max_removed=max_removed, unavailable=missing_blocks, blockset=blockset)
+        if repaired is not None:
+            yield repaired
+            yield from iter_repairs(
+                repaired, depth - 1, max_removed=max_removed, unavailable=missing_blocks, blockset=blockset
+            )
+
+
+def _build_alternatives_batch(args):
+    items, top_k, depth, max_removed, blockset = args
+    alternatives = {}
+    for target, blocks in items:
+        blocks = normalize_blocks(blocks)
+        repairs = set(iter_repairs(blocks, depth, max_removed=max_removed, blockset=blockset))
+        repairs = sorted(repairs, key=preference_key)[:top_k]
+        alternatives[target] = tuple(block_mask(b, blockset=blockset) for b in [blocks, *repairs])
+    return alternatives
+
+
+def build_alternatives(
+        target_to_blocks,
+        top_k=default_top_k,
+        depth=default_depth,
+        max_removed=default_max_removed,
+        n_parallel=1,
+        batch_sz=1024,
+        blockset=default_blockset,
+):
+    ''' Return the alternatives index: target -> (best mask, alternative
+    mask, ...), w/ the alternatives in preference order.
+
+    Input:
+        target_to_blocks (dict): the best resolutions, e.g. of combo.pkl
+        top_k (int): the max number of alternatives per target
+        depth (int): the max number of missing blocks of the best
+            resolution covered by the alternatives
+        max_removed (int): see repair
+        n_parallel (int): the number of worker processes, None for #cores
+        batch_sz (int): the number of targets per worker task
+        blockset (Blockset): the blockset of target_to_blocks
+
+    Raise:
+        ValueError: if blockset has duplicates
+    '''
+    check_blockset(blockset)
+    items = list(target_to_blocks.items())
+    tasks = (
+        (items[i:i + batch_sz], top_k, depth, max_removed, blockset) for i in range(0, len(items), batch_sz)
+    )
+    if n_parallel == 1:
+        return _build_alternatives_batch((items, top_k, depth, max_removed, blockset))
+    alternatives = {}
+    with multiprocessing.Pool(n_parallel) as pool:
+        for batch_alternatives in pool.imap_unordered(_build_alternatives_batch, tasks):
+            alternatives.update(batch_alternatives)
+    return alternatives
+
+
+def alternatives_file_for(blockset=default_blockset):
+    ''' The default alternatives file of blockset, in its artifact cache.
+    '''
+    return artifact_path(blockset, alternatives_file_name)
+
+
+def save_alternatives(alternatives, alternatives_file=None, blockset=default_blockset):
+    ''' Save the index of blockset into alternatives_file, default: see
+    alternatives_file_for, along w/ the blockset key.
+    '''
+    if alternatives_file is None:
+        alternatives_file = alternatives_file_for(blockset)
+    t_alternatives_file = f"{alternatives_file}.{os.getpid()}_"
+    with open(t_alternatives_file, "wb") as f:
+        pickle.dump({"blockset": blockset.key, "alternatives": alternatives}, f)
+    os.replace(t_alternatives_file, alternatives_file)
+
+
+def load_alternatives(alternatives_file=None, blockset=default_blockset):
+    ''' Return the index of blockset from alternatives_file, default: see
+    alternatives_file_for.
+
+    Raise:
+        ValueError: if the index is for another blockset
+    '''
+    if alternatives_file is None:
+        alternatives_file = alternatives_file_for(blockset)
+    with open(alternatives_file, "rb") as f:
+        saved = pickle.load(f)
+    if not isinstance(saved, dict) or saved.get("blockset") != blockset.key:
+        stored_key = saved.get("blockset") if isinstance(saved, dict) else None
+        raise ValueError(f"{alternatives_file}: the index is for {stored_key}, not for {blockset.key}")
+    return saved["alternatives"]
+
+
+class UnavailableResolver:
+    ''' Resolve targets w/o the unavailable blocks.
+
+    Input:
+        alternatives (dict): the alternatives index, see build_alternatives,
+            or None for search only
+        time_budget (float): the max search time per target, in seconds, or
+            None for no limit
+        cache_size (int): the max number of cached search resolutions, 0 to
+            disable the cache
+        blockset (Blockset): the blockset of the index and of the masks
+
+    Usage:
+        resolver = UnavailableResolver(load_alternatives())
+        blocks = resolver.resolve(target, unavailable=block_mask([1005, 40000]))
+    '''
+
+    def __init__(
+            self,
+            alternatives=None,
+            time_budget=default_time_budget,
+            cache_size=default_cache_size,
+            blockset=default_blockset,
+    ):
+        check_blockset(blockset)
+        self.blockset = blockset
+        self.alternatives = alternatives if alternatives is not None else {}
+        self.time_budget = time_budget
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._searches = OrderedDict()
+        self.counters = {
+            "requests": 0,
+            "table": 0,
+            "alternative": 0,
+            "cache": 0,
+            "search": 0,
+            "unresolved": 0,
+        }
+
+    def get_search(self, unavailable=0):
+        ''' Return the SubsetSearch over the available blocks.
+        '''
+        search = self._searches.get(unavailable)
+        if search is not None:
+            self._searches.move_to_end(unavailable)
+            return search
+        search = SubsetSearch(blocks=mask_blocks(all_blocks_mask(self.blockset) & ~unavailable, blockset=self.blockset))
+        self._searches[unavailable] = search
+        if len(self._searches) > default_search_cache_size:
+            self._searches.popitem(last=False)
+        return search
+
+    def resolve_source(self, target, unavailable=0):
+        ''' Return (blocks, source), w/ source "table", "alternative",
+        "cache", "search" or None, in which case blocks is None too.
+        '''
+        self.counters["requests"] += 1
+        masks = self.alternatives.get(target)
+        if masks is not None:
+            if not masks[0] & unavailable:
+                self.counters["table"] += 1
+                return mask_blocks(masks[0], blockset=self.blockset), "table"
+            for mask in masks[1:]:
+                if not mask & unavailable:
+                    self.counters["alternative"] += 1
+                    return mask_blocks(mask, blockset=self.blockset), "alternative"
+        key = (target, unavailable)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.counters["cache"] += 1
+            blocks, source = cached
+            return blocks, "cache" if source is not None else None
+        upper_bound = None
+        if masks is not None:
+            upper_bound = repair_all(
+                mask_blocks(masks[0], blockset=self.blockset),
+                set(mask_blocks(unavailable, blockset=self.blockset)),
+                blockset=self.blockset,
+            )
+        blocks, _ = solve(
+            target, time_budget=self.time_budget, upper_bound=upper_bound, search=self.get_search(unavailable)
+        )
+        source = "search" if blocks is not None else None
+        self.counters[source if source is not None else "unresolved"] += 1
+        if self.cache_size > 0:
+            self._cache[key] = (blocks, source)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return blocks, source
+
+    def resolve(self, target, unavailable=0):
+        return self.resolve_source(target, unavailable=unavailable)[0]
+
+    __call__ = resolve
+
+    def stats(self):
+        ''' Return the counters, per source, w/ the hit rate of the index,
+        i.e. of the table and alternative sources.
+        '''
+        requests = self.counters["requests"]
+        index_hits = self.counters["table"] + self.counters["alternative"]
+        return {
+            **self.counters,
+            "index_hit_rate": index_hits / requests if requests else None,
+            "cache_len": len(self._cache),
+        }
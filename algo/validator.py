@@ -33,7 +33,20 @@ def cmp_blocks(blocks1, blocks2):
     
 
 
-def sanity_check(blocks):
+def sanity_check(blocks, blockset=None):
+    ''' blockset (Blockset): optional, for the blocks available more than
+        once, see blockset.py; default: blockset_81
+    '''
+    if blockset is not None:
+        ok = True
+        invalid_blocks = {b for b in blocks if b not in blockset}
+        if not invalid_blocks and not blockset.allows(blocks):
+            print(f"{blocks}: blocks used more times than available", file=sys.stderr)
+            ok = False
+        if invalid_blocks:
+            print(f"{invalid_blocks}: invalid blocks", file=sys.stderr)
+            ok = False
+        return ok
     used_blocks = set()
     ok = True
     for b in blocks:
@@ -48,11 +61,11 @@ def sanity_check(blocks):
         ok = False
     return ok
 
-def validate(blocks, target):
+def validate(blocks, target, blockset=None):
     if blocks is None:
         print(f"Cannot resolve valid target {target}", file=sys.stderr)
         return False
-    if not sanity_check(blocks):
+    if not sanity_check(blocks, blockset=blockset):
         print(f"{target}: failed sanity check\n", file=sys.stderr)
         return False
     got_target = sum(blocks)
@@ -60,3 +73,19 @@ def validate(blocks, target):
         print(f"want: {target}, got: {blocks} -> {got_target}, diff: {target - got_target}", file=sys.stderr)
         return False
     return True
+
+def is_valid(blocks, target, blockset=None):
+    ''' Like validate, but quiet, for checking the resolvers at runtime.
+    '''
+    if blockset is not None:
+        return (
+            blocks is not None
+            and sum(blocks) == target
+            and blockset.allows(blocks)
+        )
+    return (
+        blocks is not None
+        and sum(blocks) == target
+        and len(set(blocks)) == len(blocks)
+        and blockset_81.issuperset(blocks)
+    )
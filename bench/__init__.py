@@ -0,0 +1,9 @@
+''' Benchmark suite for the resolvers, the combo generator and the converters
+
+Run all the workloads and compare them against the committed baseline:
+
+    python3 -m bench run -o .work/bench.json
+    python3 -m bench compare bench/baseline.json .work/bench.json
+
+Use `run -k PATTERN` to select workloads and `list` to see them.
+'''
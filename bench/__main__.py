@@ -0,0 +1,197 @@
+#! /usr/bin/env python3
+
+import argparse
+import fnmatch
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+from .workloads import workloads
+
+default_baseline_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def run_workloads(names, repeat=3, min_time=0.5, fh=None):
+    ''' Time each workload at least repeat times and for at least min_time
+    seconds overall, such that the short ones are less noisy, after a warm up
+    run.
+
+    Return:
+        dict[name]dict: ops, min_sec, median_sec and ns_per_op, based on the
+            min time, as the least noisy estimate.
+    '''
+    results = {}
+    for name in names:
+        func, ops = workloads[name]()
+        gc.collect()
+        # Warm up caches and lazy initializations:
+        func()
+        times = []
+        while len(times) < repeat or sum(times) < min_time:
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        min_sec = min(times)
+        results[name] = {
+            "ops": ops,
+            "min_sec": min_sec,
+            "median_sec": statistics.median(times),
+            "ns_per_op": min_sec * 1e9 / ops if ops else None,
+        }
+        if fh is not None:
+            print(f"{name}: {min_sec:.06f} sec, {results[name]['ns_per_op']:.1f} ns/op", file=fh)
+    return results
+
+
+def compare_results(baseline, current, threshold_pct=10):
+    ''' Compare the ns_per_op of each workload.
+
+    Return:
+        list of (name, baseline ns/op, current ns/op, delta %, flag) and the
+        number of regressions
+    '''
+    rows, regression_count = [], 0
+    for name in sorted(set(baseline) | set(current)):
+        base_val = baseline.get(name, {}).get("ns_per_op")
+        val = current.get(name, {}).get("ns_per_op")
+        delta_pct, flag = None, ""
+        if base_val is None:
+            flag = "NEW"
+        elif val is None:
+            flag = "MISSING"
+        else:
+            delta_pct = (val - base_val) * 100 / base_val
+            if delta_pct > threshold_pct:
+                flag = "REGRESSION"
+                regression_count += 1
+            elif delta_pct < -threshold_pct:
+                flag = "improvement"
+        rows.append((name, base_val, val, delta_pct, flag))
+    return rows, regression_count
+
+
+def format_rows(rows):
+    table = [("Workload", "Baseline ns/op", "Current ns/op", "Delta %", "")] + [
+        (
+            name,
+            "" if base_val is None else f"{base_val:.1f}",
+            "" if val is None else f"{val:.1f}",
+            "" if delta_pct is None else f"{delta_pct:+.1f}",
+            flag,
+        )
+        for name, base_val, val, delta_pct, flag in rows
+    ]
+    widths = [max(len(row[i]) for row in table) for i in range(len(table[0]))]
+    return "\n".join(
+        "  ".join(
+            col.ljust(w) if i == 0 else col.rjust(w) for i, (col, w) in enumerate(zip(row, widths))
+        ).rstrip()
+        for row in table
+    )
+
+
+def load_results(json_file, with_meta=False):
+    with open(json_file, "rt") as f:
+        out = json.load(f)
+    return (out["results"], out["meta"]) if with_meta else out["results"]
+
+
+def is_selected(name, select=None):
+    return select is None or any(fnmatch.fnmatch(name, pat) for pat in select)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog="python3 -m bench")
+    subparsers = parser.add_subparsers(dest="cmd", required=True)
+
+    subparsers.add_parser("list", help="List the workloads")
+
+    run_parser = subparsers.add_parser("run", help="Run the workloads")
+    run_parser.add_argument(
+        "-k", "--select",
+        action="append",
+        help="Select workloads by fnmatch pattern, may be repeated, default: all",
+    )
+    run_parser.add_argument(
+        "-r", "--repeat",
+        default=3,
+        type=int,
+        help="Repeat each workload at least that many times, default: %(default)d",
+    )
+    run_parser.add_argument(
+        "-T", "--min-time",
+        default=0.5,
+        type=float,
+        help="Repeat each workload for at least that many seconds, default: %(default)s",
+    )
+    run_parser.add_argument(
+        "-o", "--out-file",
+        help="Results file, default: stdout",
+    )
+
+    compare_parser = subparsers.add_parser("compare", help="Compare results against a baseline")
+    compare_parser.add_argument(
+        "-t", "--threshold",
+        default=10,
+        type=float,
+        help="Regression threshold, in percents, default: %(default)s",
+    )
+    compare_parser.add_argument(
+        "baseline_file",
+        nargs="?",
+        default=default_baseline_file,
+        help="default: %(default)s",
+    )
+    compare_parser.add_argument("result_file")
+
+    args = parser.parse_args()
+
+    if args.cmd == "list":
+        print("\n".join(workloads))
+    elif args.cmd == "run":
+        names = [name for name in workloads if is_selected(name, args.select)]
+        results = run_workloads(names, repeat=args.repeat, min_time=args.min_time, fh=sys.stderr)
+        out = {
+            "meta": {
+                "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "repeat": args.repeat,
+                "min_time": args.min_time,
+                "select": args.select,
+            },
+            "results": results,
+        }
+        if args.out_file:
+            os.makedirs(os.path.dirname(os.path.abspath(args.out_file)), exist_ok=True)
+            with open(args.out_file, "wt") as f:
+                json.dump(out, f, indent=2)
+                print(file=f)
+        else:
+            json.dump(out, sys.stdout, indent=2)
+            print()
+    elif args.cmd == "compare":
+        results, meta = load_results(args.result_file, with_meta=True)
+        # The baseline workloads not selected for the run are not compared:
+        baseline = {
+            name: result for name, result in load_results(args.baseline_file).items()
+            if is_selected(name, meta.get("select"))
+        }
+        rows, regression_count = compare_results(baseline, results, args.threshold)
+        print(format_rows(rows))
+        # A baseline workload w/o a result, e.g. renamed, would go unchecked:
+        missing_count = sum(flag == "MISSING" for *_, flag in rows)
+        if missing_count > 0:
+            print(
+                f"\n{missing_count} baseline workload(s) MISSING from {args.result_file},"
+                + " run them or re-record the baseline",
+                file=sys.stderr,
+            )
+        if regression_count > 0:
+            print(f"\n{regression_count} regression(s) over {args.threshold}%", file=sys.stderr)
+        if missing_count > 0 or regression_count > 0:
+            exit(1)
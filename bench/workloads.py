@@ -0,0 +1,184 @@
+''' Fixed benchmark workloads
+
+Each workload is a setup function returning (func, ops): func() is the timed
+code and ops is the number of operations it performs, used for the per op
+cost. The setup cost is not included.
+'''
+
+import contextlib
+import io
+import pickle
+import random
+import tempfile
+
+from algo import blockset_81, min_target, max_target, gofai, greedy, validator
+from algo.combo import _generate_combo_batch, default_combo_pkl_file, n_choose_k, walkers
+from algo.resolved import ResolvedTargets
+
+import pkl_to_bitmap_file
+import pkl_to_h
+
+# Fixed seed for sampled targets, such that runs are comparable:
+SEED = 81
+SAMPLE_SZ = 5000
+# The combo lengths for the generator workloads, ~100k suffix tree nodes
+# visited each, see combo_batch:
+COMBO_LENGTHS = (4, 6, 8, 10)
+
+_combo_pkl = None
+
+
+def load_combo_pkl():
+    global _combo_pkl
+    if _combo_pkl is None:
+        with open(default_combo_pkl_file, 'rb') as f:
+            _combo_pkl = pickle.load(f)
+    return _combo_pkl
+
+
+def sample_targets(n=SAMPLE_SZ, seed=SEED):
+    rnd = random.Random(seed)
+    return [rnd.randint(min_target, max_target) for _ in range(n)]
+
+
+def resolver_sweep(resolve, stride=1):
+    targets = range(min_target, max_target + 1, stride)
+
+    def func():
+        # Some resolvers report unresolvable targets to stdout:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for target in targets:
+                resolve(target)
+
+    return func, len(targets)
+
+
+def resolver_sample(resolve):
+    targets = sample_targets()
+
+    def func():
+        with contextlib.redirect_stdout(io.StringIO()):
+            for target in targets:
+                resolve(target)
+
+    return func, len(targets)
+
+
+def combo_batch(r):
+    ''' The whole batch for length r, as in the serial path of generate_combos,
+    w/ the targets resolved to shorter lengths in combo.pkl as check_combo.
+
+    Since most of the suffix tree is pruned, the ops are the nodes actually
+    visited, as counted by a setup run, not the number of combinations.
+    '''
+    suffix_set = set(blockset_81)
+    check_combo = {
+        target: combo for target, combo in load_combo_pkl().items() if len(combo) < r
+    }
+    # Built once per r by generate_combos:
+    resolved = ResolvedTargets(check_combo)
+    stats = {}
+    _generate_combo_batch(r, suffix_set=suffix_set, check_combo=check_combo, resolved=resolved, stats=stats)
+
+    def func():
+        _generate_combo_batch(r, suffix_set=suffix_set, check_combo=check_combo, resolved=resolved)
+
+    return func, stats["nodes"]
+
+
+def combo_walk(walker, r=4, suffix_len=50):
+    ''' The raw enumeration cost, w/o check_combo, i.e. w/o pruning.
+    '''
+    suffix_set = sorted(blockset_81)[:suffix_len]
+
+    def func():
+        _generate_combo_batch(r, suffix_set=suffix_set, walker=walker)
+
+    return func, n_choose_k(suffix_len, r)
+
+
+def reduce_fractional_blocks():
+    ''' The fractional block lists gofai reduces, for the sampled targets.
+    '''
+    block_lists = []
+    for target in sample_targets():
+        if target < gofai.gofai_min_target or target >= 112000:
+            continue
+        integer_target = (target - 2000) // 10000
+        fractional_target = target - integer_target * 10000
+        block_lists.append(sorted(gofai.resolve_fractional_target(fractional_target)))
+
+    def func():
+        for blocks in block_lists:
+            gofai.reduce_fractional_blocks(blocks)
+
+    return func, len(block_lists)
+
+
+def validate_table():
+    table = load_combo_pkl()
+
+    def func():
+        for target, blocks in table.items():
+            validator.validate(blocks, target)
+
+    return func, len(table)
+
+
+def _label_index_map():
+    return {b: i for i, b in enumerate(sorted(blockset_81))}
+
+
+def convert_pkl_to_h():
+    target_to_blocks = load_combo_pkl()
+    targets = sorted(target_to_blocks)
+    label_index_map = _label_index_map()
+    labels = [f"{b/10000:.04f}" for b in sorted(blockset_81)]
+
+    def func():
+        target_ranges = pkl_to_h.get_target_ranges(targets)
+        buf = pkl_to_h.build_bitmaps(
+            target_to_blocks, target_ranges, label_index_map, len(blockset_81)
+        )
+        fh = io.StringIO()
+        pkl_to_h.print_labels(labels, fh=fh)
+        pkl_to_h.print_bitmaps(buf, fh=fh)
+        pkl_to_h.print_ranges(target_ranges, fh=fh)
+
+    return func, len(targets)
+
+
+def convert_pkl_to_bitmap_file():
+    target_to_blocks = load_combo_pkl()
+    targets = sorted(target_to_blocks)
+    label_index_map = _label_index_map()
+    num_bytes = (len(blockset_81) + 7) // 8
+
+    def func():
+        with tempfile.TemporaryFile() as f:
+            pkl_to_bitmap_file.write_bitmap_file(
+                target_to_blocks, targets, label_index_map, num_bytes, f
+            )
+
+    return func, len(targets)
+
+
+workloads = {
+    "gofai.resolve/sweep": lambda: resolver_sweep(gofai.resolve),
+    "gofai.resolve/sample": lambda: resolver_sample(gofai.resolve),
+    # greedy is ~50x slower than gofai, sweep every 64th target:
+    "greedy.resolve/sweep": lambda: resolver_sweep(greedy.resolve, stride=64),
+    "greedy.resolve/sample": lambda: resolver_sample(greedy.resolve),
+    **{
+        f"combo._generate_combo_batch/full/r={r}": (lambda r=r: combo_batch(r))
+        for r in COMBO_LENGTHS
+    },
+    **{
+        f"combo._generate_combo_batch/walker={walker}": (lambda walker=walker: combo_walk(walker))
+        for walker in walkers
+    },
+    "gofai.reduce_fractional_blocks": reduce_fractional_blocks,
+    "validator.validate/combo.pkl": validate_table,
+    "pkl_to_h": convert_pkl_to_h,
+    "pkl_to_bitmap_file": convert_pkl_to_bitmap_file,
+}
@@ -0,0 +1,143 @@
+#! /usr/bin/env python3
+
+''' Build the alternatives index for the resolution w/ unavailable blocks, see
+algo/unavailable.py
+'''
+
+import argparse
+import json
+import os
+import pickle
+import random
+import sys
+import time
+
+from algo.blockset import default_blockset, load_blockset
+from algo.combo import load_combos
+from algo.store import ComboStore, store_dir_for
+from algo.unavailable import (
+    UnavailableResolver,
+    alternatives_file_for,
+    block_mask,
+    build_alternatives,
+    default_depth,
+    default_max_removed,
+    default_top_k,
+    save_alternatives,
+)
+from algo.validator import is_valid
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-B", "--blockset",
+        help="""The blockset, blockset_81 or a definition file, see
+            algo/blockset.py, default: blockset_81""",
+    )
+    parser.add_argument(
+        "-o", "--out-file",
+        help="Output file, default: alternatives.pkl in the artifact cache of the --blockset",
+    )
+    parser.add_argument(
+        "-k", "--top-k",
+        default=default_top_k,
+        type=int,
+        help="The max number of alternatives per target, default: %(default)d",
+    )
+    parser.add_argument(
+        "-d", "--depth",
+        default=default_depth,
+        type=int,
+        help="""The max number of missing blocks of a best resolution covered
+            by its alternatives, default: %(default)d""",
+    )
+    parser.add_argument(
+        "-r", "--max-removed",
+        default=default_max_removed,
+        type=int,
+        help="""The max number of blocks replaced by a repair, the missing one
+            included, default: %(default)d""",
+    )
+    parser.add_argument(
+        "-n", "--n-parallel",
+        default=max(os.cpu_count() - 1, 1),
+        type=int,
+        help="The number of worker processes, default: %(default)d (#cores - 1)",
+    )
+    parser.add_argument(
+        "-s", "--sample",
+        default=10000,
+        type=int,
+        help="""The number of queries w/ 1 to 3 random missing blocks of the best
+            resolution, for the hit rate of the index, default: %(default)d""",
+    )
+    parser.add_argument(
+        "table",
+        nargs="?",
+        help="""The best resolutions, a pickle file or a combo store directory,
+            default: the combo store of the --blockset, or, for blockset_81,
+            combo.pkl if there is no store""",
+    )
+    args = parser.parse_args()
+
+    blockset = load_blockset(args.blockset)
+    if blockset.has_duplicates:
+        parser.error(f"{blockset.key}: blocksets w/ duplicates are not supported")
+    out_file = args.out_file if args.out_file is not None else alternatives_file_for(blockset)
+    try:
+        if args.table is None and blockset == default_blockset:
+            target_to_blocks, _ = load_combos()
+        elif args.table is None or os.path.isdir(args.table):
+            store = ComboStore(args.table or store_dir_for(blockset), blockset=blockset)
+            if not store.exists():
+                parser.error(f"{store.store_dir}: no combo store")
+            target_to_blocks = store.load()
+        else:
+            with open(args.table, 'rb') as f:
+                target_to_blocks = pickle.load(f)
+    except ValueError as e:
+        parser.error(str(e))
+    # A pickle file does not record its blockset:
+    invalid = [target for target, blocks in target_to_blocks.items() if not is_valid(blocks, target, blockset=blockset)]
+    if invalid:
+        parser.error(f"{len(invalid)} resolution(s) not from {blockset.key}, e.g. for {invalid[0]}")
+
+    start = time.time()
+    alternatives = build_alternatives(
+        target_to_blocks,
+        top_k=args.top_k,
+        depth=args.depth,
+        max_removed=args.max_removed,
+        n_parallel=args.n_parallel,
+        blockset=blockset,
+    )
+    stats = {
+        "targets": len(alternatives),
+        "alternatives": sum(len(masks) - 1 for masks in alternatives.values()),
+        "sec": time.time() - start,
+    }
+    save_alternatives(alternatives, out_file, blockset=blockset)
+
+    # The worst case: the missing blocks are in the best resolution.
+    ok = True
+    if args.sample > 0:
+        resolver = UnavailableResolver(alternatives, blockset=blockset)
+        rnd = random.Random(81)
+        targets = list(target_to_blocks)
+        start = time.time()
+        for _ in range(args.sample):
+            target = rnd.choice(targets)
+            blocks = target_to_blocks[target]
+            unavailable = block_mask(rnd.sample(blocks, min(rnd.randint(1, 3), len(blocks))), blockset=blockset)
+            blocks = resolver.resolve(target, unavailable=unavailable)
+            if blocks is not None and (
+                    block_mask(blocks, blockset=blockset) & unavailable
+                    or not is_valid(blocks, target, blockset=blockset)
+            ):
+                print(f"{target}: invalid resolution {blocks}", file=sys.stderr)
+                ok = False
+        stats["sample"] = {**resolver.stats(), "sec": time.time() - start}
+    print(json.dumps(stats), file=sys.stderr)
+    print(f"{out_file} generated", file=sys.stderr)
+    if not ok:
+        sys.exit(1)
@@ -1,6 +1,7 @@
 /* Resolver interface
 */
 
+#include <stdint.h>
 #include <stdlib.h>
 
 struct resolver {
@@ -11,6 +12,12 @@ struct resolver {
     void* _resolver_internal;
 };
 
+/* The size, in bytes, of a resolution bitmap: bit k (byte k >> 3, bit k & 7) is
+   set if labels[k] is part of the resolution. This is the same layout as the
+   bitmap file records.
+*/
+#define RESOLVER_BITMAP_NUM_BYTES(resolver) (((resolver)->num_labels + 7) >> 3)
+
 
 /* 
 Define the resolver interface if not included from a specific resolver code.
@@ -41,4 +48,24 @@ extern const struct resolver* init_resolver(int argc, char** argv);
 */
 extern int resolve(const struct resolver* resolver, uint32_t target, const char* blocks[]);
 
+/*  Batch resolver
+    Args:
+        resolver: the resolver info
+        targets: the targets to resolve, in any order; targets outside the
+                 min_target .. max_target interval are not an error, they
+                 resolve to an empty bitmap.
+        num_targets: the number of targets
+        bitmaps: storage space for num_targets consecutive bitmaps of
+                 RESOLVER_BITMAP_NUM_BYTES(resolver) bytes each, the bitmap
+                 for targets[i] starts at byte offset
+                 i * RESOLVER_BITMAP_NUM_BYTES(resolver). Unresolvable targets
+                 have all bits cleared.
+
+    Return value:
+        < 0: Resolution error, the content of bitmaps is undefined. The error 
+             message is assumed to have been displayed to stderr.
+        >= 0: Successful resolution.
+*/
+extern int resolve_many(const struct resolver* resolver, const uint32_t* targets, size_t num_targets, uint8_t* bitmaps);
+
 #endif
\ No newline at end of file
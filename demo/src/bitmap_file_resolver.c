@@ -153,3 +153,47 @@ int resolve(const struct resolver* resolver, uint32_t target, const char* blocks
     return 0;
 }
 
+
+int resolve_many(const struct resolver* resolver, const uint32_t* targets, size_t num_targets, uint8_t* bitmaps) {
+    struct meta* meta = (struct meta*)resolver->_resolver_internal;
+    size_t i, run;
+    off_t off;
+    ssize_t to_read, n;
+
+    i = 0;
+    while (i < num_targets) {
+        uint32_t target = targets[i];
+        uint8_t* bitmap = bitmaps + i * meta->bitmap_num_bytes;
+
+        if (target < resolver->min_target || resolver->max_target < target) {
+            memset(bitmap, 0, meta->bitmap_num_bytes);
+            i++;
+            continue;
+        }
+        /* Consecutive targets have consecutive bitmaps in the file, read them
+           in one go: */
+        for (run = 1; i + run < num_targets; run++) {
+            if (targets[i + run] != target + run || targets[i + run] > resolver->max_target) {
+                break;
+            }
+        }
+        off = (off_t)(target - resolver->min_target) * meta->bitmap_num_bytes;
+        to_read = run * meta->bitmap_num_bytes;
+        while (to_read > 0) {
+            if ((n = pread(meta->bitmap_fd, bitmap, to_read, off)) <= 0) {
+                if (n < 0) {
+                    fprintf(stderr, "pread(%s): %d (%s)\n", meta->bitmap_file, errno, strerror(errno));
+                } else {
+                    fprintf(stderr, "pread(%s): unexpected EOF\n", meta->bitmap_file);
+                }
+                return -1;
+            }
+            bitmap += n;
+            off += n;
+            to_read -= n;
+        }
+        i += run;
+    }
+
+    return 0;
+}
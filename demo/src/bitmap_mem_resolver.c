@@ -1,5 +1,6 @@
 /* Query in memory bitmap resolver.
 */
+#include <stdint.h>
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
@@ -64,4 +65,58 @@ int resolve(const struct resolver* resolver, uint32_t target, const char* blocks
     }
 
     return 0;
-}
\ No newline at end of file
+}
+
+/* Locate the range for target, starting w/ the hint, since batch targets are
+   likely to be close to each other. Return the range index or -1 if the target
+   is unresolvable.
+*/
+static int find_range(uint32_t target, int hint) {
+    int bs_start, bs_end;
+
+    if (0 <= hint && hint < NUM_RANGES && ranges[hint].start <= target) {
+        if (target <= ranges[hint].end) {
+            return hint;
+        }
+        if (hint + 1 < NUM_RANGES && ranges[hint + 1].start <= target && target <= ranges[hint + 1].end) {
+            return hint + 1;
+        }
+    }
+    bs_start = 0;
+    bs_end = NUM_RANGES - 1;
+    while (bs_start <= bs_end) {
+        int i = (bs_start + bs_end) / 2;
+        if (ranges[i].start <= target && target <= ranges[i].end) {
+            return i;
+        } else if (target < ranges[i].start) {
+            bs_end = i - 1;
+        } else {
+            bs_start = i + 1;
+        }
+    }
+    return -1;
+}
+
+int resolve_many(const struct resolver* resolver, const uint32_t* targets, size_t num_targets, uint8_t* out) {
+    /* Note: `bitmaps' is the resolution data, see bitmap.h */
+    const size_t bitmap_num_bytes = RESOLVER_BITMAP_NUM_BYTES(resolver);
+    uint32_t bit_off_base, bit_off;
+    int i = -1;
+
+    memset(out, 0, num_targets * bitmap_num_bytes);
+    for (size_t t = 0; t < num_targets; t++, out += bitmap_num_bytes) {
+        uint32_t target = targets[t];
+        if ((i = find_range(target, i)) < 0) {
+            continue;
+        }
+        bit_off_base = ranges[i].bit_off_base + (target - ranges[i].start) * BITMAP_NUM_BITS;
+        for (uint32_t k = 0; k < BITMAP_NUM_BITS; k++) {
+            bit_off = bit_off_base + k;
+            if (bitmaps[bit_off >> 3] & (1 << (bit_off & 7))) {
+                out[k >> 3] |= 1 << (k & 7);
+            }
+        }
+    }
+
+    return 0;
+}
@@ -1,5 +1,6 @@
 /* Query in memory zlib compressed bitamp resolver.
 */
+#include <stdint.h>
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
@@ -129,4 +130,146 @@ int resolve(const struct resolver* resolver, uint32_t target, const char* blocks
     }
 
     return 0;
-}
\ No newline at end of file
+}
+
+/*
+Batch resolution support: a de-compression cursor which is kept open across
+targets, such that ascending targets are resolved in a single pass over the
+compressed bitmaps. It is restarted only when a target requires an earlier
+offset than the current one.
+*/
+struct z_cursor {
+    z_stream z_stream;
+    int active;
+    /* The uncompressed offset and length of the data in buf: */
+    uint32_t buf_off, buf_len;
+    uint8_t buf[BITMAP_BUF_SZ];
+};
+
+static int z_cursor_reset(struct z_cursor* cursor) {
+    if (cursor->active) {
+        inflateEnd(&cursor->z_stream);
+        cursor->active = 0;
+    }
+    memset(&cursor->z_stream, 0, sizeof(cursor->z_stream));
+    cursor->z_stream.next_in = (Bytef*)bitmaps_z;
+    cursor->z_stream.avail_in = sizeof(bitmaps_z);
+    cursor->z_stream.zalloc = Z_NULL;
+    cursor->z_stream.zfree = Z_NULL;
+    cursor->buf_off = 0;
+    cursor->buf_len = 0;
+    int z_ret = inflateInit(&cursor->z_stream);
+    if (z_ret == Z_OK) {
+        cursor->active = 1;
+    }
+    return z_ret;
+}
+
+/* Ensure that the uncompressed [off, off + len) bytes are in the buffer, and
+   return a pointer to them, or NULL on error.
+*/
+static const uint8_t* z_cursor_read(struct z_cursor* cursor, uint32_t off, uint32_t len, int* z_err) {
+    int z_ret;
+
+    *z_err = Z_OK;
+    if (! cursor->active || off < cursor->buf_off) {
+        if ((z_ret = z_cursor_reset(cursor)) != Z_OK) {
+            *z_err = z_ret;
+            return NULL;
+        }
+    }
+    while (cursor->buf_off + cursor->buf_len < off + len) {
+        uint32_t keep;
+        if (off < cursor->buf_off + cursor->buf_len) {
+            /* Keep the already uncompressed part of the requested bytes: */
+            keep = cursor->buf_off + cursor->buf_len - off;
+            memmove(cursor->buf, cursor->buf + (off - cursor->buf_off), keep);
+            cursor->buf_off = off;
+        } else {
+            /* Skip over the current content: */
+            keep = 0;
+            cursor->buf_off += cursor->buf_len;
+        }
+        cursor->buf_len = keep;
+        uint32_t to_read = sizeof(cursor->buf) - keep;
+        if (cursor->buf_off + keep < off && off - cursor->buf_off - keep < to_read) {
+            /* Do not overshoot past the requested bytes more than needed */
+            to_read = off - cursor->buf_off - keep;
+        }
+        cursor->z_stream.next_out = (Bytef*)(cursor->buf + keep);
+        cursor->z_stream.avail_out = to_read;
+        z_ret = inflate(&cursor->z_stream, Z_SYNC_FLUSH);
+        cursor->buf_len += to_read - cursor->z_stream.avail_out;
+        if (z_ret != Z_OK && !(z_ret == Z_STREAM_END && cursor->buf_off + cursor->buf_len >= off + len)) {
+            *z_err = z_ret == Z_STREAM_END ? Z_BUF_ERROR : z_ret;
+            z_cursor_reset(cursor);
+            return NULL;
+        }
+    }
+    return cursor->buf + (off - cursor->buf_off);
+}
+
+static int cmp_uint64(const void* a, const void* b) {
+    uint64_t x = *(const uint64_t*)a, y = *(const uint64_t*)b;
+    return x < y ? -1 : x > y ? 1 : 0;
+}
+
+int resolve_many(const struct resolver* resolver, const uint32_t* targets, size_t num_targets, uint8_t* out) {
+    const size_t bitmap_num_bytes = RESOLVER_BITMAP_NUM_BYTES(resolver);
+    static struct z_cursor cursor;
+    int z_err, bs_start, bs_end, i = 0, ret_val = 0;
+    uint32_t bit_off_base, bit_off;
+    const uint8_t* buf;
+    uint64_t* order;
+
+    /* Visit the targets in ascending order, (target, index) packed into
+       uint64, such that the whole batch is resolved in one de-compression
+       pass: */
+    order = malloc(num_targets * sizeof(uint64_t));
+    if (order == NULL) {
+        fprintf(stderr, "resolve_many: cannot allocate %zu targets\n", num_targets);
+        return -1;
+    }
+    for (size_t t = 0; t < num_targets; t++) {
+        order[t] = ((uint64_t)targets[t] << 32) | t;
+    }
+    qsort(order, num_targets, sizeof(uint64_t), cmp_uint64);
+
+    memset(out, 0, num_targets * bitmap_num_bytes);
+    for (size_t t = 0; t < num_targets; t++) {
+        uint32_t target = (uint32_t)(order[t] >> 32);
+        uint8_t* bitmap = out + (order[t] & 0xffffffff) * bitmap_num_bytes;
+        bs_start = 0;
+        bs_end = NUM_RANGES - 1;
+        while (bs_start <= bs_end) {
+            i = (bs_start + bs_end) / 2;
+            if (ranges[i].start <= target && target <= ranges[i].end) {
+                break;
+            } else if (target < ranges[i].start) {
+                bs_end = i - 1;
+            } else {
+                bs_start = i + 1;
+            }
+        }
+        if (bs_start > bs_end) {
+            continue;
+        }
+        bit_off_base = ranges[i].bit_off_base + (target - ranges[i].start) * BITMAP_NUM_BITS;
+        buf = z_cursor_read(&cursor, bit_off_base >> 3, ((bit_off_base & 7) + BITMAP_NUM_BITS + 7) >> 3, &z_err);
+        if (buf == NULL) {
+            fprintf(stderr, "%u: zlib error: %d (%s)\n", target, z_err, expand_z_err(z_err));
+            ret_val = -1;
+            break;
+        }
+        bit_off_base &= 7; /* Since already on the byte */
+        for (uint32_t k = 0; k < BITMAP_NUM_BITS; k++) {
+            bit_off = bit_off_base + k;
+            if (buf[bit_off >> 3] & (1 << (bit_off & 7))) {
+                bitmap[k >> 3] |= 1 << (k & 7);
+            }
+        }
+    }
+    free(order);
+
+    return ret_val;
+}
@@ -5,19 +5,45 @@ Resolver driver, to be linked with a particular resolver.
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
+#include <time.h>
 #include <unistd.h>
+#include <sys/resource.h>
 
 #include "resolver.h"
 
 #define LINE_BUF_SZ 256
 
+/* The number of targets resolved in one resolve_many call in batch mode: */
+#ifndef BATCH_SZ
+# define BATCH_SZ 4096
+#endif
+
+/* The size of the JSON output buffer: */
+#ifndef JSON_BUF_SZ
+# define JSON_BUF_SZ 256 * 1024
+#endif
+
+/* Benchmark defaults: the max number of lookups and the max duration for each
+   distribution and entry point, whichever comes first. The latter protects
+   against slow resolvers. */
+#ifndef BENCH_NUM_LOOKUPS
+# define BENCH_NUM_LOOKUPS 1000000
+#endif
+#ifndef BENCH_MAX_SEC
+# define BENCH_MAX_SEC 2
+#endif
+/* The size of the hot target set: */
+#ifndef BENCH_HOT_SET_SZ
+# define BENCH_HOT_SET_SZ 1024
+#endif
+
 void help(char* argv0) {
     char* slash = strrchr(argv0, '/'); 
     if (slash != NULL) {
         argv0 = slash + 1;
     }
     fprintf(stderr, "\
-Usage: %s -qth RESOLVER_ARGS...\n\
+Usage: %s -qtbjBh [-i TARGETS_FILE] [-n NUM_LOOKUPS] RESOLVER_ARGS...\n\
 Options:\n\
     -q:\n\
         Quiet, do not print the prompt.\n\
@@ -27,12 +53,30 @@ Options:\n\
             {\n\
                 \"TARGET\": [\"LABEL\", ...]\n\
             }\n\
+    -b:\n\
+        Batch, read targets as packed uint32 values, in host byte order, from\n\
+        stdin and write their resolution as packed bitmaps, (NUM_LABELS + 7) / 8\n\
+        bytes each, in the same order to stdout. Bit k, i.e. byte k / 8,\n\
+        bit k %% 8, is set if LABEL[k] is part of the resolution. Targets w/o\n\
+        resolution have all bits cleared.\n\
+    -j:\n\
+        Batch with JSON output, in the same format as for -t.\n\
+    -i TARGETS_FILE:\n\
+        Read the batch targets from TARGETS_FILE instead of stdin, implies -b.\n\
+    -B:\n\
+        Benchmark, measure ns/lookup for sequential, random and hot set target\n\
+        distributions, for both resolve and resolve_many, and print the results,\n\
+        together w/ startup time and max resident memory, as a single line of\n\
+        JSON.\n\
+    -n NUM_LOOKUPS:\n\
+        The max number of lookups for each benchmark, default: %d. Each one\n\
+        is also limited to %d sec.\n\
     -h:\n\
         This help message.\n\
 Resolver args:\n\
         %s\n\
 ",
-        argv0, resolver_args != NULL ? resolver_args: "");
+        argv0, BENCH_NUM_LOOKUPS, BENCH_MAX_SEC, resolver_args != NULL ? resolver_args: "");
 }
 
 
@@ -55,28 +99,359 @@ void display_blocks(const char* blocks[], int num_labels) {
 }
 
 
-void generate_test_data(const struct resolver* resolver, const char* blocks[]) {
-    printf("{");
-    for (uint32_t target = resolver->min_target; target <= resolver->max_target; target++) {
-        if (resolve(resolver, target, blocks) < 0) {
+/* Buffered JSON output for batch resolutions, using pre-formatted labels to
+   avoid a printf per block.
+*/
+struct json_out {
+    FILE* fh;
+    char* buf;
+    size_t len;
+    const char** labels;
+    size_t* label_lens;
+    int num_labels;
+    int num_entries;
+};
+
+void json_out_init(struct json_out* out, const struct resolver* resolver, FILE* fh) {
+    out->fh = fh;
+    out->buf = malloc(JSON_BUF_SZ);
+    out->len = 0;
+    out->num_labels = resolver->num_labels;
+    out->labels = malloc(resolver->num_labels * sizeof(const char*));
+    out->label_lens = malloc(resolver->num_labels * sizeof(size_t));
+    for (int k = 0; k < resolver->num_labels; k++) {
+        size_t l = strlen(resolver->labels[k]) + 2;
+        char* label = malloc(l + 1);
+        snprintf(label, l + 1, "\"%s\"", resolver->labels[k]);
+        out->labels[k] = label;
+        out->label_lens[k] = l;
+    }
+    out->num_entries = 0;
+    out->buf[out->len++] = '{';
+}
+
+void json_out_flush(struct json_out* out) {
+    if (out->len > 0) {
+        fwrite(out->buf, 1, out->len, out->fh);
+        out->len = 0;
+    }
+}
+
+void json_out_append(struct json_out* out, uint32_t target, const uint8_t* bitmap) {
+    char* p;
+    int first_label = 1;
+
+    /* Worst case for an entry: all labels + separators + target: */
+    size_t max_entry_len = 32;
+    for (int k = 0; k < out->num_labels; k++) {
+        max_entry_len += out->label_lens[k] + 2;
+    }
+    if (out->len + max_entry_len > JSON_BUF_SZ) {
+        json_out_flush(out);
+    }
+    p = out->buf + out->len;
+    if (out->num_entries > 0) {
+        /* There was a previous block list, append ',' */
+        *p++ = ',';
+    }
+    p += sprintf(p, "\n  \"%u\": [", target);
+    for (int k = 0; k < out->num_labels; k++) {
+        if ((bitmap[k >> 3] & (1 << (k & 7))) == 0) {
+            continue;
+        }
+        if (! first_label) {
+            *p++ = ',';
+            *p++ = ' ';
+        } else {
+            first_label = 0;
+        }
+        memcpy(p, out->labels[k], out->label_lens[k]);
+        p += out->label_lens[k];
+    }
+    *p++ = ']';
+    out->len = p - out->buf;
+    out->num_entries++;
+}
+
+void json_out_close(struct json_out* out) {
+    json_out_flush(out);
+    fputs("\n}\n", out->fh);
+    fflush(out->fh);
+    for (int k = 0; k < out->num_labels; k++) {
+        free((void*)out->labels[k]);
+    }
+    free(out->labels);
+    free(out->label_lens);
+    free(out->buf);
+}
+
+
+void generate_test_data(const struct resolver* resolver) {
+    const size_t bitmap_num_bytes = RESOLVER_BITMAP_NUM_BYTES(resolver);
+    uint32_t* targets = malloc(BATCH_SZ * sizeof(uint32_t));
+    uint8_t* bitmaps = malloc(BATCH_SZ * bitmap_num_bytes);
+    struct json_out out;
+
+    json_out_init(&out, resolver, stdout);
+    uint32_t target = resolver->min_target;
+    while (target <= resolver->max_target) {
+        size_t n = 0;
+        while (n < BATCH_SZ && target <= resolver->max_target) {
+            targets[n++] = target++;
+        }
+        if (resolve_many(resolver, targets, n, bitmaps) < 0) {
             /* Error, message already displayed, cannot continue */
             break;
         }
-        if (target > resolver->min_target) {
-            /* There was a previous block list, append ',' */
-            printf(",");
+        for (size_t i = 0; i < n; i++) {
+            json_out_append(&out, targets[i], bitmaps + i * bitmap_num_bytes);
         }
-        printf("\n  \"%u\": ", target);
-        display_blocks(blocks, resolver->num_labels);
+        if (target == 0) {
+            /* Wrapped around, max_target == UINT32_MAX */
+            break;
+        }
+    }
+    json_out_close(&out);
+    free(targets);
+    free(bitmaps);
+}
+
+
+int resolve_batch(const struct resolver* resolver, FILE* in_fh, int json) {
+    const size_t bitmap_num_bytes = RESOLVER_BITMAP_NUM_BYTES(resolver);
+    uint32_t* targets = malloc(BATCH_SZ * sizeof(uint32_t));
+    uint8_t* bitmaps = malloc(BATCH_SZ * bitmap_num_bytes);
+    struct json_out out;
+    int ret_val = 0;
+    size_t n, partial = 0;
+
+    if (json) {
+        json_out_init(&out, resolver, stdout);
+    } else {
+        setvbuf(stdout, NULL, _IOFBF, JSON_BUF_SZ);
+    }
+    while ((n = fread((uint8_t*)targets + partial, 1, BATCH_SZ * sizeof(uint32_t) - partial, in_fh)) > 0) {
+        /* Handle short reads from pipes, such that targets are not split: */
+        n += partial;
+        partial = n % sizeof(uint32_t);
+        n /= sizeof(uint32_t);
+        if (resolve_many(resolver, targets, n, bitmaps) < 0) {
+            /* Error, message already displayed, cannot continue */
+            ret_val = -1;
+            break;
+        }
+        if (json) {
+            for (size_t i = 0; i < n; i++) {
+                json_out_append(&out, targets[i], bitmaps + i * bitmap_num_bytes);
+            }
+        } else if (fwrite(bitmaps, bitmap_num_bytes, n, stdout) != n) {
+            perror("fwrite(stdout)");
+            ret_val = -1;
+            break;
+        }
+        if (partial > 0) {
+            memmove(targets, (uint8_t*)targets + n * sizeof(uint32_t), partial);
+        }
+    }
+    if (ret_val == 0 && ferror(in_fh)) {
+        perror("fread(targets)");
+        ret_val = -1;
+    }
+    if (ret_val == 0 && partial > 0) {
+        fprintf(stderr, "Truncated target at the end of input, %zu byte(s) ignored\n", partial);
+        ret_val = -1;
+    }
+    if (json) {
+        json_out_close(&out);
+    } else {
+        fflush(stdout);
+    }
+    free(targets);
+    free(bitmaps);
+    return ret_val;
+}
+
+
+/* Benchmark support.
+*/
+static uint64_t now_ns(void) {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (uint64_t)ts.tv_sec * 1000000000 + ts.tv_nsec;
+}
+
+/* Fixed seed pseudo random generator, such that runs are comparable: */
+static uint32_t xorshift32(uint32_t* state) {
+    uint32_t x = *state;
+    x ^= x << 13;
+    x ^= x >> 17;
+    x ^= x << 5;
+    return *state = x;
+}
+
+enum bench_distribution {
+    BENCH_SEQUENTIAL,
+    BENCH_RANDOM,
+    BENCH_HOT_SET,
+    BENCH_NUM_DISTRIBUTIONS
+};
+
+const char* bench_distribution_names[] = {
+    "sequential",
+    "random",
+    "hot_set",
+};
+
+struct bench_targets {
+    const struct resolver* resolver;
+    enum bench_distribution distribution;
+    uint32_t next_target;
+    uint32_t rand_state;
+    uint32_t hot_set[BENCH_HOT_SET_SZ];
+};
+
+void bench_targets_init(struct bench_targets* bt, const struct resolver* resolver, enum bench_distribution distribution) {
+    uint32_t span = resolver->max_target - resolver->min_target + 1;
+
+    bt->resolver = resolver;
+    bt->distribution = distribution;
+    bt->next_target = resolver->min_target;
+    bt->rand_state = 0x9e3779b9;
+    for (int i = 0; i < BENCH_HOT_SET_SZ; i++) {
+        bt->hot_set[i] = resolver->min_target + xorshift32(&bt->rand_state) % span;
     }
-    printf("\n}\n");
+}
+
+static uint32_t bench_next_target(struct bench_targets* bt) {
+    uint32_t target;
+    switch (bt->distribution) {
+        case BENCH_SEQUENTIAL:
+            target = bt->next_target;
+            bt->next_target = target < bt->resolver->max_target ? target + 1 : bt->resolver->min_target;
+            return target;
+        case BENCH_RANDOM:
+            return bt->resolver->min_target + xorshift32(&bt->rand_state) % (bt->resolver->max_target - bt->resolver->min_target + 1);
+        default:
+            return bt->hot_set[xorshift32(&bt->rand_state) % BENCH_HOT_SET_SZ];
+    }
+}
+
+struct bench_result {
+    uint64_t num_lookups;
+    uint64_t elapsed_ns;
+};
+
+/* Time lookups via resolve, return < 0 on resolution error. The target
+   generation is included in the time, but it is negligible in comparison. */
+int bench_resolve(const struct resolver* resolver, enum bench_distribution distribution, uint64_t max_lookups, struct bench_result* result) {
+    const char** blocks = malloc(resolver->num_labels * sizeof(const char*));
+    struct bench_targets bt;
+    uint64_t start, deadline, n = 0, t = 0;
+    int ret_val = 0;
+
+    bench_targets_init(&bt, resolver, distribution);
+    start = now_ns();
+    deadline = start + (uint64_t)BENCH_MAX_SEC * 1000000000;
+    while (n < max_lookups) {
+        if (resolve(resolver, bench_next_target(&bt), blocks) < 0) {
+            ret_val = -1;
+            break;
+        }
+        n++;
+        if ((n & 0xff) == 0 && (t = now_ns()) >= deadline) {
+            break;
+        }
+    }
+    t = now_ns();
+    result->num_lookups = n;
+    result->elapsed_ns = t - start;
+    free(blocks);
+    return ret_val;
+}
+
+/* Time lookups via resolve_many, in BATCH_SZ batches. */
+int bench_resolve_many(const struct resolver* resolver, enum bench_distribution distribution, uint64_t max_lookups, struct bench_result* result) {
+    uint32_t* targets = malloc(BATCH_SZ * sizeof(uint32_t));
+    uint8_t* bitmaps = malloc(BATCH_SZ * RESOLVER_BITMAP_NUM_BYTES(resolver));
+    struct bench_targets bt;
+    uint64_t start, deadline, elapsed = 0, n = 0;
+    int ret_val = 0;
+
+    bench_targets_init(&bt, resolver, distribution);
+    deadline = now_ns() + (uint64_t)BENCH_MAX_SEC * 1000000000;
+    while (n < max_lookups) {
+        size_t batch_sz = max_lookups - n < BATCH_SZ ? max_lookups - n : BATCH_SZ;
+        /* Exclude the target generation from the time: */
+        for (size_t i = 0; i < batch_sz; i++) {
+            targets[i] = bench_next_target(&bt);
+        }
+        start = now_ns();
+        if (resolve_many(resolver, targets, batch_sz, bitmaps) < 0) {
+            ret_val = -1;
+            break;
+        }
+        elapsed += now_ns() - start;
+        n += batch_sz;
+        if (now_ns() >= deadline) {
+            break;
+        }
+    }
+    result->num_lookups = n;
+    result->elapsed_ns = elapsed;
+    free(targets);
+    free(bitmaps);
+    return ret_val;
+}
+
+/* Return the max resident memory in KiB. */
+static long max_rss_kib(void) {
+    struct rusage usage;
+    if (getrusage(RUSAGE_SELF, &usage) != 0) {
+        return -1;
+    }
+#ifdef __APPLE__
+    /* Reported in bytes */
+    return usage.ru_maxrss / 1024;
+#else
+    return usage.ru_maxrss;
+#endif
+}
+
+int run_benchmark(const char* name, const struct resolver* resolver, uint64_t startup_ns, uint64_t max_lookups) {
+    struct bench_result result;
+    const char* sep = "";
+    int ret_val = 0;
+
+    printf("{\"resolver\": \"%s\", \"startup_ns\": %llu, \"min_target\": %u, \"max_target\": %u, \"lookups\": {", \
+        name, (unsigned long long)startup_ns, resolver->min_target, resolver->max_target);
+    for (int d = 0; d < BENCH_NUM_DISTRIBUTIONS && ret_val == 0; d++) {
+        printf("%s\"%s\": {", sep, bench_distribution_names[d]);
+        sep = ", ";
+        if ((ret_val = bench_resolve(resolver, d, max_lookups, &result)) == 0) {
+            printf("\"resolve\": {\"n\": %llu, \"ns_per_lookup\": %.1f}, ", \
+                (unsigned long long)result.num_lookups, (double)result.elapsed_ns / result.num_lookups);
+            ret_val = bench_resolve_many(resolver, d, max_lookups, &result);
+        }
+        if (ret_val == 0) {
+            printf("\"resolve_many\": {\"n\": %llu, \"ns_per_lookup\": %.1f}}", \
+                (unsigned long long)result.num_lookups, (double)result.elapsed_ns / result.num_lookups);
+        } else {
+            /* Error, message already displayed, keep the JSON valid */
+            printf("\"error\": true}");
+        }
+        fflush(stdout);
+    }
+    printf("}, \"max_rss_kib\": %ld}\n", max_rss_kib());
+    return ret_val;
 }
 
 
 int main(int argc, char** argv) {
-    int opt, quiet = 0, test=0;
+    int opt, quiet = 0, test=0, batch = 0, json = 0, bench = 0;
+    const char* targets_file = NULL;
+    uint64_t bench_num_lookups = BENCH_NUM_LOOKUPS, startup_ns;
 
-    while ((opt = getopt(argc, argv, "qth")) != -1) {
+    while ((opt = getopt(argc, argv, "qtbjBi:n:h")) != -1) {
         switch (opt) {
             case 'q':
                 quiet = 1;
@@ -84,24 +459,61 @@ int main(int argc, char** argv) {
             case 't':
                 test = 1;
                 break;
+            case 'b':
+                batch = 1;
+                break;
+            case 'j':
+                batch = 1;
+                json = 1;
+                break;
+            case 'i':
+                batch = 1;
+                targets_file = optarg;
+                break;
+            case 'B':
+                bench = 1;
+                break;
+            case 'n':
+                bench_num_lookups = strtoull(optarg, NULL, 10);
+                if (bench_num_lookups == 0) {
+                    fprintf(stderr, "`%s': invalid NUM_LOOKUPS\n", optarg);
+                    exit(1);
+                }
+                break;
             case 'h':
                 help(argv[0]);
                 exit(1);
         }
     }
 
+    startup_ns = now_ns();
     const struct resolver* resolver = init_resolver(argc - optind, argv + optind);
     if (resolver == NULL) {
         exit(1);
     }
+    startup_ns = now_ns() - startup_ns;
 
-    const char** blocks = malloc(resolver->num_labels * sizeof(const char*));
+    if (bench) {
+        char* name = strrchr(argv[0], '/');
+        exit(run_benchmark(name != NULL ? name + 1 : argv[0], resolver, startup_ns, bench_num_lookups) < 0 ? 1 : 0);
+    }
 
     if (test) {
-        generate_test_data(resolver, blocks);
+        generate_test_data(resolver);
         exit(0);
     }
 
+    if (batch) {
+        FILE* in_fh = stdin;
+        if (targets_file != NULL && (in_fh = fopen(targets_file, "rb")) == NULL) {
+            perror(targets_file);
+            exit(1);
+        }
+        exit(resolve_batch(resolver, in_fh, json) < 0 ? 1 : 0);
+    }
+
+    const char** blocks = malloc(resolver->num_labels * sizeof(const char*));
+
     while (1) {
         char line_buf[LINE_BUF_SZ];
         int l;
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+''' Compare resolver benchmark results, as generated by `RESOLVER -B', against a
+baseline. All metrics are lower-is-better, a metric is flagged as a regression
+if it exceeds the baseline by more than the threshold.
+'''
+
+import argparse
+import json
+import sys
+
+
+def load_results(jsonl_file):
+    results = {}
+    with open(jsonl_file, "rt") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                result = json.loads(line)
+                results[result["resolver"]] = result
+    return results
+
+
+def flatten_metrics(result):
+    metrics = {
+        "startup_ns": result["startup_ns"],
+        "max_rss_kib": result["max_rss_kib"],
+    }
+    for distribution, entries in result["lookups"].items():
+        for entry, stats in entries.items():
+            if isinstance(stats, dict):
+                metrics[f"{distribution}.{entry}.ns_per_lookup"] = stats["ns_per_lookup"]
+    return metrics
+
+
+def compare(baseline, current, threshold_pct):
+    ''' Return the list of rows (resolver, metric, baseline, current, delta %,
+    flag) and the number of regressions.
+    '''
+    rows, regression_count = [], 0
+    for resolver in sorted(set(baseline) | set(current)):
+        if resolver not in current:
+            rows.append((resolver, "*", None, None, None, "MISSING"))
+            continue
+        cur_metrics = flatten_metrics(current[resolver])
+        if resolver not in baseline:
+            rows.extend(
+                (resolver, metric, None, val, None, "NEW") for metric, val in cur_metrics.items()
+            )
+            continue
+        base_metrics = flatten_metrics(baseline[resolver])
+        for metric, val in cur_metrics.items():
+            base_val = base_metrics.get(metric)
+            delta_pct, flag = None, ""
+            if base_val:
+                delta_pct = (val - base_val) * 100 / base_val
+                if delta_pct > threshold_pct:
+                    flag = "REGRESSION"
+                    regression_count += 1
+                elif delta_pct < -threshold_pct:
+                    flag = "improvement"
+            rows.append((resolver, metric, base_val, val, delta_pct, flag))
+    return rows, regression_count
+
+
+def format_rows(rows):
+    headers = ("Resolver", "Metric", "Baseline", "Current", "Delta %", "")
+    table = [headers] + [
+        (
+            resolver,
+            metric,
+            "" if base_val is None else f"{base_val:.1f}",
+            "" if val is None else f"{val:.1f}",
+            "" if delta_pct is None else f"{delta_pct:+.1f}",
+            flag,
+        )
+        for resolver, metric, base_val, val, delta_pct, flag in rows
+    ]
+    widths = [max(len(row[i]) for row in table) for i in range(len(headers))]
+    return "\n".join(
+        "  ".join(
+            col.ljust(w) if i < 2 else col.rjust(w) for i, (col, w) in enumerate(zip(row, widths))
+        ).rstrip()
+        for row in table
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-t", "--threshold",
+        default=10,
+        type=float,
+        help="Regression threshold, in percents, default: %(default)s",
+    )
+    parser.add_argument("baseline_file")
+    parser.add_argument("result_file")
+    args = parser.parse_args()
+
+    rows, regression_count = compare(
+        load_results(args.baseline_file),
+        load_results(args.result_file),
+        args.threshold,
+    )
+    print(format_rows(rows))
+    if regression_count > 0:
+        print(f"\n{regression_count} regression(s) over {args.threshold}%", file=sys.stderr)
+        exit(1)
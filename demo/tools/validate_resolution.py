@@ -1,55 +1,349 @@
 #!/usr/bin/env python3
 
+''' Validate the resolution generated by a resolver against the reference pickle
+file.
+
+The resolution is either the JSON output of `-t' or `-j', or the packed
+bitmaps output of `-b'. It is parsed incrementally while walking the reference
+in ascending target order, so the memory usage doesn't depend on the size of
+the resolution.
+'''
+
 import argparse
+import array
 import json
+import os
 import pickle
 import sys
 
-def normalize_reference(ref):
-    return {
-        t: tuple(sorted(ref[t])) for t in ref
-    }
+JSON_CHUNK_SZ = 1 << 16
+BITMAP_CHUNK_NUM = 1 << 12
+WHITESPACE = " \t\n\r"
+
+
+class ValidationError(Exception):
+    pass
+
+
+def label_to_block(label):
+    return int(label.replace(".", ""))
+
+
+def iter_json_resolution(fh, chunk_sz=JSON_CHUNK_SZ):
+    ''' Parse {"TARGET": ["LABEL", ...], ...} incrementally
+
+    Yield:
+        (target, labels) in file order
+    '''
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = fh.read(chunk_sz)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    def next_char():
+        ''' Skip whitespace and return the next char, w/o consuming it.
+        '''
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in WHITESPACE:
+                pos += 1
+            if pos < len(buf) or eof:
+                return buf[pos] if pos < len(buf) else ""
+            fill()
+
+    def decode():
+        nonlocal pos
+        next_char()
+        while True:
+            try:
+                val, end = decoder.raw_decode(buf, pos)
+                # A value at the very end of the buffer may be incomplete:
+                if end < len(buf) or eof:
+                    pos = end
+                    return val
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise ValidationError(f"Invalid JSON: {e}")
+            fill()
+
+    def expect(c):
+        nonlocal pos
+        got = next_char()
+        if got != c:
+            raise ValidationError(f"Invalid JSON: expected {c!r}, got {got!r}")
+        pos += 1
+
+    expect("{")
+    if next_char() == "}":
+        return
+    while True:
+        target = decode()
+        expect(":")
+        labels = decode()
+        try:
+            yield int(target), labels
+        except ValueError:
+            raise ValidationError(f"Invalid target {target!r}")
+        c = next_char()
+        pos += 1
+        if c == "}":
+            break
+        if c != ",":
+            raise ValidationError(f"Invalid JSON: expected ',' or '}}', got {c!r}")
+
+
+def iter_json_blocks(fh):
+    for target, labels in iter_json_resolution(fh):
+        yield target, tuple(sorted(label_to_block(label) for label in labels))
+
+
+def iter_targets(targets_fh=None, start=None, count=None):
+    ''' Yield targets either from a packed uint32 file or sequentially from
+    start, count of them, default: w/o end.
+    '''
+    if targets_fh is None:
+        target = start
+        while count is None or target < start + count:
+            yield target
+            target += 1
+        return
+    while True:
+        chunk = array.array("I")
+        chunk.frombytes(targets_fh.read(BITMAP_CHUNK_NUM * chunk.itemsize))
+        if len(chunk) == 0:
+            break
+        yield from chunk
 
-def normalize_result(res):
-    norm = {}
-    for target, blocks in res.items():
-        if len(blocks) == 0:
-            continue
-        norm[int(target)] = tuple(sorted(
-            int(b.replace(".", "")) for b in blocks
-        ))
-    return norm
+
+def iter_bitmap_resolution(fh, num_bytes, targets):
+    ''' Parse packed bitmaps incrementally
+
+    Yield:
+        (target, bitmap bytes) in file order
+    '''
+    targets = iter(targets)
+    while True:
+        chunk = fh.read(BITMAP_CHUNK_NUM * num_bytes)
+        if len(chunk) % num_bytes != 0:
+            raise ValidationError(f"Truncated bitmap, {len(chunk) % num_bytes} trailing byte(s)")
+        if len(chunk) == 0:
+            break
+        for off in range(0, len(chunk), num_bytes):
+            try:
+                target = next(targets)
+            except StopIteration:
+                raise ValidationError("More bitmaps than targets")
+            yield target, chunk[off:off + num_bytes]
+
+
+def load_meta(meta_file):
+    ''' Return (num_bytes, min_target, labels) from the metadata file
+    '''
+    with open(meta_file, "rt") as f:
+        num_labels, _, num_bytes, min_target, _ = map(int, f.readline().split())
+        labels = [f.readline().strip() for _ in range(num_labels)]
+    return num_bytes, min_target, labels
+
+
+class BitmapCodec:
+    ''' Convert between block lists and bitmaps, such that the reference can be
+    compared against bitmaps w/o decoding the latter.
+    '''
+    def __init__(self, labels, num_bytes):
+        self.blocks = [label_to_block(label) for label in labels]
+        self.block_index = {b: k for k, b in enumerate(self.blocks)}
+        self.num_bytes = num_bytes
+
+    def encode(self, blocks):
+        bitmap = 0
+        for b in blocks:
+            bitmap |= 1 << self.block_index[b]
+        return bitmap.to_bytes(self.num_bytes, "little")
+
+    def decode(self, bitmap):
+        bitmap = int.from_bytes(bitmap, "little")
+        return tuple(b for k, b in enumerate(self.blocks) if bitmap & (1 << k))
+
+
+def validate_resolution(ref, resolution, codec=None, targets=None, max_diffs=None, exit_first=False, fh=None):
+    ''' Walk the reference and the resolution in ascending target order.
+
+    Input:
+        ref (dict[int]iterable): target -> blocks
+        resolution (iterable): (target, blocks) where blocks is either a
+            sorted tuple or, if codec is not None, a bitmap
+        codec (BitmapCodec): the bitmap codec for the latter case
+        targets (iterable): the queried targets, in ascending order, default:
+            all the reference targets; a reference target which was not
+            queried is not checked
+        max_diffs (int): stop reporting after that many differences
+        exit_first (bool): stop at the first difference
+
+    Return:
+        dict: the number of checked, missing, unexpected and mismatched targets
+    '''
+    if fh is None:
+        fh = sys.stderr
+    counts = {"checked": 0, "missing": 0, "unexpected": 0, "mismatched": 0}
+    expected = iter(sorted(ref) if targets is None else targets)
+    next_expected = next(expected, None)
+    prev_target = None
+
+    def report(kind, msg):
+        counts[kind] += 1
+        diff_count = counts["missing"] + counts["unexpected"] + counts["mismatched"]
+        if max_diffs is None or diff_count <= max_diffs:
+            print(msg, file=fh)
+        elif diff_count == max_diffs + 1:
+            print("... (max diffs reached, further diffs not shown)", file=fh)
+        return exit_first
+
+    for target, blocks in resolution:
+        if prev_target is not None and target <= prev_target:
+            raise ValidationError(f"{target}: resolution not in ascending target order")
+        prev_target = target
+        counts["checked"] += 1
+        while next_expected is not None and next_expected < target:
+            if next_expected in ref and report("missing", f"{next_expected}: missing"):
+                return counts
+            next_expected = next(expected, None)
+        is_empty = not any(blocks)
+        is_expected = next_expected == target
+        if is_expected:
+            next_expected = next(expected, None)
+        if is_expected and target in ref:
+            if is_empty:
+                if report("missing", f"{target}: missing"):
+                    return counts
+                continue
+            ref_blocks = tuple(sorted(ref[target]))
+            if codec is not None:
+                if codec.encode(ref_blocks) == blocks:
+                    continue
+                # Decode only for the report:
+                blocks = tuple(sorted(codec.decode(blocks)))
+            elif ref_blocks == blocks:
+                continue
+            if report("mismatched", f"{target}:\n want: {ref_blocks}\n  got: {blocks}"):
+                return counts
+        elif not is_empty:
+            if report("unexpected", f"{target}: unexpected"):
+                return counts
+    while next_expected is not None:
+        if next_expected in ref and report("missing", f"{next_expected}: missing"):
+            break
+        next_expected = next(expected, None)
+    return counts
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-f", "--format",
+        choices=["auto", "json", "bin"],
+        default="auto",
+        help="""The resolution format, bin is the packed bitmaps from `-b'; auto
+            detects JSON by the leading `{', default: %(default)s""",
+    )
+    parser.add_argument(
+        "-m", "--meta-file",
+        help="Metadata file, required for bin format",
+    )
+    parser.add_argument(
+        "-s", "--start",
+        type=int,
+        help="""The first target for a resolution of consecutive targets,
+            default: MIN_TARGET from the metadata file for bin format; only
+            the --count targets from there are checked""",
+    )
+    parser.add_argument(
+        "-c", "--count",
+        type=int,
+        help="""The number of consecutive targets from --start, default: the
+            number of bitmaps for bin format, up to the last reference target
+            otherwise""",
+    )
+    parser.add_argument(
+        "-T", "--targets-file",
+        help="""The packed uint32 targets file used to generate the
+            resolution, the targets should be in ascending order; only these
+            targets are checked""",
+    )
+    parser.add_argument(
+        "-n", "--max-diffs",
+        type=int,
+        help="Stop reporting differences after that many",
+    )
+    parser.add_argument(
+        "-x", "--exit-first",
+        action="store_true",
+        help="Stop at the first difference",
+    )
     parser.add_argument("pkl_file")
-    parser.add_argument("res_json_file")
+    parser.add_argument("res_file")
     args = parser.parse_args()
 
     with open(args.pkl_file, 'rb') as f:
         ref = pickle.load(f)
 
-    with open(args.res_json_file, "rt") as f:
-        res = json.load(f)
-
-    norm_ref = normalize_reference(ref)
-    norm_res = normalize_result(res)
-
-    ref_targets = set(norm_ref)
-    res_targets = set(norm_res)
-
-    missing_targets = ref_targets - res_targets
-    if missing_targets:
-        print("Missing targets: ", sorted(missing_targets), file=sys.stderr)
-    unexpected_targets = res_targets - ref_targets
-    if unexpected_targets:
-        print("Unexpected targets: ", sorted(unexpected_targets), file=sys.stderr)
-    
-    for target in sorted(ref_targets.intersection(res_targets)):
-        ref_blocks = norm_ref[target]
-        res_blocks = norm_res[target]
-        if ref_blocks != res_blocks:
-            print(f"{target}:\n want: {ref_blocks}\n  got: {res_blocks}", file=sys.stderr)
+    res_format = args.format
+    if res_format == "auto":
+        with open(args.res_file, "rb") as f:
+            res_format = "json" if f.read(64).lstrip()[:1] == b"{" else "bin"
+    codec = None
+    # The queried targets, if not all of the reference, see validate_resolution:
+    targets, expected_fh = None, None
+    if args.targets_file is not None:
+        expected_fh = open(args.targets_file, "rb")
+        targets = iter_targets(expected_fh)
+    if res_format == "json":
+        res_fh = open(args.res_file, "rt", encoding="utf-8")
+        targets_fh = None
+        resolution = iter_json_blocks(res_fh)
+        if targets is None and args.start is not None:
+            count = args.count if args.count is not None else max(ref, default=args.start - 1) + 1 - args.start
+            targets = iter_targets(start=args.start, count=count)
+    else:
+        if args.meta_file is None:
+            print("Missing --meta-file for bin format", file=sys.stderr)
+            exit(2)
+        num_bytes, min_target, labels = load_meta(args.meta_file)
+        codec = BitmapCodec(labels, num_bytes)
+        res_fh = open(args.res_file, "rb")
+        targets_fh = open(args.targets_file, "rb") if args.targets_file is not None else None
+        start = args.start if args.start is not None else min_target
+        resolution = iter_bitmap_resolution(res_fh, num_bytes, iter_targets(targets_fh, start))
+        if targets is None and (args.start is not None or args.count is not None):
+            count = args.count if args.count is not None else os.path.getsize(args.res_file) // num_bytes
+            targets = iter_targets(start=start, count=count)
 
+    try:
+        counts = validate_resolution(
+            ref,
+            resolution,
+            codec=codec,
+            targets=targets,
+            max_diffs=args.max_diffs,
+            exit_first=args.exit_first,
+        )
+    except ValidationError as e:
+        print(f"{args.res_file}: {e}", file=sys.stderr)
+        exit(2)
+    finally:
+        res_fh.close()
+        for fh in [targets_fh, expected_fh]:
+            if fh is not None:
+                fh.close()
 
+    print(
+        ", ".join(f"{kind}: {count}" for kind, count in counts.items()),
+        file=sys.stderr,
+    )
+    if counts["missing"] + counts["unexpected"] + counts["mismatched"] > 0:
+        exit(1)
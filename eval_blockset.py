@@ -0,0 +1,132 @@
+#! /usr/bin/env python3
+
+''' Evaluate a blockset design and its variants adding or removing a block, see
+algo/design.py
+'''
+
+import argparse
+import json
+import time
+
+from tabulate import tabulate
+
+from algo.blockset import load_blockset
+from algo.design import (
+    build_reach,
+    default_heights,
+    evaluate,
+    iter_add_variants,
+    iter_removal_variants,
+)
+
+sort_keys = {
+    "avg_min_len": lambda row: (row["avg_min_len"] is None, row["avg_min_len"]),
+    "reachable": lambda row: -row["reachable"],
+}
+
+
+def parse_ints(text):
+    return [int(val) for val in text.split(",") if val]
+
+
+def generate_table(rows, tablefmt="pretty"):
+    heights = [per_height["max_height"] for per_height in rows[0]["heights"]] if rows else []
+    headers = (
+        ["Variant"]
+        + [f"Reach <={h}" for h in heights]
+        + ["Ranges", "Longest range", "Reachable", "Avg min len", "Max min len"]
+    )
+    table = []
+    for row in rows:
+        last = row["heights"][-1] if row["heights"] else {}
+        longest_range = last.get("longest_range")
+        table.append(
+            [row["variant"]]
+            + [per_height["reachable"] for per_height in row["heights"]]
+            + [
+                last.get("ranges"),
+                f"{longest_range[0]}-{longest_range[1]}" if longest_range is not None else None,
+                row["reachable"],
+                f"{row['avg_min_len']:.3f}" if row["avg_min_len"] is not None else None,
+                row["max_min_len"],
+            ]
+        )
+    colalign = ["left"] + ["right"] * (len(headers) - 1)
+    return tabulate(table, headers=headers, colalign=colalign, tablefmt=tablefmt)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-B", "--blockset",
+        help="""The blockset, blockset_81 or a definition file, see
+            algo/blockset.py, default: blockset_81""",
+    )
+    parser.add_argument(
+        "-H", "--heights",
+        default=",".join(map(str, default_heights)),
+        help="The max stack heights, in blocks, comma separated, default: %(default)s",
+    )
+    parser.add_argument(
+        "-m", "--max-len",
+        type=int,
+        help="The max stack length accounted for, default: the number of blocks",
+    )
+    parser.add_argument(
+        "-w", "--window",
+        help="Restrict the metrics to the MIN:MAX targets, default: all",
+    )
+    parser.add_argument(
+        "-a", "--add",
+        default="",
+        help="The candidate blocks to add, one variant each, comma separated",
+    )
+    parser.add_argument(
+        "-r", "--remove",
+        default="",
+        help="""The blocks to remove, one variant each, comma separated, or
+            all for each block of the blockset""",
+    )
+    parser.add_argument(
+        "-s", "--sort-by",
+        choices=sorted(sort_keys),
+        help="Sort the variants, the base design first, default: as given",
+    )
+    parser.add_argument(
+        "-j", "--json",
+        action="store_true",
+        help="Show the metrics as JSON",
+    )
+    args = parser.parse_args()
+
+    blockset = load_blockset(args.blockset)
+    heights = parse_ints(args.heights)
+    window = tuple(parse_ints(args.window.replace(":", ","))) if args.window is not None else None
+    max_len = args.max_len if args.max_len is not None else len(blockset)
+    removed = None if args.remove == "all" else set(parse_ints(args.remove))
+    if removed is not None:
+        unknown_blocks = sorted(removed.difference(blockset.blocks))
+        if unknown_blocks:
+            parser.error(f"{unknown_blocks}: not in {blockset.key}")
+
+    start = time.time()
+    base = build_reach(blockset.blocks, max_len=max_len)
+    variants = [("base", base)]
+    variants.extend((f"+{block}", reach) for block, reach in iter_add_variants(base, parse_ints(args.add)))
+    if args.remove:
+        variants.extend(
+            (f"-{block}", reach) for block, reach in iter_removal_variants(blockset.blocks, max_len=max_len)
+            if removed is None or block in removed
+        )
+    rows = [
+        {"variant": name, **evaluate(reach, heights=heights, window=window)} for name, reach in variants
+    ]
+    if args.sort_by is not None:
+        rows[1:] = sorted(rows[1:], key=sort_keys[args.sort_by])
+    sec = time.time() - start
+
+    if args.json:
+        print(json.dumps({"blockset": blockset.key, "max_len": max_len, "variants": rows, "sec": sec}, indent=2))
+    else:
+        print(f"{blockset.key}, max_len={max_len}, {len(rows)} design(s) in {sec:.3f} sec")
+        print(generate_table(rows))
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 
 import argparse
+import json
+import os
 import pickle
 import sys
 
@@ -12,11 +14,18 @@ from algo import (
     greedy,
 )
 
+from algo.chain import ResolverChain, default_cache_size
+from algo.combo import default_combo_pkl_file, default_work_dir
+from algo.profiling import make_profile_dir, profile_file, start_profile, stop_profile, write_report
+from algo.store import default_store_dir
+from algo.table import open_table
 from algo.validator import validate, normalize_blocks
 
 resolvers = {
     "gofai": gofai.resolve,
     "greedy": greedy.resolve,
+    # Built from the command line args, see below:
+    "chain": None,
 }
 
 def test_range(start, end, resolver):
@@ -44,6 +53,18 @@ if __name__ == '__main__':
         default="gofai",
         help="Select an algorithm, default: %(default)r",
     )
+    parser.add_argument(
+        "-t", "--table",
+        help="""chain: the result table, either a pickle file, a .bmp file or a
+            combo store directory, default: the combo store if any, combo.pkl
+            otherwise""",
+    )
+    parser.add_argument(
+        "-c", "--cache-size",
+        default=default_cache_size,
+        type=int,
+        help="chain: the max number of cached fallback resolutions, default: %(default)d",
+    )
     parser.add_argument(
         "-i", "--interactive",
         action="store_true",
@@ -53,18 +74,37 @@ if __name__ == '__main__':
         "-p", "--pickle-file",
         help="Generate pickle file w/ the valid combinations"
     )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const=default_work_dir,
+        metavar="DIR",
+        help="""Profile the run w/ cProfile into a new profile-* directory under
+            DIR, default: %(const)s, and write the hot-spot report into it and
+            to stderr""",
+    )
     parser.add_argument(
         "-s", "--start",
         default=min_target,
+        type=int,
         help="range start (inclusive), default: %(default)s",
     )
     parser.add_argument(
         "-e", "--end",
         default=max_target,
+        type=int,
         help="range end (inclusive), default: %(default)s",
     )
 
     args = parser.parse_args()
+    profiler = start_profile() if args.profile is not None else None
+    chain = None
+    if args.algo == "chain":
+        table = args.table
+        if table is None:
+            table = default_store_dir if os.path.isdir(default_store_dir) else default_combo_pkl_file
+        chain = ResolverChain(table=open_table(table), cache_size=args.cache_size)
+        resolvers["chain"] = chain
     resolver = resolvers[args.algo]
 
     start = max(args.start, min_target)
@@ -74,7 +114,11 @@ if __name__ == '__main__':
         loop = True
         while loop:
             try:
-                target = int(input('target> '))
+                line = input('target> ').strip()
+                if line == "stats" and chain is not None:
+                    print(json.dumps(chain.stats(), indent=2))
+                    continue
+                target = int(line)
                 blocks = resolver(target)
                 if validate(blocks, target):
                     print(f"{blocks} -> {sum(blocks)}")
@@ -97,3 +141,9 @@ if __name__ == '__main__':
             if range[1] - range[0] > longest_range[1] - longest_range[0]:
                 longest_range = range
         print(f"[{start}, {end-1}]: ok={ok}, longest_range={longest_range}")
+    if chain is not None:
+        print(json.dumps(chain.stats()), file=sys.stderr)
+    if profiler is not None:
+        profile_dir = make_profile_dir(args.profile)
+        stop_profile(profiler, profile_file(profile_dir, "main", args.algo))
+        print(write_report(profile_dir), file=sys.stderr)
@@ -8,36 +8,73 @@ import os
 import pickle
 import sys
 
-from algo import blockset_81
+from algo.blockset import artifact_path, default_blockset, load_blockset
+
+
+def write_bitmap_file(target_to_blocks, targets, label_index_map, num_bytes, fh, has_duplicates=False):
+    ''' Write one bitmap of num_bytes for each target in targets[0] ..
+    targets[-1], w/ zeros for the unresolved ones; targets should be sorted.
+    Return the number of bytes written.
+
+    A block available more than once maps to its first index and its copies
+    use the next ones, see Blockset.label_index_map; has_duplicates enables
+    the probing for them.
+    '''
+    zeromap = bytes([0] * num_bytes)
+    n_bytes = 0
+    prev_target = targets[0]
+    for target in targets:
+        for _ in range(prev_target+1, target):
+            n_bytes += fh.write(zeromap)
+        bitmap = bytearray(num_bytes)
+        for block in target_to_blocks[target]:
+            index = label_index_map[block]
+            if has_duplicates:
+                while bitmap[index >> 3] & (1 << (index & 7)):
+                    index += 1
+            bitmap[index >> 3] |= 1 << (index & 7)
+        n_bytes += fh.write(bitmap)
+        prev_target = target
+    return n_bytes
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "-m", "--meta-file",
-        help="""Metdata file, default: blockset_81.meta, under the same location
+        help="""Metdata file, default: NAME.meta, under the same location
              as the .bmp.""",
     )  
     parser.add_argument(
         "-o", "--bitmap-file",
-        default="blockset_81.bmp",
-        help="Bitmap file, default: %(default)s",
+        help="""Bitmap file, default: blockset_81.bmp, or NAME.bmp in the
+             artifact cache of the --blockset""",
+    )
+    parser.add_argument(
+        "-B", "--blockset",
+        help="""The blockset, blockset_81 or a definition file, see
+             algo/blockset.py, default: blockset_81""",
     )
     parser.add_argument("pkl_file")
     args = parser.parse_args()
 
+    blockset = load_blockset(args.blockset)
     bitmap_file = args.bitmap_file
+    if bitmap_file is None:
+        bitmap_file = (
+            f"{blockset.name}.bmp" if blockset == default_blockset
+            else artifact_path(blockset, f"{blockset.name}.bmp")
+        )
     meta_file = args.meta_file
     if meta_file is None:
-        meta_file = os.path.join(os.path.dirname(bitmap_file), "blockset_81.meta")
+        meta_file = os.path.join(os.path.dirname(bitmap_file), f"{blockset.name}.meta")
 
-    # Ensure that the blockset is sorted, build the value -> index map, and the
-    # label list:
-    blockset_81 = sorted(blockset_81)
-    labels = [f"{b/10000:.04f}" for b in blockset_81]
+    # The blockset is sorted, build the value -> index map, and the label list:
+    labels = blockset.labels()
     max_label_sz = max(len(label) for label in labels)
-    label_index_map = {b: i for i, b in enumerate(blockset_81)}
+    label_index_map = blockset.label_index_map()
     # Find the necessary size of the bitmap in bytes:
-    num_bytes = (len(blockset_81) + 7) // 8
+    num_bytes = (len(blockset) + 7) // 8
 
     # Load pickle file and check its min target:
     with open(args.pkl_file, 'rb') as f:
@@ -49,22 +86,14 @@ if __name__ == '__main__':
     min_target, max_target = targets[0], targets[-1]
 
     # Convert pickle to bitmap file:
-    zeromap = bytes([0] * num_bytes)
-    n_bytes = 0
     with open(bitmap_file, 'wb') as f:
-        prev_target = min_target
-        for target in targets:
-            for _ in range(prev_target+1, target):
-                n_bytes += f.write(zeromap)
-            bitmap = bytearray(num_bytes)
-            for block in target_to_blocks[target]:
-                index = label_index_map[block]
-                bitmap[index >> 3] |= 1 << (index & 7)
-            n_bytes += f.write(bitmap)
-            prev_target = target
+        n_bytes = write_bitmap_file(
+            target_to_blocks, targets, label_index_map, num_bytes, f,
+            has_duplicates=blockset.has_duplicates,
+        )
     # Generate metadata file:
     with open(meta_file, "wt") as f:
-        print(len(blockset_81), max_label_sz, num_bytes, min_target, max_target, file=f)
+        print(len(blockset), max_label_sz, num_bytes, min_target, max_target, file=f)
         for label in labels:
             print(label, file=f)
 
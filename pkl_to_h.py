@@ -9,6 +9,7 @@ import sys
 import zlib
 
 from algo import blockset_81
+from algo.blockset import artifact_path, default_blockset, load_blockset
 
 details = '''
 /* 
@@ -205,11 +206,13 @@ const uint8_t {var_name}[] {storage} = {{ \\
         end='', sep='', file=fh,
     )
 
-def print_ranges(ranges, fh=None, var_name=RANGES_VAR_NAME, storage=STORAGE_MACRO):
+def print_ranges(
+    ranges, fh=None, var_name=RANGES_VAR_NAME, storage=STORAGE_MACRO,
+    bitmap_num_bits=len(blockset_81),
+):
     if fh is None:
         fh = sys.stdout
 
-    bitmap_num_bits = len(blockset_81) 
     print(
 f'''
 #define MIN_TARGET (uint32_t){ranges[0][0]}
@@ -255,13 +258,55 @@ f'''
     )
 
 
+def get_target_ranges(targets):
+    ''' Return the list of (start, end) contiguous ranges for sorted targets
+    '''
+    target_ranges = []
+    range_start, range_end = targets[0], targets[0]
+    for target in targets[1:]:
+        if target != range_end + 1:
+            target_ranges.append((range_start, range_end))
+            range_start = target
+        range_end = target
+    target_ranges.append((range_start, range_end))
+    return target_ranges
+
+
+def build_bitmaps(target_to_blocks, target_ranges, label_index_map, bitmap_num_bits, has_duplicates=False):
+    ''' Return the concatenated bitmaps for all the targets in target_ranges
+
+    The copies of a block use the indexes following its mapped one, see
+    Blockset.label_index_map; has_duplicates enables the probing for them.
+    '''
+    bitmap_num_bits_total = 0
+    for range_start, range_end in target_ranges:
+        bitmap_num_bits_total += (range_end - range_start + 1) * bitmap_num_bits
+    buf = bytearray((bitmap_num_bits_total + 7) >> 3)
+    range_bit_off_base = 0
+    for range_start, range_end in target_ranges:
+        for target in range(range_start, range_end + 1):
+            bit_off_base = range_bit_off_base + (target - range_start) * bitmap_num_bits
+            for block in target_to_blocks[target]:
+                bit_off = bit_off_base + label_index_map[block]
+                if has_duplicates:
+                    while buf[bit_off >> 3] & (1 << (bit_off & 7)):
+                        bit_off += 1
+                buf[bit_off >> 3] |= (1 << (bit_off & 7))
+        range_bit_off_base += (range_end - range_start + 1) * bitmap_num_bits
+    return buf
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "-o", "--out-file",
-        default="bitmap.h",
-        help="Bitmap header file, default: %(default)s",
+        help="""Bitmap header file, default: bitmap.h, or NAME.h in the artifact
+            cache of the --blockset""",
+    )
+    parser.add_argument(
+        "-B", "--blockset",
+        help="""The blockset, blockset_81 or a definition file, see
+            algo/blockset.py, default: blockset_81""",
     )
     parser.add_argument(
         "-z", "--zlib-compress",
@@ -272,15 +317,19 @@ if __name__ == '__main__':
     parser.add_argument("pkl_file")
     args = parser.parse_args()
 
+    blockset = load_blockset(args.blockset)
     out_file = args.out_file
+    if out_file is None:
+        out_file = (
+            "bitmap.h" if blockset == default_blockset
+            else artifact_path(blockset, f"{blockset.name}.h")
+        )
     if out_file == "-":
         out_file = None
 
-    # Ensure that the blockset is sorted, build the value -> index map, and the
-    # label list:
-    blockset_81 = sorted(blockset_81)
-    labels = [f"{b/10000:.04f}" for b in blockset_81]
-    label_index_map = {b: i for i, b in enumerate(blockset_81)}
+    # The blockset is sorted, build the value -> index map, and the label list:
+    labels = blockset.labels()
+    label_index_map = blockset.label_index_map()
 
 
     # Load pickle file and check its min target:
@@ -293,29 +342,14 @@ if __name__ == '__main__':
 
     # Determine target ranges:
     min_target, max_target = targets[0], targets[-1]
-    target_ranges = []
-    range_start, range_end = min_target, min_target
-    for target in targets[1:]:
-        if target != range_end + 1:
-            target_ranges.append((range_start, range_end))
-            range_start = target
-        range_end = target
-    target_ranges.append((range_start, range_end))
+    target_ranges = get_target_ranges(targets)
 
     # Build the bitmaps:
-    bitmap_num_bits = len(blockset_81)
-    bitmap_num_bits_total = 0
-    for range_start, range_end in target_ranges:
-        bitmap_num_bits_total += (range_end - range_start + 1) * bitmap_num_bits
-    buf = bytearray((bitmap_num_bits_total + 7) >> 3)
-    range_bit_off_base = 0
-    for range_start, range_end in target_ranges:
-        for target in range(range_start, range_end + 1):
-            bit_off_base = range_bit_off_base + (target - range_start) * bitmap_num_bits
-            for block in target_to_blocks[target]:
-                bit_off = bit_off_base + label_index_map[block]
-                buf[bit_off >> 3] |= (1 << (bit_off & 7))
-        range_bit_off_base += (range_end - range_start + 1) * bitmap_num_bits
+    bitmap_num_bits = len(blockset)
+    buf = build_bitmaps(
+        target_to_blocks, target_ranges, label_index_map, bitmap_num_bits,
+        has_duplicates=blockset.has_duplicates,
+    )
     
     if args.zlib_compress:
         raw_sz = len(buf)
@@ -331,7 +365,7 @@ if __name__ == '__main__':
     print_labels(labels, fh=fh)
     bitmaps_var_name = BITMAPS_VAR_NAME
     print_bitmaps(buf, fh=fh, is_compressed=args.zlib_compress)
-    print_ranges(target_ranges, fh=fh)
+    print_ranges(target_ranges, fh=fh, bitmap_num_bits=bitmap_num_bits)
 
     # Estimate storage requirement:
     bitmap_storage_bytes = len(buf)
@@ -0,0 +1,148 @@
+#! /usr/bin/env python3
+
+''' Serve stack resolutions over TCP or a unix socket, or generate load against
+such a server, see algo/service.py for the protocol.
+'''
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+
+from algo import gofai, greedy
+from algo.service import (
+    ResolutionService,
+    default_max_batch,
+    default_max_delay,
+    run_load,
+    serve,
+)
+from algo.table import open_table
+
+fallbacks = {
+    "gofai": gofai.resolve,
+    "greedy": greedy.resolve,
+    "none": None,
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-t", "--table",
+        help="Result table, either a pickle file, e.g. best.pkl, a .bmp file or a combo store directory, e.g. combo.d",
+    )
+    parser.add_argument(
+        "-m", "--meta-file",
+        help="Metadata file for .bmp table, default: the .bmp file w/ .meta extension",
+    )
+    parser.add_argument(
+        "-f", "--fallback",
+        choices=fallbacks,
+        default="gofai",
+        help="Fallback resolver for targets not in the table, default: %(default)s",
+    )
+    parser.add_argument(
+        "-H", "--host",
+        default="127.0.0.1",
+        help="Listen/connect host, default: %(default)s",
+    )
+    parser.add_argument(
+        "-p", "--port",
+        default=8481,
+        type=int,
+        help="Listen/connect port, default: %(default)d",
+    )
+    parser.add_argument(
+        "-u", "--unix-socket",
+        help="Listen/connect on unix socket instead of TCP",
+    )
+    parser.add_argument(
+        "--max-batch",
+        default=default_max_batch,
+        type=int,
+        help="Max targets per lookup batch, default: %(default)d",
+    )
+    parser.add_argument(
+        "--max-delay",
+        default=default_max_delay,
+        type=float,
+        help="Max wait, in seconds, for more requests before a batch, default: %(default)s",
+    )
+    parser.add_argument(
+        "--stats-interval",
+        type=float,
+        help="Log the service stats every that many seconds",
+    )
+    parser.add_argument(
+        "-l", "--load",
+        action="store_true",
+        help="Generate load against a running server instead of serving",
+    )
+    parser.add_argument(
+        "-c", "--connections",
+        default=8,
+        type=int,
+        help="Load: the number of connections, default: %(default)d",
+    )
+    parser.add_argument(
+        "-N", "--num-requests",
+        default=100000,
+        type=int,
+        help="Load: the total number of requests, default: %(default)d",
+    )
+    parser.add_argument(
+        "-d", "--pipeline-depth",
+        default=16,
+        type=int,
+        help="Load: max outstanding requests per connection, default: %(default)d",
+    )
+    parser.add_argument(
+        "-s", "--start",
+        type=int,
+        help="Load: random targets range start (inclusive), default: min_target",
+    )
+    parser.add_argument(
+        "-e", "--end",
+        type=int,
+        help="Load: random targets range end (inclusive), default: max_target",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        level=logging.INFO,
+    )
+
+    if args.load:
+        result = asyncio.run(run_load(
+            host=args.host,
+            port=args.port,
+            unix_path=args.unix_socket,
+            num_connections=args.connections,
+            num_requests=args.num_requests,
+            pipeline_depth=args.pipeline_depth,
+            start=args.start,
+            end=args.end,
+        ))
+        print(json.dumps(result, indent=2))
+        sys.exit(1 if result["errors"] else 0)
+
+    table = open_table(args.table, meta_file=args.meta_file) if args.table else None
+    service = ResolutionService(
+        table=table,
+        fallback=fallbacks[args.fallback],
+        fallback_name=args.fallback,
+        max_batch=args.max_batch,
+        max_delay=args.max_delay,
+    )
+    try:
+        asyncio.run(serve(
+            service,
+            host=args.host,
+            port=args.port,
+            unix_path=args.unix_socket,
+            stats_interval=args.stats_interval,
+        ))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,61 @@
+#! /usr/bin/env python3
+
+''' Shorten the resolutions of a pickle file, e.g. gofai.pkl or greedy.pkl, see
+algo/shorten.py
+'''
+
+import argparse
+import json
+import pickle
+import sys
+import time
+
+from algo.shorten import default_max_k, default_time_budget, shorten_table
+from algo.validator import validate
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-o", "--out-file",
+        default="short.pkl",
+        help="Output file, default: %(default)s",
+    )
+    parser.add_argument(
+        "-k", "--max-k",
+        default=default_max_k,
+        type=int,
+        help="The max number of blocks replaced at once, default: %(default)d",
+    )
+    parser.add_argument(
+        "-b", "--time-budget",
+        default=default_time_budget,
+        type=float,
+        help="The max time per target, in seconds, 0 for no limit, default: %(default)s",
+    )
+    parser.add_argument(
+        "-m", "--min-len",
+        type=int,
+        help="""Only shorten the resolutions longer than this, e.g. the max
+            length in combo.pkl, whose resolutions are minimal already""",
+    )
+    parser.add_argument("pkl_file")
+    args = parser.parse_args()
+
+    with open(args.pkl_file, 'rb') as f:
+        target_to_blocks = pickle.load(f)
+
+    start = time.time()
+    shortened, stats = shorten_table(
+        target_to_blocks,
+        max_k=args.max_k,
+        time_budget=args.time_budget or None,
+        min_len=args.min_len,
+    )
+    stats["sec"] = time.time() - start
+
+    ok = all(validate(blocks, target) for target, blocks in shortened.items())
+    with open(args.out_file, 'wb') as f:
+        pickle.dump(shortened, f)
+    print(json.dumps(stats), file=sys.stderr)
+    if not ok:
+        sys.exit(1)
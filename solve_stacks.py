@@ -0,0 +1,77 @@
+#! /usr/bin/env python3
+
+''' Resolve several simultaneous stacks from one blockset, w/o shared blocks,
+see algo/multi.py
+'''
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from algo.blockset import load_blockset
+from algo.multi import MultiStackSolver, default_time_budget
+from algo.unavailable import alternatives_file_for, block_mask, load_alternatives
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-B", "--blockset",
+        help="""The blockset, blockset_81 or a definition file, see
+            algo/blockset.py, default: blockset_81""",
+    )
+    parser.add_argument(
+        "-a", "--alternatives-file",
+        help="""The alternatives index, see build_alternatives.py, default:
+            alternatives.pkl in the artifact cache of the --blockset, if any,
+            search only otherwise, in which case "optimal" is seldom true,
+            see algo/multi.py""",
+    )
+    parser.add_argument(
+        "-x", "--unavailable",
+        default="",
+        help="The unavailable blocks, comma separated, e.g. 1005,40000",
+    )
+    parser.add_argument(
+        "-b", "--time-budget",
+        default=default_time_budget,
+        type=float,
+        help="The max time, in seconds, default: %(default)s",
+    )
+    parser.add_argument("targets", nargs="+", type=int)
+    args = parser.parse_args()
+
+    blockset = load_blockset(args.blockset)
+    if blockset.has_duplicates:
+        parser.error(f"{blockset.key}: blocksets w/ duplicates are not supported")
+    alternatives_file = args.alternatives_file
+    if alternatives_file is None:
+        alternatives_file = alternatives_file_for(blockset)
+    alternatives = None
+    if os.path.isfile(alternatives_file):
+        try:
+            alternatives = load_alternatives(alternatives_file, blockset=blockset)
+        except ValueError as e:
+            parser.error(str(e))
+    else:
+        print(f"{alternatives_file}: no alternatives index, search only", file=sys.stderr)
+    unavailable_blocks = [int(b) for b in args.unavailable.split(",") if b]
+    unknown_blocks = [b for b in unavailable_blocks if b not in blockset]
+    if unknown_blocks:
+        parser.error(f"{unknown_blocks}: not in {blockset.key}")
+    unavailable = block_mask(unavailable_blocks, blockset=blockset)
+
+    solver = MultiStackSolver(alternatives, time_budget=args.time_budget, blockset=blockset)
+    start = time.perf_counter()
+    resolutions, optimal = solver.solve(args.targets, unavailable=unavailable)
+    sec = time.perf_counter() - start
+    print(json.dumps({
+        "targets": args.targets,
+        "resolutions": resolutions,
+        "total": sum(map(len, resolutions)) if resolutions is not None else None,
+        "optimal": optimal,
+        "sec": sec,
+    }))
+    if resolutions is None:
+        sys.exit(1)
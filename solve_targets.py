@@ -0,0 +1,103 @@
+#! /usr/bin/env python3
+
+''' Solve a range of targets w/ the branch-and-bound solver, see algo/bnb.py,
+over a process pool, e.g. the targets beyond the reach of combo.pkl
+'''
+
+import argparse
+import json
+import os
+import pickle
+import sys
+import time
+
+from algo import min_target, max_target
+from algo.bnb import default_time_budget, solve_many
+from algo.combo import default_combo_pkl_file
+from algo.store import default_store_dir
+from algo.table import open_table
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-o", "--out-file",
+        default="bnb.pkl",
+        help="Output file, default: %(default)s",
+    )
+    parser.add_argument(
+        "-u", "--unproven-file",
+        help="Write the targets w/o a proven optimal resolution into this file, one per line",
+    )
+    parser.add_argument(
+        "-t", "--table",
+        help="""Skip the targets in this table, either a pickle file, a .bmp file
+            or a combo store directory, default: the combo store if any,
+            combo.pkl otherwise""",
+    )
+    parser.add_argument(
+        "-a", "--all",
+        action="store_true",
+        help="Solve all the targets in the range, i.e. do not skip the table ones",
+    )
+    parser.add_argument(
+        "-n", "--n-parallel",
+        default=max(os.cpu_count() - 1, 1),
+        type=int,
+        help="The number of worker processes, default: %(default)d (#cores - 1)",
+    )
+    parser.add_argument(
+        "-b", "--time-budget",
+        default=default_time_budget,
+        type=float,
+        help="The max time per target, in seconds, 0 for no limit, default: %(default)s",
+    )
+    parser.add_argument(
+        "-s", "--start",
+        default=min_target,
+        type=int,
+        help="range start (inclusive), default: %(default)s",
+    )
+    parser.add_argument(
+        "-e", "--end",
+        default=max_target,
+        type=int,
+        help="range end (inclusive), default: %(default)s",
+    )
+    args = parser.parse_args()
+
+    targets = range(max(args.start, min_target), min(args.end, max_target) + 1)
+    if not args.all:
+        table_path = args.table
+        if table_path is None:
+            table_path = default_store_dir if os.path.isdir(default_store_dir) else default_combo_pkl_file
+        table = open_table(table_path)
+        targets = [target for target in targets if table.get(target) is None]
+        table.close()
+
+    target_to_blocks = {}
+    unproven = []
+    stats = {"targets": len(targets), "optimal": 0, "unproven": 0, "unresolved": 0}
+    start = time.time()
+    for i, (target, blocks, optimal, sec) in enumerate(
+            solve_many(targets, time_budget=args.time_budget or None, n_parallel=args.n_parallel)
+    ):
+        if blocks is not None:
+            target_to_blocks[target] = blocks
+        else:
+            stats["unresolved"] += 1
+        if optimal:
+            stats["optimal"] += 1
+        else:
+            stats["unproven"] += 1
+            unproven.append(target)
+        if (i + 1) % 1000 == 0:
+            print(f"{i + 1}/{len(targets)} targets in {time.time() - start:.0f} sec", file=sys.stderr)
+    stats["sec"] = time.time() - start
+
+    with open(args.out_file, 'wb') as f:
+        pickle.dump(target_to_blocks, f)
+    if args.unproven_file is not None:
+        with open(args.unproven_file, 'wt') as f:
+            for target in sorted(unproven):
+                print(target, file=f)
+    print(json.dumps(stats), file=sys.stderr)
@@ -1,11 +1,33 @@
 #! /usr/bin/env python3
 
 import argparse
+import json
 import os
 import sys
 import time
 
-from algo.combo import default_work_dir, update_combo_pkl_file
+from algo.blockset import default_blockset, load_blockset
+from algo.combo import (
+    default_combo_pkl_file,
+    default_walker,
+    default_work_dir,
+    load_combos,
+    update_combo_store,
+    walkers,
+)
+from algo.distributed import (
+    Coordinator,
+    authkey_env,
+    default_lease_timeout,
+    fork_workers,
+    get_authkey,
+    parse_address,
+    wait_workers,
+)
+from algo.plan import format_plan, plan_combos
+from algo.profiling import make_profile_dir, profile_file, run_profiled, write_report
+from algo.progress import ProgressTracker, default_status_file, format_status, read_status_file
+from algo.store import ComboStore, default_store_dir, store_dir_for
 
 parser = argparse.ArgumentParser()
 parser.add_argument(
@@ -17,16 +39,157 @@ parser.add_argument(
     "-n", "--n-parallel",
     default=max(os.cpu_count() - 1, 1),
     type=int,
-    help="The degree of parallelism, default: %(default)d (#cores - 1)"
+    help="""The degree of parallelism, default: %(default)d (#cores - 1); the max
+        one, lowered as needed for the free memory, unless --fixed-parallel"""
+)
+parser.add_argument(
+    "-F", "--fixed-parallel",
+    action="store_true",
+    help="Keep the degree of parallelism fixed, regardless of the free memory",
+)
+parser.add_argument(
+    "-m", "--min-free-mem",
+    type=int,
+    help="The memory to keep free, in MiB, default: 10%% of the total memory",
+)
+parser.add_argument(
+    "-w", "--walker",
+    choices=walkers,
+    default=default_walker,
+    help="The combination walker, default: %(default)s",
+)
+parser.add_argument(
+    "-B", "--blockset",
+    help="""The blockset, blockset_81 or a definition file, see algo/blockset.py,
+        default: blockset_81""",
+)
+parser.add_argument(
+    "-d", "--store-dir",
+    help=f"""The combo store, w/ a segment per length, default: {os.path.basename(default_store_dir)},
+        if missing, created from {os.path.basename(default_combo_pkl_file)}, for
+        blockset_81, or combo.d in the artifact cache of the --blockset""",
+)
+parser.add_argument(
+    "-o", "--export-pkl-file",
+    help="""Also write all the combos into this single pickle file, e.g.
+        combo.pkl, for the tools reading it""",
+)
+parser.add_argument(
+    "--coordinator",
+    metavar="HOST:PORT",
+    help=f"""Listen on HOST:PORT and hand out the tasks of the lengths beyond
+        the parallel cutoff to the workers connecting to it, see --worker;
+        the shared authentication key is taken from ${authkey_env}""",
+)
+parser.add_argument(
+    "--worker",
+    metavar="HOST:PORT",
+    help="""Run --n-parallel worker processes for the coordinator at HOST:PORT,
+        until it is done, and exit""",
+)
+parser.add_argument(
+    "--local-workers",
+    default=0,
+    type=int,
+    help="The number of worker processes to run along w/ the --coordinator, default: %(default)d",
+)
+parser.add_argument(
+    "--lease-timeout",
+    default=default_lease_timeout,
+    type=float,
+    help="""The max time, in seconds, for a worker to return the result of a
+        task before the task is handed out again, default: %(default)s""",
+)
+parser.add_argument(
+    "-T", "--time-budget",
+    type=float,
+    help="""The max run time, in seconds, default: none; the prefixes are then
+        run by decreasing expected new targets per CPU-second and the length in
+        progress when the time is up is stored partially, marked incomplete,
+        to be regenerated by the next run""",
+)
+parser.add_argument(
+    "--profile",
+    nargs="?",
+    const=default_work_dir,
+    metavar="DIR",
+    help="""Profile the parent and each worker w/ cProfile into a new profile-*
+        directory under DIR, default: %(const)s, and write the merged hot-spot
+        report, per length, into it and to stderr""",
+)
+parser.add_argument(
+    "-s", "--status",
+    action="store_true",
+    help="Show the status of the current, or last, run and exit",
+)
+parser.add_argument(
+    "-P", "--plan",
+    action="store_true",
+    help="""Dry run: estimate the wall time, the memory and the new targets per
+        length, based on a timed sample, and exit""",
+)
+parser.add_argument(
+    "-j", "--json",
+    action="store_true",
+    help="Show the status or the plan as JSON",
+)
+parser.add_argument(
+    "--status-file",
+    default=default_status_file,
+    help="The status file, atomically replaced on progress, default: %(default)s",
+)
+parser.add_argument(
+    "-p", "--progress-file",
+    help="""Write the progress events as JSON lines into this file, default: none,
+        or next to the .out file for --bg""",
 )
 parser.add_argument(
     "n",
+    nargs="?",
     type=int,
     help="Combination length"
 )
 
 args = parser.parse_args()
 
+if args.status:
+    try:
+        status = read_status_file(args.status_file)
+    except FileNotFoundError:
+        print(f"{args.status_file}: no status", file=sys.stderr)
+        exit(1)
+    if args.json:
+        print(json.dumps(status, indent=2))
+    else:
+        print(format_status(status))
+    exit(0)
+
+if args.worker is not None:
+    profile_dir = make_profile_dir(args.profile) if args.profile is not None else None
+    pids = fork_workers(parse_address(args.worker), get_authkey(), args.n_parallel, profile_dir=profile_dir)
+    failed = wait_workers(pids)
+    if profile_dir is not None:
+        print(write_report(profile_dir), file=sys.stderr)
+    exit(1 if failed else 0)
+
+if args.n is None:
+    parser.error("the combination length is required")
+
+blockset = load_blockset(args.blockset)
+if args.store_dir is None:
+    args.store_dir = store_dir_for(blockset)
+
+if args.plan:
+    if blockset != default_blockset:
+        parser.error("--plan supports only blockset_81")
+    all_combos, prev_max_len = load_combos(args.store_dir)
+    plan = plan_combos(prev_max_len + 1, args.n, all_combos, n_parallel=args.n_parallel)
+    if args.json:
+        print(json.dumps(plan, indent=2))
+    else:
+        print(format_plan(plan, args.n_parallel))
+    exit(0)
+
 if args.bg:
     os.makedirs(default_work_dir, exist_ok=True)
     out_file_root = (
@@ -37,6 +200,8 @@ if args.bg:
     pid_file = os.path.join(default_work_dir, out_file_root + ".pid")
     stdout_file = os.path.join(default_work_dir, out_file_root + ".out")
     stderr_file = os.path.join(default_work_dir, out_file_root + ".err")
+    if args.progress_file is None:
+        args.progress_file = os.path.join(default_work_dir, out_file_root + ".progress.jsonl")
     pid = os.fork()
     if  pid > 0:
         with open(pid_file, "wt") as f:
@@ -46,6 +211,8 @@ if args.bg:
             + f" pid -> {pid_file}\n"
             + f" out -> {stdout_file}\n"
             + f" err -> {stderr_file}\n"
+            + f" progress -> {args.progress_file}\n"
+            + f"\nUse {sys.argv[0]} --status for the progress.\n"
         )
         exit(0)
     os.setsid()
@@ -56,5 +223,40 @@ if args.bg:
     os.dup2(stdout_fh.fileno(), sys.stdout.fileno())
     os.dup2(stderr_fh.fileno(), sys.stderr.fileno())
 
-update_combo_pkl_file(args.n, n_parallel=args.n_parallel)
+profile_dir = make_profile_dir(args.profile) if args.profile is not None else None
+
+coordinator, worker_pids = None, []
+if args.coordinator is not None:
+    coordinator = Coordinator(parse_address(args.coordinator), get_authkey(), lease_timeout=args.lease_timeout)
+    # Fork the local workers before the coordinator threads are started:
+    worker_pids = fork_workers(coordinator.address, get_authkey(), args.local_workers, profile_dir=profile_dir)
+    coordinator.start()
+
+progress_fh = open(args.progress_file, "at") if args.progress_file is not None else None
+progress = ProgressTracker(events_fh=progress_fh, status_file=args.status_file, num_blocks=len(blockset))
+update_kwargs = dict(
+    n_parallel=args.n_parallel,
+    store_dir=args.store_dir,
+    progress=progress,
+    walker=args.walker,
+    adaptive=not args.fixed_parallel,
+    min_free_bytes=args.min_free_mem << 20 if args.min_free_mem is not None else None,
+    coordinator=coordinator,
+    time_budget=args.time_budget,
+    profile_dir=profile_dir,
+    blockset=blockset,
+)
+if profile_dir is not None:
+    all_combos = run_profiled(profile_file(profile_dir, "main", "main"), update_combo_store, args.n, **update_kwargs)
+else:
+    all_combos = update_combo_store(args.n, **update_kwargs)
+if coordinator is not None:
+    coordinator.close()
+    wait_workers(worker_pids)
+if progress_fh is not None:
+    progress_fh.close()
+if all_combos is not None and args.export_pkl_file is not None:
+    ComboStore(args.store_dir, blockset=blockset).export_pkl_file(args.export_pkl_file)
+if profile_dir is not None:
+    print(write_report(profile_dir), file=sys.stderr)
 